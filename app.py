@@ -1,21 +1,34 @@
 """
 Redmine 進度回報自動化工具 - FastAPI 主應用
 """
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from typing import Iterator, List, Optional, Dict, Any
 from datetime import datetime, timedelta
+import json
 import logging
 import os
+import threading
+import time
 
 from utils.config import load_config, save_config, validate_config, get_git_user
-from services.redmine_service import RedmineService
+from services.redmine_service import BATCH_MAX_WORKERS, RedmineService, get_redmine_service, reset_redmine_service
+from services.update_queue import start_update_queue, stop_update_queue
 from services.git_service import GitService
+from services.git_backends import get_git_backend
+from services.commit_index import get_commit_index
+from services.repo_watcher import get_repo_watcher, start_repo_watcher, stop_repo_watcher
+from services.repo_scanner import get_repo_scanner
+from services.repo_pool import close_repo_pool
+from services.issue_indexer import get_issue_indexer, start_issue_indexer, stop_issue_indexer
 from services.analyze_service import AnalyzeService
+from services.churn import summarize_churn
 
 # 設定日誌 - 輸出到控制台，格式清楚易讀
 logging.basicConfig(
@@ -38,8 +51,96 @@ _REPO_SCAN_CACHE: dict = {
 }
 _REPO_SCAN_CACHE_TTL_SECONDS = 30
 
+# /api/commits 串流：累積到此大小或經過此時間才送出一個區塊（第一筆 commit 一律立即送出）
+_NDJSON_FLUSH_BYTES = 32 * 1024
+_NDJSON_FLUSH_SECONDS = 0.1
+
+def _watch_roots(config: Dict[str, Any]) -> List[str]:
+    """儲存庫監看的路徑（與 /api/repositories 使用相同的 scan_paths 規則）"""
+    scan_paths = config.get('scan_paths', None)
+    return scan_paths if isinstance(scan_paths, list) else GitService.default_scan_paths()
+
+
+def _apply_repo_watch_config(config: Dict[str, Any]) -> None:
+    """依設定啟動、停止或更新儲存庫監看"""
+    watch_config = config.get('repo_watch', {})
+    watcher = get_repo_watcher()
+    if not watch_config.get('enabled', False):
+        if watcher is not None:
+            stop_repo_watcher()
+        return
+    roots = _watch_roots(config)
+    if watcher is None:
+        start_repo_watcher(roots, poll_interval=float(watch_config.get('poll_interval', 5)))
+    elif watcher.roots != roots:
+        watcher.set_roots(roots)
+
+
+def _known_repo_paths() -> List[str]:
+    """所有已知的儲存庫路徑（已儲存的儲存庫 + 監看或掃描到的儲存庫），供 Issue 引用索引使用"""
+    config = load_config()
+    paths = [repo['path'] for repo in config.get('repositories', []) if repo.get('path')]
+    roots = _watch_roots(config)
+    watcher = get_repo_watcher()
+    if watcher is not None and watcher.ready and watcher.roots == roots:
+        scanned = watcher.repositories
+    else:
+        scanned = get_repo_scanner().scan(roots)
+    paths.extend(repo['path'] for repo in scanned)
+    return list(dict.fromkeys(paths))
+
+
+def _apply_issue_index_config(config: Dict[str, Any]) -> None:
+    """依設定啟動或停止 Issue 引用背景索引"""
+    index_config = config.get('issue_index', {})
+    enabled = index_config.get('enabled', False) and config.get('git', {}).get('commit_index', False)
+    indexer = get_issue_indexer()
+    if not enabled:
+        if indexer is not None:
+            stop_issue_indexer()
+        return
+    if indexer is None:
+        start_issue_indexer(_known_repo_paths, interval=float(index_config.get('interval', 600)))
+    else:
+        # 儲存庫或掃描路徑可能已變更，立即重新索引
+        indexer.trigger()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    應用啟動與關閉：選擇 Git 後端、依設定啟動儲存庫監看與 Issue 引用背景索引、啟動 Redmine 更新佇列，
+    關閉時結束常駐 git 子行程與 Redmine 連線（佇列中未完成的工作下次啟動時繼續）
+    """
+    # Git 後端的效能測試在背景執行，不阻塞啟動（測試完成前的請求會等待結果）
+    try:
+        backend_name = load_config().get('git', {}).get('backend', 'auto')
+    except Exception as e:
+        logger.warning(f"無法讀取 Git 後端設定，改為自動選擇: {e}")
+        backend_name = 'auto'
+    threading.Thread(target=get_git_backend, args=(backend_name,), name="git-backend-select", daemon=True).start()
+    try:
+        _apply_repo_watch_config(load_config())
+    except Exception as e:
+        logger.warning(f"無法啟動儲存庫監看: {e}")
+    try:
+        _apply_issue_index_config(load_config())
+    except Exception as e:
+        logger.warning(f"無法啟動 Issue 引用索引: {e}")
+    try:
+        start_update_queue(_configured_redmine_service)
+    except Exception as e:
+        logger.warning(f"無法啟動 Redmine 更新佇列: {e}")
+    yield
+    stop_update_queue()
+    stop_issue_indexer()
+    stop_repo_watcher()
+    close_repo_pool()
+    reset_redmine_service()
+
+
 # 建立 FastAPI 應用
-app = FastAPI(title="Redmine 進度回報工具", version="1.0.0")
+app = FastAPI(title="Redmine 進度回報工具", version="1.0.0", lifespan=lifespan)
 
 # CORS 設定
 app.add_middleware(
@@ -57,11 +158,47 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
 
 
+def _configured_redmine_service() -> RedmineService:
+    """依目前的設定取得共用的 Redmine 服務（Redmine 更新佇列在背景處理每個工作前呼叫）"""
+    redmine_config = load_config().get('redmine', {})
+    if not redmine_config.get('url') or not redmine_config.get('api_key'):
+        raise ValueError("尚未設定 Redmine URL 和 API Key")
+    return get_redmine_service(
+        url=redmine_config['url'],
+        api_key=redmine_config['api_key'],
+        user_id=redmine_config.get('user_id')
+    )
+
+
+def create_git_service(config: Dict[str, Any], git_user: Dict[str, str]) -> GitService:
+    """依設定建立 Git 服務（含作者別名、本機 commit 索引、變更摘錄設定與 Git 後端）"""
+    git_config = config.get('git', {})
+    return GitService(
+        user_name=git_user['name'],
+        user_email=git_user['email'],
+        aliases=git_config.get('aliases', []),
+        commit_index=get_commit_index() if git_config.get('commit_index', False) else None,
+        dedupe_patches=git_config.get('dedupe_patches', True),
+        diff_context=config.get('ai', {}).get('diff_context'),
+        backend=get_git_backend(git_config.get('backend', 'auto')),
+        write_commit_graph=git_config.get('commit_graph', True)
+    )
+
+
 # Pydantic 模型
-class AnalyzeRequest(BaseModel):
-    issue_id: int
+class CommitSource(BaseModel):
     repository_path: str
     branch: str
+
+
+class AnalyzeRequest(BaseModel):
+    issue_id: int
+    repository_path: Optional[str] = None
+    branch: Optional[str] = None
+    # 多儲存庫／多分支分析：提供時取代 repository_path + branch
+    sources: Optional[List[CommitSource]] = None
+    # 只分析訊息中引用此 Issue（例如 `refs #123`）的 commit，由本機索引查詢
+    match_issue_refs: bool = False
     start_date: str  # ISO 格式日期字串
     end_date: str    # ISO 格式日期字串
 
@@ -72,6 +209,16 @@ class UpdateRedmineRequest(BaseModel):
     percent_done: Optional[int] = Field(None, ge=0, le=100)
     spent_time: Optional[float] = Field(None, ge=0)
     status_id: Optional[int] = None
+    # 用戶端產生的冪等鍵：同一個鍵重複送出（例如網路逾時後重送）只會加入佇列一次
+    idempotency_key: Optional[str] = Field(None, max_length=128)
+
+
+class BatchUpdateRedmineRequest(BaseModel):
+    updates: List[UpdateRedmineRequest] = Field(..., min_length=1)
+    # 加入 Redmine 更新佇列，立即回傳各工單的工作；false 時直接更新並等待 Redmine 回應
+    queue: bool = True
+    # 直接更新時同時更新的工單數（未指定時使用 redmine.max_workers，上限 BATCH_MAX_WORKERS）
+    max_workers: Optional[int] = Field(None, ge=1)
 
 
 class ConfigUpdateRequest(BaseModel):
@@ -83,6 +230,8 @@ class ConfigUpdateRequest(BaseModel):
     scan_paths: Optional[List[str]] = None
     default_time_range: Optional[str] = None
     ui: Optional[Dict[str, Any]] = None
+    repo_watch: Optional[Dict[str, Any]] = None
+    issue_index: Optional[Dict[str, Any]] = None
 
 
 # 錯誤處理中介軟體
@@ -108,9 +257,24 @@ async def root(request: Request):
 
 
 @app.get("/api/issues")
-async def get_issues(status_id: Optional[int] = None, search: Optional[str] = None):
-    """取得指派給當前使用者的工單列表"""
-    logger.info(f"[API] GET /api/issues (status_id={status_id}, search={search})")
+async def get_issues(
+    status_id: Optional[int] = None,
+    search: Optional[str] = None,
+    limit: Optional[int] = None,
+    offset: int = 0,
+    sort: Optional[str] = None,
+    fields: Optional[str] = None,
+):
+    """
+    取得指派給當前使用者的工單列表
+
+    limit/offset/sort 與 Redmine REST API 的同名參數相同（sort 例如 `updated_on:desc,id`），
+    fields 為逗號分隔的欄位名稱（例如 `id,subject,status`），未指定時回傳所有欄位與所有工單。
+    """
+    logger.info(
+        f"[API] GET /api/issues (status_id={status_id}, search={search}, "
+        f"limit={limit}, offset={offset}, sort={sort}, fields={fields})"
+    )
     try:
         config = load_config()
         redmine_config = config.get('redmine', {})
@@ -121,15 +285,22 @@ async def get_issues(status_id: Optional[int] = None, search: Optional[str] = No
                 detail="請先在設定頁面設定 Redmine URL 和 API Key"
             )
         
-        service = RedmineService(
+        service = get_redmine_service(
             url=redmine_config['url'],
             api_key=redmine_config['api_key'],
             user_id=redmine_config.get('user_id')
         )
         
-        issues = service.get_assigned_issues(status_id=status_id, search=search)
-        logger.info(f"[API] 成功取得 {len(issues)} 個工單")
-        return {"issues": issues}
+        result = service.list_assigned_issues(
+            status_id=status_id,
+            search=search,
+            limit=limit,
+            offset=offset,
+            sort=sort,
+            fields=[field.strip() for field in fields.split(',') if field.strip()] if fields else None,
+        )
+        logger.info(f"[API] 成功取得 {len(result['issues'])} / {result['total_count']} 個工單")
+        return result
     
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -152,12 +323,13 @@ async def redmine_ping():
                 detail="請先在設定頁面設定 Redmine URL 和 API Key",
             )
 
-        # 只要成功建立 service 並通過 auth()（在 RedmineService._connect 內）就代表連線可用
-        RedmineService(
+        # 重新呼叫 auth()（不使用快取的認證結果）成功就代表連線可用
+        service = get_redmine_service(
             url=redmine_config["url"],
             api_key=redmine_config["api_key"],
             user_id=redmine_config.get("user_id"),
         )
+        service.authenticate(force=True)
 
         return {"ok": True}
     except HTTPException:
@@ -183,10 +355,7 @@ async def get_repositories():
                 detail="無法取得 Git 使用者資訊，請先設定"
             )
         
-        service = GitService(
-            user_name=git_user['name'],
-            user_email=git_user['email']
-        )
+        service = create_git_service(config, git_user)
         
         # 從設定檔取得已儲存的儲存庫
         saved_repos = config.get('repositories', [])
@@ -203,7 +372,11 @@ async def get_repositories():
         )
 
         now = time.time()
-        if (
+        watcher = get_repo_watcher()
+        if watcher is not None and watcher.ready and watcher.roots == _watch_roots(config):
+            # 監看模式：直接讀取即時維護的儲存庫列表（第一次掃描完成前改為直接掃描）
+            scanned_repos = watcher.repositories
+        elif (
             _REPO_SCAN_CACHE["key"] == cache_key
             and (now - _REPO_SCAN_CACHE["ts"]) < _REPO_SCAN_CACHE_TTL_SECONDS
         ):
@@ -250,10 +423,7 @@ async def get_branches(path: str):
                 detail="無法取得 Git 使用者資訊，請先設定"
             )
         
-        service = GitService(
-            user_name=git_user['name'],
-            user_email=git_user['email']
-        )
+        service = create_git_service(config, git_user)
         
         if not service.validate_repository(repo_path):
             raise HTTPException(
@@ -305,20 +475,16 @@ async def preview_commits(
                 detail=f"日期格式錯誤: {e}"
             )
         
-        service = GitService(
-            user_name=git_user['name'],
-            user_email=git_user['email']
-        )
+        service = create_git_service(config, git_user)
         
-        # 取得當前使用者的 commit（只計算數量，不返回詳細內容）
-        commits = service.get_user_commits(
+        # 只計算當前使用者的 commit 數量（rev-list --count，結果依分支 sha 快取）
+        commit_count = service.count_user_commits(
             repo_path=repo_path,
             branch=branch,
             start_date=start_date_obj,
             end_date=end_date_obj
         )
         
-        commit_count = len(commits)
         logger.info(f"[API] 預覽完成：找到 {commit_count} 個 commit")
         return {
             "count": commit_count,
@@ -331,30 +497,136 @@ async def preview_commits(
     except HTTPException:
         raise
     except ValueError as e:
-        # 如果是「沒有 commit」的錯誤，回傳 0 而不是錯誤
-        if "沒有找到" in str(e) or "沒有找到任何 commit" in str(e):
-            config = load_config()
-            git_user = get_git_user(config)
-            return {
-                "count": 0,
-                "user": {
-                    "name": git_user['name'] if git_user else "未知",
-                    "email": git_user['email'] if git_user else "未知"
-                },
-                "message": str(e)
-            }
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"預覽 commit 失敗: {e}")
         raise HTTPException(status_code=500, detail=f"無法預覽 commit: {e}")
 
 
+def _ndjson_commit_lines(commits: Iterator[Any]) -> Iterator[bytes]:
+    """
+    將 commit iterator 轉為 NDJSON 區塊
+
+    第一筆 commit 立即送出；之後累積到一定大小或時間才送出一次，避免每個 commit 一個 HTTP 區塊。
+    最後一行為 {"done": true, "count": n}；走訪途中失敗時最後一行為 {"error": ...}。
+    """
+    buffer: List[bytes] = []
+    buffered = 0
+    count = 0
+    last_flush = time.monotonic()
+    try:
+        for commit in commits:
+            line = (json.dumps(commit.to_dict(), ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+            buffer.append(line)
+            buffered += len(line)
+            count += 1
+            now = time.monotonic()
+            if count == 1 or buffered >= _NDJSON_FLUSH_BYTES or now - last_flush >= _NDJSON_FLUSH_SECONDS:
+                yield b"".join(buffer)
+                buffer, buffered, last_flush = [], 0, now
+        trailer = {"done": True, "count": count}
+    except ValueError as e:
+        logger.error(f"串流 commit 失敗: {e}")
+        trailer = {"error": str(e), "count": count}
+    buffer.append((json.dumps(trailer, ensure_ascii=False) + "\n").encode("utf-8"))
+    yield b"".join(buffer)
+
+
+@app.get("/api/commits")
+async def stream_commits(
+    repository_path: str,
+    branch: str,
+    start_date: str,
+    end_date: str
+):
+    """
+    以 NDJSON 串流回傳指定時間範圍內當前使用者的 commit（每行一個 commit，新到舊）
+
+    git 走訪歷史的同時就開始輸出，伺服器不保留完整列表；用戶端中斷連線時 git 子行程會一併結束。
+    """
+    import urllib.parse
+    repo_path = urllib.parse.unquote(repository_path)
+    logger.info(f"[API] GET /api/commits (repo: {repo_path}, branch: {branch}, {start_date} ~ {end_date})")
+
+    config = load_config()
+    git_user = get_git_user(config)
+    if not git_user:
+        raise HTTPException(
+            status_code=400,
+            detail="無法取得 Git 使用者資訊，請先設定"
+        )
+
+    try:
+        start_date_obj = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
+        end_date_obj = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=f"日期格式錯誤: {e}"
+        )
+
+    service = create_git_service(config, git_user)
+    try:
+        # 儲存庫與分支在開始串流前檢查，錯誤仍以 HTTP 400 回應
+        commits = service.stream_user_commits(repo_path, branch, start_date_obj, end_date_obj)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    lines = _ndjson_commit_lines(commits)
+    # 用戶端中斷連線時 next() 可能仍在執行緒中執行，此時不能關閉 generator（generator already executing），
+    # 改由該執行緒在 next() 返回後關閉；lock 確保 next() 與關閉不會同時進行
+    lines_lock = threading.Lock()
+    cancelled = threading.Event()
+
+    def close_lines() -> None:
+        with lines_lock:
+            # 關閉 commit iterator 時結束 git 子行程
+            lines.close()
+            commits.close()
+
+    def next_chunk() -> Optional[bytes]:
+        with lines_lock:
+            chunk = None if cancelled.is_set() else next(lines, None)
+        if cancelled.is_set():
+            close_lines()
+            return None
+        return chunk
+
+    async def body():
+        try:
+            while True:
+                # git 的讀取在執行緒中進行，不阻塞事件迴圈
+                chunk = await run_in_threadpool(next_chunk)
+                if chunk is None:
+                    break
+                yield chunk
+        finally:
+            cancelled.set()
+            if lines_lock.acquire(blocking=False):
+                lines_lock.release()
+                close_lines()
+
+    return StreamingResponse(
+        body(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.post("/api/analyze")
 async def analyze_commits(request: AnalyzeRequest):
     """分析 commit 並生成進度回報"""
     import urllib.parse
-    repo_path = urllib.parse.unquote(request.repository_path)
-    logger.info(f"[API] POST /api/analyze (Issue #{request.issue_id}, repo: {repo_path}, branch: {request.branch}, {request.start_date} ~ {request.end_date})")
+    if request.sources:
+        sources = [(urllib.parse.unquote(s.repository_path), s.branch) for s in request.sources]
+    elif request.repository_path and request.branch:
+        sources = [(urllib.parse.unquote(request.repository_path), request.branch)]
+    elif request.match_issue_refs:
+        sources = []  # 查詢所有已索引的儲存庫
+    else:
+        raise HTTPException(status_code=400, detail="請提供 repository_path 與 branch，或 sources 列表")
+    sources_text = ", ".join(f"{repo} ({branch})" for repo, branch in sources) or "所有已索引的儲存庫"
+    logger.info(f"[API] POST /api/analyze (Issue #{request.issue_id}, sources: {sources_text}, {request.start_date} ~ {request.end_date})")
     try:
         config = load_config()
         git_user = get_git_user(config)
@@ -376,38 +648,52 @@ async def analyze_commits(request: AnalyzeRequest):
             )
         
         # 取得 Git 服務
-        git_service = GitService(
-            user_name=git_user['name'],
-            user_email=git_user['email']
-        )
+        git_service = create_git_service(config, git_user)
         
         # 取得當前使用者的 commit
         logger.info(f"[API] 開始取得 commit 記錄...")
-        commits = git_service.get_user_commits(
-            repo_path=repo_path,
-            branch=request.branch,
-            start_date=start_date,
-            end_date=end_date
-        )
+        if request.match_issue_refs:
+            # 由 Issue 引用索引直接查出引用此 Issue 的 commit
+            commits = git_service.get_user_commits_by_issue(
+                issue_id=request.issue_id,
+                start_date=start_date,
+                end_date=end_date,
+                sources=sources or None
+            )
+        elif len(sources) == 1:
+            repo_path, branch = sources[0]
+            commits = git_service.get_user_commits(
+                repo_path=repo_path,
+                branch=branch,
+                start_date=start_date,
+                end_date=end_date
+            )
+        else:
+            # 多個來源平行取得後合併（同一個 commit 只保留一筆）
+            commits = git_service.get_user_commits_multi(
+                sources=sources,
+                start_date=start_date,
+                end_date=end_date,
+                max_workers=config.get('git', {}).get('max_workers', 4)
+            )
         logger.info(f"[API] 取得 {len(commits)} 個 commit，開始 AI 分析...")
         
         # 取得 Issue 資訊
         redmine_config = config.get('redmine', {})
-        redmine_service = RedmineService(
+        redmine_service = get_redmine_service(
             url=redmine_config['url'],
-            api_key=redmine_config['api_key']
+            api_key=redmine_config['api_key'],
+            user_id=redmine_config.get('user_id')
         )
         
-        # 取得 issue 標題（這裡簡化處理，實際可能需要更好的錯誤處理）
-        issue_title = f"Issue #{request.issue_id}"
+        # 直接取得此工單（有快取），標題、描述與最新備註一併放進 prompt
         try:
-            issues = redmine_service.get_assigned_issues()
-            for issue in issues:
-                if issue['id'] == request.issue_id:
-                    issue_title = issue['subject']
-                    break
-        except Exception:
-            pass  # 如果無法取得，使用預設標題
+            issue = redmine_service.get_issue(request.issue_id)
+        except ValueError as e:
+            # 工單資訊只是 prompt 的脈絡，取不到時改用預設標題繼續分析
+            logger.warning(f"[API] 無法取得 Issue #{request.issue_id}，使用預設標題: {e}")
+            issue = {'subject': f"Issue #{request.issue_id}", 'description': '', 'latest_journal': None}
+        latest_journal = issue.get('latest_journal')
         
         # AI 分析
         # 優先使用新的 ai 設定，向後相容舊的 claude 設定
@@ -436,11 +722,16 @@ async def analyze_commits(request: AnalyzeRequest):
         result = analyze_service.analyze_commits(
             commits=commits,
             issue_id=request.issue_id,
-            issue_title=issue_title,
+            issue_title=issue['subject'],
             start_date=request.start_date,
-            end_date=request.end_date
+            end_date=request.end_date,
+            issue_description=issue.get('description', ''),
+            issue_latest_note=latest_journal['notes'] if latest_journal else ''
         )
         
+        # 實際的行數變更統計（供前端對照 AI 的工時估算）
+        result['churn'] = summarize_churn(commits)
+        
         logger.info(f"[API] AI 分析完成！建議進度: {result.get('suggested_percent_done', 'N/A')}%, 預估工時: {result.get('estimated_hours', 'N/A')} 小時")
         return result
     
@@ -454,9 +745,14 @@ async def analyze_commits(request: AnalyzeRequest):
         raise HTTPException(status_code=500, detail=f"分析失敗: {e}")
 
 
-@app.post("/api/update-redmine")
+@app.post("/api/update-redmine", status_code=202)
 async def update_redmine(request: UpdateRedmineRequest):
-    """更新 Redmine issue"""
+    """
+    更新 Redmine issue
+
+    更新先寫入本機的 Redmine 更新佇列並立即回傳工作（含 job_id），由背景送出；
+    Redmine 無法連線時會自動重試，結果以 GET /api/update-redmine/jobs/{job_id} 查詢。
+    """
     try:
         config = load_config()
         redmine_config = config.get('redmine', {})
@@ -467,28 +763,102 @@ async def update_redmine(request: UpdateRedmineRequest):
                 detail="請先在設定頁面設定 Redmine URL 和 API Key"
             )
         
-        service = RedmineService(
-            url=redmine_config['url'],
-            api_key=redmine_config['api_key']
+        queue = start_update_queue(_configured_redmine_service)
+        return queue.enqueue(
+            request.model_dump(exclude={'idempotency_key'}),
+            idempotency_key=request.idempotency_key
         )
+    
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"更新 Redmine 失敗: {e}")
+        raise HTTPException(status_code=500, detail=f"更新失敗: {e}")
+
+
+@app.get("/api/update-redmine/queue")
+async def update_queue_status(limit: int = 50):
+    """Redmine 更新佇列狀態（各狀態的工作數與最近的工作）"""
+    return start_update_queue(_configured_redmine_service).status(limit=max(1, min(limit, 500)))
+
+
+@app.get("/api/update-redmine/jobs/{job_id}")
+async def update_job_status(job_id: str):
+    """查詢 Redmine 更新工作的狀態與結果（result 與同步更新的回應格式相同）"""
+    job = start_update_queue(_configured_redmine_service).get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"找不到工作 {job_id}")
+    return job
+
+
+@app.post("/api/update-redmine/jobs/{job_id}/retry")
+async def retry_update_job(job_id: str):
+    """重新排入失敗的 Redmine 更新工作（已完成的步驟不會重做）"""
+    try:
+        job = start_update_queue(_configured_redmine_service).retry(job_id)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"找不到工作 {job_id}")
+    return job
+
+
+@app.post("/api/update-redmine/batch")
+def update_redmine_batch(request: BatchUpdateRedmineRequest):
+    """
+    批次更新多個 Redmine issue
+
+    預設將每個工單加入 Redmine 更新佇列（與 /api/update-redmine 相同，有重試與冪等），立即回傳各工單的工作；
+    queue 為 false 時改以有上限的執行緒池直接更新，回傳與 updates 順序相同的逐筆結果
+    （每筆為 update_issue 的結果加上 issue_id），單一工單失敗不影響其他工單。
+    """
+    logger.info(f"[API] POST /api/update-redmine/batch ({len(request.updates)} 個工單)")
+    try:
+        config = load_config()
+        redmine_config = config.get('redmine', {})
         
-        result = service.update_issue(
-            issue_id=request.issue_id,
-            notes=request.notes,
-            percent_done=request.percent_done,
-            spent_time=request.spent_time,
-            status_id=request.status_id
+        if not redmine_config.get('url') or not redmine_config.get('api_key'):
+            raise HTTPException(
+                status_code=400,
+                detail="請先在設定頁面設定 Redmine URL 和 API Key"
+            )
+        
+        if request.queue:
+            queue = start_update_queue(_configured_redmine_service)
+            jobs = [
+                queue.enqueue(update.model_dump(exclude={'idempotency_key'}), idempotency_key=update.idempotency_key)
+                for update in request.updates
+            ]
+            return {'queued': True, 'jobs': jobs}
+        
+        service = get_redmine_service(
+            url=redmine_config['url'],
+            api_key=redmine_config['api_key'],
+            user_id=redmine_config.get('user_id')
         )
         
-        return result
+        results = service.update_issues(
+            [update.model_dump(exclude={'idempotency_key'}) for update in request.updates],
+            max_workers=request.max_workers or redmine_config.get('max_workers', BATCH_MAX_WORKERS)
+        )
+        succeeded = sum(1 for result in results if result['success'])
+        logger.info(f"[API] 批次更新完成：{succeeded} / {len(results)} 個工單成功")
+        return {
+            'success': succeeded == len(results),
+            'succeeded': succeeded,
+            'failed': len(results) - succeeded,
+            'results': results,
+        }
     
     except HTTPException:
         raise
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        logger.error(f"更新 Redmine 失敗: {e}")
-        raise HTTPException(status_code=500, detail=f"更新失敗: {e}")
+        logger.error(f"批次更新 Redmine 失敗: {e}")
+        raise HTTPException(status_code=500, detail=f"批次更新失敗: {e}")
 
 
 @app.get("/api/config")
@@ -519,6 +889,7 @@ async def update_config(request: ConfigUpdateRequest):
         config = load_config()
         
         # 更新各區塊
+        old_redmine = dict(config.get('redmine', {}))
         if request.redmine is not None:
             if 'redmine' not in config:
                 config['redmine'] = {}
@@ -561,6 +932,16 @@ async def update_config(request: ConfigUpdateRequest):
                 config['ui'] = {}
             config['ui'].update(request.ui)
         
+        if request.repo_watch is not None:
+            if 'repo_watch' not in config:
+                config['repo_watch'] = {}
+            config['repo_watch'].update(request.repo_watch)
+        
+        if request.issue_index is not None:
+            if 'issue_index' not in config:
+                config['issue_index'] = {}
+            config['issue_index'].update(request.issue_index)
+        
         # 驗證設定
         is_valid, error_msg = validate_config(config)
         if not is_valid:
@@ -569,6 +950,21 @@ async def update_config(request: ConfigUpdateRequest):
         # 儲存設定
         save_config(config)
         
+        # Redmine URL 或 API Key 變更時，下次請求重新建立共用的 Redmine 連線
+        new_redmine = config.get('redmine', {})
+        if (old_redmine.get('url'), old_redmine.get('api_key')) != (new_redmine.get('url'), new_redmine.get('api_key')):
+            reset_redmine_service()
+        
+        # scan_paths 或監看設定變更時，同步更新儲存庫監看
+        try:
+            _apply_repo_watch_config(config)
+        except Exception as e:
+            logger.warning(f"無法更新儲存庫監看: {e}")
+        try:
+            _apply_issue_index_config(config)
+        except Exception as e:
+            logger.warning(f"無法更新 Issue 引用索引: {e}")
+        
         return {"success": True, "message": "設定已更新"}
     
     except HTTPException:
@@ -0,0 +1,122 @@
+"""
+commit 記錄記憶體用量比較
+以合成的 git log 輸出（預設 100k commits）比較：
+- 原本每個 commit 一組巢狀 dict（hash/full_hash 兩份字串、author 與 files_changed 子 dict），
+  並以 json.dumps(indent=2) 輸出
+- services.commit_record.CommitRecord（__slots__、作者字串 intern、訊息延後解碼），
+  只在輸出時轉為 JSON
+
+用法:
+    python benchmarks/bench_commit_memory.py [--commits 100000] [--authors 20]
+"""
+import argparse
+import gc
+import json
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.churn import CommitChurn  # noqa: E402
+from services.git_log import _parse_file_changes, parse_log_record  # noqa: E402
+
+BASE_TIMESTAMP = 1_600_000_000
+
+
+def synthetic_records(commits: int, authors: int) -> List[bytes]:
+    """產生與 services.git_log.LOG_FORMAT + --raw --numstat 相同格式的 commit 記錄"""
+    records = []
+    for i in range(commits):
+        n = i % authors
+        sha = f"{i:040x}"
+        parent = f"{i - 1:040x}" if i else ""
+        date = time.strftime("%Y-%m-%dT%H:%M:%S+08:00", time.gmtime(BASE_TIMESTAMP + i * 600))
+        message = f"commit {i}: update module {i % 50}\n\nrefs #{i % 997}\n"
+        raw_lines = []
+        numstat_lines = []
+        for j in range(1 + i % 3):
+            path = f"dir{(i + j) % 50}/file{(i * 7 + j) % 2000}.txt"
+            raw_lines.append(f":100644 100644 {'a' * 7} {'b' * 7} M\t{path}")
+            numstat_lines.append(f"{1 + (i + j) % 20}\t{(i + j) % 5}\t{path}")
+        stats = "\n" + "\n".join(raw_lines) + "\n" + "\n".join(numstat_lines) + "\n"
+        records.append(
+            f"{sha}\x1f{parent}\x1fAuthor {n}\x1fauthor{n}@example.com\x1f{date}\x1f{message}\x1d{stats}".encode()
+        )
+    return records
+
+
+def legacy_parse(record: bytes) -> Dict[str, Any]:
+    """原本的解析方式：整筆解碼後建立巢狀 dict"""
+    text = record.decode("utf-8", errors="replace")
+    head, _sep, stats = text.partition("\x1d")
+    sha, _parents, author_name, author_email, date, message = head.split("\x1f", 5)
+    files_changed, files = _parse_file_changes(stats)
+    return {
+        'hash': sha[:8],
+        'full_hash': sha,
+        'author': {
+            'name': author_name,
+            'email': author_email
+        },
+        'date': date,
+        'message': message.strip(),
+        'files_changed': files_changed,
+        'churn': CommitChurn.from_files(files),
+    }
+
+
+def measure(label: str, records: List[bytes], parse, dump) -> None:
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    commits = [parse(record) for record in records]
+    parse_elapsed = time.perf_counter() - start
+    held, _peak = tracemalloc.get_traced_memory()
+
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    payload = dump(commits)
+    dump_elapsed = time.perf_counter() - start
+    _current, dump_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(
+        f"{label:<14} 持有 {held / 1024 / 1024:7.1f} MiB   "
+        f"JSON 輸出峰值 {dump_peak / 1024 / 1024:7.1f} MiB ({len(payload) / 1024 / 1024:.1f} MiB)   "
+        f"解析 {parse_elapsed:5.2f} s   輸出 {dump_elapsed:5.2f} s"
+    )
+    del commits, payload
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--commits", type=int, default=100000)
+    parser.add_argument("--authors", type=int, default=20)
+    args = parser.parse_args()
+
+    records = synthetic_records(args.commits, args.authors)
+    print(f"{args.commits} commits，{args.authors} 位作者")
+
+    measure(
+        "dict",
+        records,
+        legacy_parse,
+        lambda commits: json.dumps(
+            {'commits': commits}, ensure_ascii=False, indent=2, default=lambda o: o.to_dict()
+        ),
+    )
+    measure(
+        "CommitRecord",
+        records,
+        parse_log_record,
+        lambda commits: json.dumps(
+            {'commits': commits}, ensure_ascii=False, separators=(",", ":"), default=lambda o: o.to_dict()
+        ),
+    )
+
+
+if __name__ == "__main__":
+    main()
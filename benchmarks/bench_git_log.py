@@ -0,0 +1,127 @@
+"""
+git log 串流引擎效能比較
+在合成的大型儲存庫上，比較原本 GitPython 逐筆 diff 的做法與 services.git_log 單一串流的做法
+
+用法:
+    python benchmarks/bench_git_log.py [--commits 50000] [--authors 20] [--repo /tmp/bench-repo]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from git import Repo  # noqa: E402
+
+from services.git_log import author_filter_args, iter_log_commits  # noqa: E402
+
+BASE_TIMESTAMP = 1_600_000_000
+
+
+def author_of(i: int, authors: int) -> tuple[str, str]:
+    n = i % authors
+    return f"Author {n}", f"author{n}@example.com"
+
+
+def create_synthetic_repo(path: Path, commits: int, authors: int) -> None:
+    """用 git fast-import 建立合成儲存庫（每個 commit 新增或修改 1~3 個檔案）"""
+    path.mkdir(parents=True, exist_ok=True)
+    subprocess.run(["git", "init", "-q", "-b", "main", str(path)], check=True)
+
+    proc = subprocess.Popen(
+        ["git", "-C", str(path), "fast-import", "--quiet"],
+        stdin=subprocess.PIPE,
+    )
+    write = proc.stdin.write
+    for i in range(commits):
+        name, email = author_of(i, authors)
+        ts = BASE_TIMESTAMP + i * 600
+        message = f"commit {i}\n\nsynthetic change #{i % 997}\n".encode()
+        write(b"commit refs/heads/main\n")
+        write(f"author {name} <{email}> {ts} +0800\n".encode())
+        write(f"committer {name} <{email}> {ts} +0800\n".encode())
+        write(f"data {len(message)}\n".encode() + message)
+        for j in range(1 + i % 3):
+            content = f"line {i}\n" * (1 + (i + j) % 20)
+            data = content.encode()
+            write(f"M 100644 inline dir{(i + j) % 50}/file{(i * 7 + j) % 2000}.txt\n".encode())
+            write(f"data {len(data)}\n".encode() + data + b"\n")
+        write(b"\n")
+    proc.stdin.close()
+    if proc.wait() != 0:
+        raise RuntimeError("git fast-import 失敗")
+
+
+def gitpython_commits(repo_path: str, rev: str, since, until, user_name: str, user_email: str) -> list:
+    """原本的 GitPython 做法：先取出所有 commit，再對每個符合的 commit 做一次 tree diff"""
+    repo = Repo(repo_path)
+    all_commits = list(repo.iter_commits(rev, since=since, until=until))
+    result = []
+    for commit in all_commits:
+        if commit.author.name == user_name or commit.author.email == user_email:
+            files_changed = {'added': 0, 'modified': 0, 'deleted': 0}
+            if commit.parents:
+                for item in commit.diff(commit.parents[0]):
+                    if item.new_file:
+                        files_changed['added'] += 1
+                    elif item.deleted_file:
+                        files_changed['deleted'] += 1
+                    else:
+                        files_changed['modified'] += 1
+            result.append({
+                'hash': commit.hexsha[:8],
+                'full_hash': commit.hexsha,
+                'author': {'name': commit.author.name, 'email': commit.author.email},
+                'date': commit.committed_datetime.isoformat(),
+                'message': commit.message.strip(),
+                'files_changed': files_changed,
+            })
+    return result
+
+
+def streaming_commits(repo_path: str, rev: str, since, until, user_name: str, user_email: str) -> list:
+    """services.git_log 的做法：單一 git log 子行程，由 git 在走訪時過濾作者，邊讀邊解析"""
+    author_args = author_filter_args([user_name], [user_email])
+    return list(iter_log_commits(repo_path, rev, since=since, until=until, extra_args=author_args))
+
+
+def timed(label: str, func, *args) -> list:
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<12} {elapsed:8.2f} s   ({len(result)} commits)")
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--commits", type=int, default=50000)
+    parser.add_argument("--authors", type=int, default=20)
+    parser.add_argument("--repo", default=None, help="合成儲存庫路徑（預設：暫存目錄）")
+    args = parser.parse_args()
+
+    repo_path = Path(args.repo or f"/tmp/redmine-update-bench-{args.commits}")
+    if not (repo_path / ".git").exists():
+        print(f"建立合成儲存庫 {repo_path}（{args.commits} commits）...")
+        start = time.perf_counter()
+        create_synthetic_repo(repo_path, args.commits, args.authors)
+        print(f"完成，耗時 {time.perf_counter() - start:.1f} s")
+
+    since = datetime.fromtimestamp(BASE_TIMESTAMP - 1, tz=timezone.utc)
+    until = datetime.fromtimestamp(BASE_TIMESTAMP + args.commits * 600 + 1, tz=timezone.utc)
+    user_name, user_email = author_of(0, args.authors)
+    path = os.fspath(repo_path)
+
+    old = timed("gitpython", gitpython_commits, path, "main", since, until, user_name, user_email)
+    new = timed("git log", streaming_commits, path, "main", since, until, user_name, user_email)
+
+    if [c['full_hash'] for c in old] != [c.full_hash for c in new]:
+        print("警告：兩種做法回傳的 commit 不一致")
+
+
+if __name__ == "__main__":
+    main()
@@ -10,10 +10,44 @@ import subprocess
 import time
 from pathlib import Path
 from typing import Dict, Any, List, Optional
+from services.churn import summarize_churn
+from services.commit_record import CommitRecord
 import logging
 
 logger = logging.getLogger(__name__)
 
+# 工單描述與最新備註放進 prompt 時的長度上限（字元）
+ISSUE_CONTEXT_MAX_CHARS = 2000
+
+# Linux 單一命令列參數的上限（MAX_ARG_STRLEN，含結尾的 NUL）；OpenCode 的 prompt 以單一參數傳入
+OPENCODE_MAX_PROMPT_BYTES = 128 * 1024 - 1
+
+
+def _truncate(text: str, limit: int = ISSUE_CONTEXT_MAX_CHARS) -> str:
+    """超過 limit 字元時截斷並加上省略記號"""
+    return text if len(text) <= limit else text[:limit] + "…（以下省略）"
+
+
+def _commit_payload(commit: CommitRecord, include_diff_excerpt: bool) -> Dict[str, Any]:
+    """
+    送給 AI CLI 的 commit JSON
+
+    行數變更只附上總計（逐檔與目錄明細太大，主要目錄已列在文字 prompt）；
+    變更摘錄已放在文字 prompt 時不再重複附上
+    """
+    data = commit.to_dict()
+    churn = commit.churn
+    if churn is not None:
+        data['churn'] = {
+            'insertions': churn.total_insertions,
+            'deletions': churn.total_deletions,
+            'files': len(churn),
+            'binary_files': churn.binary_files,
+        }
+    if not include_diff_excerpt:
+        data.pop('diff_excerpt', None)
+    return data
+
 
 class AnalyzeService:
     """AI 分析服務類別"""
@@ -218,11 +252,12 @@ class AnalyzeService:
     
     def format_commit_data(
         self,
-        commits: List[Dict[str, Any]],
+        commits: List[CommitRecord],
         issue_id: int,
         issue_title: str,
         start_date: str,
-        end_date: str
+        end_date: str,
+        include_diff_excerpt: bool = True
     ) -> str:
         """
         格式化 commit 資料為文字格式
@@ -233,21 +268,62 @@ class AnalyzeService:
             issue_title: Issue 標題
             start_date: 開始日期
             end_date: 結束日期
+            include_diff_excerpt: 是否附上變更摘錄（預設 True）
         
         Returns:
             格式化後的文字
         """
         commit_lines = []
         for commit in commits:
+            # 多儲存庫分析時，標示 commit 來自哪些儲存庫與分支
+            source_line = ""
+            if commit.sources:
+                source_line = "來源: " + ", ".join(
+                    f"{source['repository']} ({source['branch']})" for source in commit.sources
+                ) + "\n"
+            # 以 patch-id 合併的 cherry-pick / rebase 重複 commit
+            if commit.duplicates:
+                source_line += f"相同變更的其他 commit: {', '.join(commit.duplicates)}\n"
+            # 逐檔行數統計：總新增／刪除行數與變更最多的目錄
+            churn_line = ""
+            churn = commit.churn
+            if churn is not None and len(churn):
+                directories = sorted(churn.by_directory().items(), key=lambda item: item[1][0] + item[1][1], reverse=True)
+                churn_line = f"行數變更: +{churn.total_insertions} -{churn.total_deletions}"
+                if churn.binary_files:
+                    churn_line += f"（二進位檔 {churn.binary_files} 個）"
+                churn_line += "；主要目錄: " + ", ".join(
+                    f"{path} (+{added} -{deleted})" for path, (added, deleted, _files) in directories[:3]
+                ) + "\n"
+            # 啟用 ai.diff_context 時附上的程式碼變更摘錄
+            excerpt_text = f"變更摘錄:\n{commit.diff_excerpt}" if include_diff_excerpt and commit.diff_excerpt else ""
             commit_lines.append(
-                f"Commit: {commit['hash']}\n"
-                f"作者: {commit['author']['name']} ({commit['author']['email']})\n"
-                f"日期: {commit['date']}\n"
-                f"訊息: {commit['message']}\n"
-                f"檔案變更: +{commit['files_changed']['added']} "
-                f"-{commit['files_changed']['deleted']} "
-                f"~{commit['files_changed']['modified']}\n"
+                f"Commit: {commit.hash}\n"
+                f"{source_line}"
+                f"作者: {commit.author_name} ({commit.author_email})\n"
+                f"日期: {commit.date}\n"
+                f"訊息: {commit.message}\n"
+                f"檔案變更: +{commit.files_added} "
+                f"-{commit.files_deleted} "
+                f"~{commit.files_modified}\n"
+                f"{churn_line}"
+                f"{excerpt_text}"
+            )
+        
+        # 開頭附上整體統計，讓工時估算有實際的變更量可以參考
+        summary = summarize_churn(commits, top_directories=5)
+        if summary['commits']:
+            header = (
+                f"整體變更: {len(commits)} 個 commit，{summary['files']} 個檔案，"
+                f"+{summary['insertions']} -{summary['deletions']} 行"
             )
+            if summary['binary_files']:
+                header += f"（二進位檔 {summary['binary_files']} 個）"
+            if summary['directories']:
+                header += "\n主要目錄: " + ", ".join(
+                    f"{d['path']} (+{d['insertions']} -{d['deletions']})" for d in summary['directories']
+                )
+            commit_lines.insert(0, header + "\n")
         
         return "\n".join(commit_lines)
     
@@ -257,7 +333,9 @@ class AnalyzeService:
         issue_title: str,
         start_date: str,
         end_date: str,
-        commit_list_text: str
+        commit_list_text: str,
+        issue_description: str = "",
+        issue_latest_note: str = ""
     ) -> str:
         """
         載入並格式化系統提示詞
@@ -268,6 +346,8 @@ class AnalyzeService:
             start_date: 開始日期
             end_date: 結束日期
             commit_list_text: Commit 列表文字
+            issue_description: Issue 描述（可選）
+            issue_latest_note: Issue 最新一則備註（可選）
         
         Returns:
             格式化後的系統提示詞
@@ -291,6 +371,8 @@ class AnalyzeService:
             prompt = prompt.replace("{start_date}", str(start_date))
             prompt = prompt.replace("{end_date}", str(end_date))
             prompt = prompt.replace("{commit_list}", str(commit_list_text))
+            prompt = prompt.replace("{issue_description}", issue_description or "（無）")
+            prompt = prompt.replace("{issue_latest_note}", issue_latest_note or "（無）")
 
             return prompt
         except Exception as e:
@@ -298,11 +380,13 @@ class AnalyzeService:
     
     def analyze_commits(
         self,
-        commits: List[Dict[str, Any]],
+        commits: List[CommitRecord],
         issue_id: int,
         issue_title: str,
         start_date: str,
-        end_date: str
+        end_date: str,
+        issue_description: str = "",
+        issue_latest_note: str = ""
     ) -> Dict[str, Any]:
         """
         使用 Claude CLI 分析 commit
@@ -313,6 +397,8 @@ class AnalyzeService:
             issue_title: Issue 標題
             start_date: 開始日期
             end_date: 結束日期
+            issue_description: Issue 描述（可選，過長時截斷）
+            issue_latest_note: Issue 最新一則備註（可選，過長時截斷）
         
         Returns:
             分析結果（包含 summary、completed_items 等）
@@ -326,6 +412,8 @@ class AnalyzeService:
             raise ValueError(error_msg)
         
         logger.info(f"開始分析 {len(commits)} 個 commit，Issue #{issue_id}")
+        issue_description = _truncate(issue_description or "")
+        issue_latest_note = _truncate(issue_latest_note or "")
         
         # 格式化 commit 資料
         commit_list_text = self.format_commit_data(
@@ -334,7 +422,8 @@ class AnalyzeService:
         
         # 載入系統提示詞
         system_prompt = self.load_system_prompt(
-            issue_id, issue_title, start_date, end_date, commit_list_text
+            issue_id, issue_title, start_date, end_date, commit_list_text,
+            issue_description, issue_latest_note
         )
         
         if self.provider == "claude":
@@ -348,16 +437,21 @@ class AnalyzeService:
         logger.info(f"系統提示詞已載入，準備呼叫 {provider_name}...")
         
         # 準備 CLI 輸入資料（JSON 格式）
+        # Claude CLI 只讀取 stdin 的 JSON，變更摘錄放在 JSON；Gemini / OpenCode 的 prompt 已含 commit_list_text 中的摘錄
+        include_excerpt_in_json = self.provider == "claude"
         commit_data_json = json.dumps(
             {
-            'commits': commits,
+            'commits': [_commit_payload(commit, include_excerpt_in_json) for commit in commits],
             'issue_id': issue_id,
             'issue_title': issue_title,
+            'issue_description': issue_description,
+            'issue_latest_note': issue_latest_note,
             'start_date': start_date,
             'end_date': end_date
             },
             ensure_ascii=False,
-            indent=2,
+            # 不縮排：大量 commit 時縮排會讓輸出大小接近兩倍
+            separators=(",", ":"),
         )
 
         # 檢查系統提示詞檔案
@@ -382,23 +476,28 @@ class AnalyzeService:
                 ]
             elif self.provider == "opencode":
                 # OpenCode CLI 命令格式：opencode run "prompt" --format json
-                # 讀取系統提示詞並與用戶提示合併
-                with open(self.system_prompt_file, 'r', encoding='utf-8') as f:
-                    system_prompt_content = f.read()
-                
-                # 替換系統提示詞中的佔位符
-                system_prompt_content = system_prompt_content.replace("{issue_id}", str(issue_id))
-                system_prompt_content = system_prompt_content.replace("{issue_title}", str(issue_title))
-                system_prompt_content = system_prompt_content.replace("{start_date}", str(start_date))
-                system_prompt_content = system_prompt_content.replace("{end_date}", str(end_date))
-                system_prompt_content = system_prompt_content.replace("{commit_list}", commit_list_text)
-                
-                # OpenCode CLI 使用 run 指令，將系統提示詞和資料合併到提示中
-                # 注意：將換行符號替換為空格，避免命令列執行問題
-                full_prompt = f"{system_prompt_content}\n\n【輸入資料（commit JSON）】\n{commit_data_json}"
-                # 將換行符號替換為空格，保持內容連貫
-                full_prompt_single_line = full_prompt.replace('\n', ' ').replace('\r', ' ')
-                full_prompt_single_line = re.sub(r'\s+', ' ', full_prompt_single_line).strip()
+                # 系統提示詞（已替換佔位符，含 commit 列表與變更摘錄）和資料合併成單一參數
+                full_prompt = f"{system_prompt}\n\n【輸入資料（commit JSON）】\n{commit_data_json}"
+                if len(full_prompt.encode("utf-8")) > OPENCODE_MAX_PROMPT_BYTES:
+                    # 超過命令列參數上限時先拿掉變更摘錄，仍超過則無法執行
+                    logger.warning("OpenCode prompt 超過命令列參數上限，略過變更摘錄")
+                    commit_list_text = self.format_commit_data(
+                        commits, issue_id, issue_title, start_date, end_date, include_diff_excerpt=False
+                    )
+                    system_prompt = self.load_system_prompt(
+                        issue_id, issue_title, start_date, end_date, commit_list_text,
+                        issue_description, issue_latest_note
+                    )
+                    full_prompt = f"{system_prompt}\n\n【輸入資料（commit JSON）】\n{commit_data_json}"
+                    if len(full_prompt.encode("utf-8")) > OPENCODE_MAX_PROMPT_BYTES:
+                        raise ValueError(
+                            f"commit 資料過大（{len(commits)} 個 commit），超過 OpenCode CLI 的命令列參數上限，請縮小日期範圍"
+                        )
+                if os.name == "nt":
+                    # Windows 以 shell=True 經 cmd.exe 執行，參數中不能有換行（POSIX 直接傳 argv，保留換行讓摘錄維持逐行格式）
+                    full_prompt_single_line = re.sub(r'\s+', ' ', full_prompt).strip()
+                else:
+                    full_prompt_single_line = full_prompt
                 
                 logger.info(f"執行 OpenCode CLI (超時: {self.timeout}秒)...")
                 cmd = [
@@ -417,14 +516,7 @@ class AnalyzeService:
                     logger.info(f"  Prompt 預覽 (前 200 字元): {full_prompt_single_line[:200]}...")
             
             else:  # gemini
-                with open(self.system_prompt_file, 'r', encoding='utf-8') as f:
-                    system_prompt_content = f.read()
-                
-                system_prompt_content = system_prompt_content.replace("{issue_id}", str(issue_id))
-                system_prompt_content = system_prompt_content.replace("{issue_title}", str(issue_title))
-                system_prompt_content = system_prompt_content.replace("{start_date}", str(start_date))
-                system_prompt_content = system_prompt_content.replace("{end_date}", str(end_date))
-                system_prompt_content = system_prompt_content.replace("{commit_list}", commit_list_text)
+                system_prompt_content = system_prompt
                 
                 no_tools_guard = (
                     "【強制規則】\n"
@@ -973,9 +1065,9 @@ class AnalyzeService:
                 # 加入分析的 commit 資訊
                 result['commits_analyzed'] = [
                     {
-                        'hash': c['hash'],
-                        'message': c['message'],
-                        'date': c['date']
+                        'hash': c.hash,
+                        'message': c.message,
+                        'date': c.date
                     }
                     for c in commits
                 ]
@@ -0,0 +1,216 @@
+"""
+Commit 行數變更統計
+每個 commit 的逐檔新增／刪除行數以陣列保存（不使用每個檔案一個 dict），
+並提供依目錄彙總與 JSON 轉換
+"""
+import posixpath
+import struct
+import sys
+import zlib
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# 彙總目錄時保留的路徑層數（例如 src/services/git_log.py → src/services）
+DIRECTORY_DEPTH = 2
+
+# 序列化格式：檔案數 + 狀態字母 + 二進位旗標 + 新增行數 + 刪除行數 + 以 \0 分隔的路徑
+_HEADER = struct.Struct("<I")
+
+
+def directory_of(path: str, depth: int = DIRECTORY_DEPTH) -> str:
+    """取得檔案所屬的目錄（最多 depth 層；根目錄的檔案回傳 "."）"""
+    directory = posixpath.dirname(path)
+    if not directory:
+        return "."
+    return "/".join(directory.split("/")[:depth])
+
+
+class CommitChurn:
+    """單一 commit 的逐檔行數變更（陣列儲存）"""
+
+    __slots__ = ("paths", "statuses", "binary", "insertions", "deletions")
+
+    def __init__(
+        self,
+        paths: Sequence[str],
+        statuses: bytes,
+        binary: bytes,
+        insertions: array,
+        deletions: array,
+    ):
+        self.paths = tuple(paths)
+        self.statuses = statuses
+        self.binary = binary
+        self.insertions = insertions
+        self.deletions = deletions
+
+    @classmethod
+    def from_files(cls, files: Iterable[Tuple[str, str, Optional[int], Optional[int]]]) -> "CommitChurn":
+        """
+        由 (狀態字母, 路徑, 新增行數, 刪除行數) 建立（二進位檔的行數為 None）
+
+        路徑會 intern，同一個檔案在多個 commit 中只佔一份記憶體。
+        """
+        paths: List[str] = []
+        statuses = bytearray()
+        binary = bytearray()
+        insertions = array("I")
+        deletions = array("I")
+        for status, path, added, deleted in files:
+            paths.append(sys.intern(path))
+            statuses.append(ord(status[:1] or "M") & 0x7F)
+            is_binary = added is None or deleted is None
+            binary.append(1 if is_binary else 0)
+            insertions.append(0 if is_binary else added)
+            deletions.append(0 if is_binary else deleted)
+        return cls(paths, bytes(statuses), bytes(binary), insertions, deletions)
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    @property
+    def total_insertions(self) -> int:
+        return sum(self.insertions)
+
+    @property
+    def total_deletions(self) -> int:
+        return sum(self.deletions)
+
+    @property
+    def binary_files(self) -> int:
+        return sum(self.binary)
+
+    def by_directory(self, depth: int = DIRECTORY_DEPTH) -> Dict[str, List[int]]:
+        """
+        依目錄彙總
+
+        Returns:
+            {目錄: [新增行數, 刪除行數, 檔案數]}
+        """
+        directories: Dict[str, List[int]] = {}
+        for path, added, deleted in zip(self.paths, self.insertions, self.deletions):
+            totals = directories.setdefault(directory_of(path, depth), [0, 0, 0])
+            totals[0] += added
+            totals[1] += deleted
+            totals[2] += 1
+        return directories
+
+    def to_bytes(self) -> bytes:
+        """序列化為壓縮過的位元組（存入 commit 索引）"""
+        insertions = array("I", self.insertions)
+        deletions = array("I", self.deletions)
+        if sys.byteorder != "little":
+            insertions.byteswap()
+            deletions.byteswap()
+        data = b"".join((
+            _HEADER.pack(len(self.paths)),
+            self.statuses,
+            self.binary,
+            insertions.tobytes(),
+            deletions.tobytes(),
+            "\0".join(self.paths).encode("utf-8"),
+        ))
+        return zlib.compress(data)
+
+    @classmethod
+    def from_bytes(cls, blob: bytes) -> "CommitChurn":
+        """由 to_bytes 的結果還原"""
+        data = zlib.decompress(blob)
+        (count,) = _HEADER.unpack_from(data)
+        offset = _HEADER.size
+        statuses = data[offset:offset + count]
+        offset += count
+        binary = data[offset:offset + count]
+        offset += count
+        insertions = array("I")
+        insertions.frombytes(data[offset:offset + 4 * count])
+        offset += 4 * count
+        deletions = array("I")
+        deletions.frombytes(data[offset:offset + 4 * count])
+        offset += 4 * count
+        if sys.byteorder != "little":
+            insertions.byteswap()
+            deletions.byteswap()
+        text = data[offset:].decode("utf-8", errors="replace")
+        paths = [sys.intern(p) for p in text.split("\0")] if count else []
+        return cls(paths, statuses, binary, insertions, deletions)
+
+    def to_dict(self, max_files: int = 20) -> Dict[str, Any]:
+        """
+        轉為 JSON 格式（只列出變更行數最多的 max_files 個檔案）
+
+        Returns:
+            {'insertions', 'deletions', 'binary_files', 'files': [...], 'directories': [...]}
+        """
+        order = sorted(
+            range(len(self.paths)),
+            key=lambda i: self.insertions[i] + self.deletions[i],
+            reverse=True,
+        )
+        files = [
+            {
+                'path': self.paths[i],
+                'status': chr(self.statuses[i]),
+                'insertions': self.insertions[i],
+                'deletions': self.deletions[i],
+                'binary': bool(self.binary[i]),
+            }
+            for i in order[:max_files]
+        ]
+        return {
+            'insertions': self.total_insertions,
+            'deletions': self.total_deletions,
+            'binary_files': self.binary_files,
+            'files': files,
+            'directories': _directory_list(self.by_directory()),
+        }
+
+
+def _directory_list(directories: Dict[str, List[int]], limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """目錄彙總轉為依變更行數排序的列表"""
+    items = sorted(directories.items(), key=lambda item: item[1][0] + item[1][1], reverse=True)
+    if limit is not None:
+        items = items[:limit]
+    return [
+        {'path': path, 'insertions': added, 'deletions': deleted, 'files': files}
+        for path, (added, deleted, files) in items
+    ]
+
+
+def summarize_churn(commits: Iterable[Any], top_directories: int = 10) -> Dict[str, Any]:
+    """
+    彙總多個 commit 的行數變更
+
+    Args:
+        commits: commit 記錄列表（有 churn 的才會計入）
+        top_directories: 最多列出的目錄數
+
+    Returns:
+        {'commits', 'insertions', 'deletions', 'files', 'binary_files', 'directories': [...]}
+    """
+    directories: Dict[str, List[int]] = {}
+    touched_files: set = set()
+    binary_files: set = set()
+    insertions = deletions = counted = 0
+    for commit in commits:
+        churn = commit.churn
+        if churn is None:
+            continue
+        counted += 1
+        insertions += churn.total_insertions
+        deletions += churn.total_deletions
+        touched_files.update(churn.paths)
+        binary_files.update(p for p, b in zip(churn.paths, churn.binary) if b)
+        for path, (added, deleted, files) in churn.by_directory().items():
+            totals = directories.setdefault(path, [0, 0, 0])
+            totals[0] += added
+            totals[1] += deleted
+            totals[2] += files
+    return {
+        'commits': counted,
+        'insertions': insertions,
+        'deletions': deletions,
+        'files': len(touched_files),
+        'binary_files': len(binary_files),
+        'directories': _directory_list(directories, top_directories),
+    }
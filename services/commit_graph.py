@@ -0,0 +1,192 @@
+"""
+commit-graph 與有界的歷史走訪
+查詢很久以前的時間範圍時，`git log <tip> --until=...` 仍會從分支 tip 走訪所有較新的 commit。
+這裡沿著 first-parent 找到 until 邊界（第一個 commit 日期 ≤ until 的祖先），
+改從邊界 commit 與其上方 merge 的其他 parent 開始走訪，結果與從 tip 走訪完全相同；
+commit 的日期與 parents 以 sha 為 key 快取（commit 內容不會改變），
+並在儲存庫沒有 commit-graph 檔案時可選擇在背景產生，讓 git 走訪時不必解壓縮 commit 物件
+"""
+import os
+import subprocess
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+
+from services.git_refs import resolve_git_dirs
+import logging
+
+logger = logging.getLogger(__name__)
+
+# sha → (commit 日期 epoch 秒, first parent 或 None, 其他 parents) 快取的數量上限（所有儲存庫合計）
+_COMMIT_CACHE_MAX_ENTRIES = 500000
+
+# (儲存庫, tip, until) → 走訪起點 快取的數量上限
+_STARTS_CACHE_MAX_ENTRIES = 256
+
+# 邊界上方 merge 的其他 parent 超過此數量時直接從 tip 走訪（起點太多時沒有節省）
+MAX_SIDE_STARTS = 1000
+
+_COMMIT_CACHE: "OrderedDict[Tuple[str, str], Tuple[int, Optional[str], Tuple[str, ...]]]" = OrderedDict()
+_STARTS_CACHE: "OrderedDict[Tuple[str, str, int], List[str]]" = OrderedDict()
+_CACHE_LOCK = threading.Lock()
+
+# 已經開始（或完成）產生 commit-graph 的儲存庫
+_GRAPH_WRITES: Set[str] = set()
+_GRAPH_WRITES_LOCK = threading.Lock()
+
+
+def has_commit_graph(repo_path: str) -> bool:
+    """儲存庫是否已有 commit-graph 檔案（單一檔案或 split 格式的 chain）"""
+    try:
+        _git_dir, common_dir = resolve_git_dirs(repo_path)
+    except ValueError:
+        return False
+    info_dir = os.path.join(common_dir, "objects", "info")
+    return (
+        os.path.isfile(os.path.join(info_dir, "commit-graph"))
+        or os.path.isfile(os.path.join(info_dir, "commit-graphs", "commit-graph-chain"))
+    )
+
+
+def ensure_commit_graph(repo_path: str) -> None:
+    """
+    儲存庫沒有 commit-graph 時在背景執行 `git commit-graph write --reachable`（每個儲存庫只嘗試一次）
+
+    commit-graph 記錄每個 commit 的日期、parents 與 generation number，
+    git 走訪歷史時直接讀取，不必解壓縮 commit 物件；`git gc` 預設也會產生同樣的檔案。
+    """
+    key = os.path.realpath(repo_path)
+    with _GRAPH_WRITES_LOCK:
+        if key in _GRAPH_WRITES:
+            return
+        _GRAPH_WRITES.add(key)
+    if has_commit_graph(repo_path):
+        return
+
+    def write() -> None:
+        try:
+            result = subprocess.run(
+                ["git", "-C", repo_path, "commit-graph", "write", "--reachable"],
+                capture_output=True,
+                stdin=subprocess.DEVNULL,
+            )
+        except OSError as e:
+            logger.warning(f"無法產生 commit-graph ({repo_path}): {e}")
+            return
+        if result.returncode != 0:
+            stderr = result.stderr.decode("utf-8", errors="replace").strip()
+            logger.warning(f"產生 commit-graph 失敗 ({repo_path}): {stderr or result.returncode}")
+        else:
+            logger.info(f"已產生 commit-graph: {repo_path}")
+
+    threading.Thread(target=write, name="commit-graph-write", daemon=True).start()
+
+
+def _load_first_parent_segment(repo_key: str, repo_path: str, start: str, until_ts: int) -> None:
+    """
+    以 `git rev-list --first-parent --timestamp --parents` 從 start 往下讀取 commit 的日期與 parents 並放入快取，
+    讀到日期 ≤ until 的 commit 或已快取的 commit 時停止（提早結束 git 子行程）
+
+    rev-list 不輸出 commit 內容，有 commit-graph 時日期與 parents 直接由 commit-graph 讀取，不必解壓縮 commit 物件。
+    """
+    cmd = ["git", "-C", repo_path, "rev-list", "--first-parent", "--timestamp", "--parents", start, "--"]
+    try:
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.DEVNULL)
+    except FileNotFoundError:
+        raise ValueError("找不到 git 執行檔，請確認 Git 已安裝並在 PATH 中")
+
+    finished = False
+    entries = []
+    try:
+        for line in proc.stdout:
+            parts = line.decode("ascii").split()
+            if len(parts) < 2:
+                continue
+            # 格式：<commit 日期> <sha> <parents...>
+            date_ts, sha = int(parts[0]), parts[1]
+            parents = parts[2:]
+            entries.append((sha, (date_ts, parents[0] if parents else None, tuple(parents[1:]))))
+            if date_ts <= until_ts or not parents:
+                break
+            with _CACHE_LOCK:
+                if (repo_key, parents[0]) in _COMMIT_CACHE:
+                    break
+        else:
+            stderr = proc.stderr.read().decode("utf-8", errors="replace").strip()
+            returncode = proc.wait()
+            finished = True
+            if returncode != 0:
+                raise ValueError(f"git rev-list 執行失敗: {stderr or returncode}")
+    finally:
+        if not finished:
+            proc.kill()
+            proc.wait()
+        proc.stdout.close()
+        proc.stderr.close()
+
+    with _CACHE_LOCK:
+        for sha, info in entries:
+            _COMMIT_CACHE[(repo_key, sha)] = info
+            _COMMIT_CACHE.move_to_end((repo_key, sha))
+        while len(_COMMIT_CACHE) > _COMMIT_CACHE_MAX_ENTRIES:
+            _COMMIT_CACHE.popitem(last=False)
+
+
+def bounded_walk_starts(repo_path: str, tip_sha: str, until: datetime) -> List[str]:
+    """
+    找出與從 tip 走訪 `--until=until` 結果相同、但不必經過 until 之後歷史的走訪起點
+
+    沿 first-parent 由 tip 往下找到第一個 commit 日期 ≤ until 的祖先（邊界），
+    起點為邊界 commit 加上邊界上方各 merge commit 的其他 parent。
+    邊界上方的 first-parent commit 日期都在 until 之後，本來就不會被列出，
+    因此 tip 可到達的 commit 中，所有可能被列出的都能從這些起點到達。
+
+    Args:
+        repo_path: 儲存庫路徑
+        tip_sha: 分支 tip 的 sha
+        until: 查詢範圍的結束時間
+
+    Returns:
+        走訪起點 sha 列表（tip 本身就在範圍內時為 [tip_sha]；整段歷史都在 until 之後時可能為空列表）
+
+    Raises:
+        ValueError: git 執行失敗
+    """
+    repo_key = os.path.realpath(repo_path)
+    until_ts = int(until.timestamp())
+    starts_key = (repo_key, tip_sha, until_ts)
+    with _CACHE_LOCK:
+        cached = _STARTS_CACHE.get(starts_key)
+        if cached is not None:
+            _STARTS_CACHE.move_to_end(starts_key)
+            return list(cached)
+
+    side_starts: Dict[str, None] = {}
+    boundary: Optional[str] = None
+    current: Optional[str] = tip_sha
+    while current is not None:
+        with _CACHE_LOCK:
+            info = _COMMIT_CACHE.get((repo_key, current))
+        if info is None:
+            _load_first_parent_segment(repo_key, repo_path, current, until_ts)
+            with _CACHE_LOCK:
+                info = _COMMIT_CACHE.get((repo_key, current))
+            if info is None:
+                raise ValueError(f"無法讀取 commit {current}")
+        date_ts, first_parent, other_parents = info
+        if date_ts <= until_ts:
+            boundary = current
+            break
+        for parent in other_parents:
+            side_starts[parent] = None
+        if len(side_starts) > MAX_SIDE_STARTS:
+            return [tip_sha]
+        current = first_parent
+
+    starts = ([boundary] if boundary is not None else []) + [s for s in side_starts if s != boundary]
+    with _CACHE_LOCK:
+        _STARTS_CACHE[starts_key] = starts
+        while len(_STARTS_CACHE) > _STARTS_CACHE_MAX_ENTRIES:
+            _STARTS_CACHE.popitem(last=False)
+    return list(starts)
@@ -0,0 +1,454 @@
+"""
+本機 commit 索引
+以 SQLite 儲存各儲存庫的 commit 資訊與檔案變更統計，依分支增量更新，
+讓時間範圍查詢不需要每次重新走訪 git 歷史；
+同時建立 Redmine Issue 引用（commit 訊息中的 `#123`）到 commit 的反向索引
+"""
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from services.churn import CommitChurn
+from services.commit_record import CommitRecord
+from services.git_log import is_ancestor, iter_log_commits, iter_rev_list
+from utils.config import CACHE_DIR
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = CACHE_DIR / "commit_index.sqlite3"
+
+# 結構變更時遞增，舊版索引會整個重建
+SCHEMA_VERSION = 3
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS repos (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    mailmap_sig TEXT
+);
+CREATE TABLE IF NOT EXISTS commits (
+    repo_id INTEGER NOT NULL,
+    sha TEXT NOT NULL,
+    author_name TEXT NOT NULL,
+    author_email TEXT NOT NULL,
+    author_name_lc TEXT NOT NULL,
+    author_email_lc TEXT NOT NULL,
+    date_ts INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    message TEXT NOT NULL,
+    files_added INTEGER NOT NULL,
+    files_modified INTEGER NOT NULL,
+    files_deleted INTEGER NOT NULL,
+    insertions INTEGER NOT NULL,
+    deletions INTEGER NOT NULL,
+    file_stats BLOB NOT NULL,
+    PRIMARY KEY (repo_id, sha)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_commits_date ON commits (repo_id, date_ts);
+CREATE INDEX IF NOT EXISTS idx_commits_author_email ON commits (repo_id, author_email_lc, date_ts);
+CREATE INDEX IF NOT EXISTS idx_commits_author_name ON commits (repo_id, author_name_lc, date_ts);
+CREATE TABLE IF NOT EXISTS branch_commits (
+    repo_id INTEGER NOT NULL,
+    branch TEXT NOT NULL,
+    sha TEXT NOT NULL,
+    PRIMARY KEY (repo_id, branch, sha)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_branch_commits_sha ON branch_commits (repo_id, sha);
+CREATE TABLE IF NOT EXISTS branch_tips (
+    repo_id INTEGER NOT NULL,
+    branch TEXT NOT NULL,
+    tip_sha TEXT NOT NULL,
+    PRIMARY KEY (repo_id, branch)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS issue_refs (
+    issue_id INTEGER NOT NULL,
+    repo_id INTEGER NOT NULL,
+    sha TEXT NOT NULL,
+    PRIMARY KEY (issue_id, repo_id, sha)
+) WITHOUT ROWID;
+"""
+
+# 每批寫入的筆數
+_BATCH_SIZE = 2000
+
+# Redmine Issue 引用：`#123`、`refs #123`、`fixes #123, #124`
+# （排除 `&#123;` 這類 HTML 字元參照與 `abc#123` 這類接在文字後面的 #）
+_ISSUE_REF_PATTERN = re.compile(r"(?<![\w&/])#(\d+)(?!\w)")
+
+_TABLES = ("repos", "commits", "branch_commits", "branch_tips", "issue_refs")
+
+
+def extract_issue_ids(message: str) -> List[int]:
+    """
+    取出 commit 訊息中引用的 Redmine Issue 編號
+
+    Args:
+        message: commit 訊息
+
+    Returns:
+        Issue 編號列表（不重複，依出現順序）
+    """
+    return list(dict.fromkeys(int(m) for m in _ISSUE_REF_PATTERN.findall(message)))
+
+
+def _mailmap_signature(repo_path: str) -> str:
+    """取得 .mailmap 的簽章（mtime/size）；.mailmap 改變時索引中的作者身份需要重建"""
+    try:
+        st = (Path(repo_path) / ".mailmap").stat()
+    except OSError:
+        return ""
+    return f"{st.st_mtime_ns}:{st.st_size}"
+
+
+def _chunks(items: Sequence[Any], size: int) -> Iterable[Sequence[Any]]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+class CommitIndex:
+    """本機 commit 索引（SQLite）"""
+
+    def __init__(self, db_path: Optional[Path] = None):
+        """
+        初始化 commit 索引
+
+        Args:
+            db_path: SQLite 檔案路徑（可選，預設放在快取目錄）
+        """
+        self.db_path = Path(db_path) if db_path else DEFAULT_DB_PATH
+        self._local = threading.local()
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        self._init_schema()
+
+    def _connection(self) -> sqlite3.Connection:
+        """取得目前執行緒的資料庫連線（每個執行緒各自一條連線）"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.db_path), timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self) -> None:
+        conn = self._connection()
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version != SCHEMA_VERSION:
+            for table in _TABLES:
+                conn.execute(f"DROP TABLE IF EXISTS {table}")
+        conn.executescript(_SCHEMA)
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.commit()
+
+    def _repo_lock(self, repo_key: str) -> threading.Lock:
+        with self._locks_guard:
+            lock = self._locks.get(repo_key)
+            if lock is None:
+                lock = self._locks[repo_key] = threading.Lock()
+            return lock
+
+    def _repo_id(self, conn: sqlite3.Connection, repo_path: str) -> int:
+        """
+        取得儲存庫 ID（第一次使用時建立）
+        .mailmap 改變時清除該儲存庫的索引，讓作者身份重新套用 mailmap
+        """
+        repo_key = os.path.realpath(repo_path)
+        mailmap_sig = _mailmap_signature(repo_path)
+        row = conn.execute("SELECT id, mailmap_sig FROM repos WHERE path = ?", (repo_key,)).fetchone()
+        if row is None:
+            cur = conn.execute("INSERT INTO repos (path, mailmap_sig) VALUES (?, ?)", (repo_key, mailmap_sig))
+            return cur.lastrowid
+        repo_id, stored_sig = row
+        if stored_sig != mailmap_sig:
+            logger.info(f"{repo_key} 的 .mailmap 已變更，重建 commit 索引")
+            for table in _TABLES[1:]:
+                conn.execute(f"DELETE FROM {table} WHERE repo_id = ?", (repo_id,))
+            conn.execute("UPDATE repos SET mailmap_sig = ? WHERE id = ?", (mailmap_sig, repo_id))
+        return repo_id
+
+    @staticmethod
+    def _existing_repo_id(conn: sqlite3.Connection, repo_path: str) -> Optional[int]:
+        """取得已索引儲存庫的 ID（唯讀，尚未索引時回傳 None）"""
+        row = conn.execute("SELECT id FROM repos WHERE path = ?", (os.path.realpath(repo_path),)).fetchone()
+        return row[0] if row else None
+
+    def refresh(self, repo_path: str, branch: str, tip_sha: str) -> None:
+        """
+        增量更新分支的索引
+
+        分支只是往前移動（fast-forward）時，只走訪 舊 tip..新 tip 之間的 commit；
+        分支被重寫或第一次索引時，重新列出分支上的 commit，但只對尚未索引過的 commit 取得詳細資訊。
+
+        Args:
+            repo_path: 儲存庫路徑
+            branch: 分支名稱
+            tip_sha: 分支目前指向的 commit sha
+        """
+        repo_key = os.path.realpath(repo_path)
+        with self._repo_lock(repo_key):
+            conn = self._connection()
+            try:
+                self._refresh_locked(conn, repo_path, branch, tip_sha)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    def _refresh_locked(self, conn: sqlite3.Connection, repo_path: str, branch: str, tip_sha: str) -> None:
+        repo_id = self._repo_id(conn, repo_path)
+        row = conn.execute(
+            "SELECT tip_sha FROM branch_tips WHERE repo_id = ? AND branch = ?",
+            (repo_id, branch),
+        ).fetchone()
+        old_tip = row[0] if row else None
+        if old_tip == tip_sha:
+            return
+
+        if old_tip and is_ancestor(repo_path, old_tip, tip_sha):
+            rev_args = [tip_sha, f"^{old_tip}"]
+        else:
+            rev_args = [tip_sha]
+            conn.execute(
+                "DELETE FROM branch_commits WHERE repo_id = ? AND branch = ?",
+                (repo_id, branch),
+            )
+
+        shas = list(iter_rev_list(repo_path, rev_args))
+        missing = self._missing_shas(conn, repo_id, shas)
+        if missing:
+            logger.info(f"索引 {os.path.realpath(repo_path)} ({branch})：新增 {len(missing)} 個 commit")
+            self._index_commits(conn, repo_id, repo_path, missing)
+
+        for chunk in _chunks(shas, _BATCH_SIZE):
+            conn.executemany(
+                "INSERT OR IGNORE INTO branch_commits (repo_id, branch, sha) VALUES (?, ?, ?)",
+                [(repo_id, branch, sha) for sha in chunk],
+            )
+        conn.execute(
+            "INSERT OR REPLACE INTO branch_tips (repo_id, branch, tip_sha) VALUES (?, ?, ?)",
+            (repo_id, branch, tip_sha),
+        )
+
+    @staticmethod
+    def _missing_shas(conn: sqlite3.Connection, repo_id: int, shas: List[str]) -> List[str]:
+        """找出尚未索引的 commit"""
+        missing = []
+        for chunk in _chunks(shas, 500):
+            placeholders = ",".join("?" * len(chunk))
+            known = {
+                r[0] for r in conn.execute(
+                    f"SELECT sha FROM commits WHERE repo_id = ? AND sha IN ({placeholders})",
+                    (repo_id, *chunk),
+                )
+            }
+            missing.extend(sha for sha in chunk if sha not in known)
+        return missing
+
+    @staticmethod
+    def _index_commits(conn: sqlite3.Connection, repo_id: int, repo_path: str, shas: List[str]) -> None:
+        """以單一 git log --no-walk --stdin 取得 commit 詳細資訊並寫入索引"""
+        stdin_data = "".join(f"{sha}\n" for sha in shas).encode("ascii")
+        rows = []
+        ref_rows = []
+        for commit in iter_log_commits(
+            repo_path,
+            None,
+            extra_args=["--no-walk=unsorted", "--stdin"],
+            stdin_data=stdin_data,
+        ):
+            churn = commit.churn
+            rows.append((
+                repo_id,
+                commit.full_hash,
+                commit.author_name,
+                commit.author_email,
+                commit.author_name.lower(),
+                commit.author_email.lower(),
+                int(datetime.fromisoformat(commit.date).timestamp()),
+                commit.date,
+                commit.message,
+                commit.files_added,
+                commit.files_modified,
+                commit.files_deleted,
+                churn.total_insertions,
+                churn.total_deletions,
+                churn.to_bytes(),
+            ))
+            for issue_id in extract_issue_ids(commit.message):
+                ref_rows.append((issue_id, repo_id, commit.full_hash))
+            if len(rows) >= _BATCH_SIZE:
+                CommitIndex._write_rows(conn, rows, ref_rows)
+                rows, ref_rows = [], []
+        if rows:
+            CommitIndex._write_rows(conn, rows, ref_rows)
+
+    @staticmethod
+    def _write_rows(conn: sqlite3.Connection, rows: List[tuple], ref_rows: List[tuple]) -> None:
+        conn.executemany("INSERT OR IGNORE INTO commits VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        if ref_rows:
+            conn.executemany("INSERT OR IGNORE INTO issue_refs (issue_id, repo_id, sha) VALUES (?, ?, ?)", ref_rows)
+
+    @staticmethod
+    def _range_query(
+        select: str,
+        repo_id: int,
+        branch: str,
+        start_date: datetime,
+        end_date: datetime,
+        names: Optional[List[str]],
+        emails: Optional[List[str]],
+    ) -> tuple[str, list]:
+        """組出依分支、時間範圍與作者過濾的查詢"""
+        sql = (
+            f"SELECT {select} FROM commits c "
+            "JOIN branch_commits b ON b.repo_id = c.repo_id AND b.sha = c.sha AND b.branch = ? "
+            "WHERE c.repo_id = ? AND c.date_ts BETWEEN ? AND ?"
+        )
+        params: list = [branch, repo_id, int(start_date.timestamp()), int(end_date.timestamp())]
+        conditions = []
+        if names:
+            conditions.append(f"c.author_name_lc IN ({','.join('?' * len(names))})")
+            params.extend(n.lower() for n in names)
+        if emails:
+            conditions.append(f"c.author_email_lc IN ({','.join('?' * len(emails))})")
+            params.extend(e.lower() for e in emails)
+        if conditions:
+            sql += f" AND ({' OR '.join(conditions)})"
+        return sql, params
+
+    def query_commits(
+        self,
+        repo_path: str,
+        branch: str,
+        start_date: datetime,
+        end_date: datetime,
+        names: Optional[List[str]] = None,
+        emails: Optional[List[str]] = None,
+    ) -> List[CommitRecord]:
+        """
+        查詢分支上指定時間範圍內的 commit（需先呼叫 refresh）
+
+        Args:
+            repo_path: 儲存庫路徑
+            branch: 分支名稱
+            start_date: 開始日期
+            end_date: 結束日期
+            names: 作者名稱（可選，不分大小寫）
+            emails: 作者 Email（可選，不分大小寫）
+
+        Returns:
+            commit 記錄列表（依日期由新到舊）
+        """
+        conn = self._connection()
+        repo_id = self._existing_repo_id(conn, repo_path)
+        if repo_id is None:
+            return []
+        sql, params = self._range_query(
+            "c.sha, c.author_name, c.author_email, c.date, c.message, "
+            "c.files_added, c.files_modified, c.files_deleted, c.file_stats",
+            repo_id, branch, start_date, end_date, names, emails,
+        )
+        sql += " ORDER BY c.date_ts DESC"
+        return [self._record(row) for row in conn.execute(sql, params)]
+
+    def count_commits(
+        self,
+        repo_path: str,
+        branch: str,
+        start_date: datetime,
+        end_date: datetime,
+        names: Optional[List[str]] = None,
+        emails: Optional[List[str]] = None,
+    ) -> int:
+        """
+        計算分支上指定時間範圍內的 commit 數量（需先呼叫 refresh）
+
+        Args:
+            repo_path: 儲存庫路徑
+            branch: 分支名稱
+            start_date: 開始日期
+            end_date: 結束日期
+            names: 作者名稱（可選，不分大小寫）
+            emails: 作者 Email（可選，不分大小寫）
+
+        Returns:
+            commit 數量
+        """
+        conn = self._connection()
+        repo_id = self._existing_repo_id(conn, repo_path)
+        if repo_id is None:
+            return 0
+        sql, params = self._range_query("COUNT(*)", repo_id, branch, start_date, end_date, names, emails)
+        return conn.execute(sql, params).fetchone()[0]
+
+    def query_issue_commits(
+        self,
+        issue_id: int,
+        start_date: datetime,
+        end_date: datetime,
+        repo_paths: Optional[List[str]] = None,
+    ) -> List[Tuple[str, List[str], CommitRecord]]:
+        """
+        查詢訊息中引用指定 Issue 的 commit（只包含目前仍在已索引分支上的 commit）
+
+        Args:
+            issue_id: Redmine Issue 編號
+            start_date: 開始日期
+            end_date: 結束日期
+            repo_paths: 限定的儲存庫路徑（可選，預設查詢所有已索引的儲存庫）
+
+        Returns:
+            (儲存庫路徑, 所在分支列表, commit 記錄) 列表（依日期由新到舊）
+        """
+        sql = (
+            "SELECT r.path, c.sha, c.author_name, c.author_email, c.date, c.message, "
+            "c.files_added, c.files_modified, c.files_deleted, c.file_stats, "
+            "GROUP_CONCAT(b.branch, char(31)) "
+            "FROM issue_refs i "
+            "JOIN commits c ON c.repo_id = i.repo_id AND c.sha = i.sha "
+            "JOIN branch_commits b ON b.repo_id = i.repo_id AND b.sha = i.sha "
+            "JOIN repos r ON r.id = i.repo_id "
+            "WHERE i.issue_id = ? AND c.date_ts BETWEEN ? AND ?"
+        )
+        params: list = [issue_id, int(start_date.timestamp()), int(end_date.timestamp())]
+        if repo_paths is not None:
+            keys = list(dict.fromkeys(os.path.realpath(p) for p in repo_paths))
+            if not keys:
+                return []
+            sql += f" AND r.path IN ({','.join('?' * len(keys))})"
+            params.extend(keys)
+        sql += " GROUP BY i.repo_id, i.sha ORDER BY c.date_ts DESC"
+
+        return [
+            (row[0], sorted(row[-1].split("\x1f")), self._record(row[1:-1]))
+            for row in self._connection().execute(sql, params)
+        ]
+
+    @staticmethod
+    def _record(row: Sequence[Any]) -> CommitRecord:
+        """由 (sha, 作者名稱, 作者 Email, 日期, 訊息, 新增/修改/刪除檔案數, file_stats) 建立 commit 記錄"""
+        sha, name, email, date, message, added, modified, deleted, file_stats = row
+        return CommitRecord(
+            sha, name, email, date, message, added, modified, deleted,
+            CommitChurn.from_bytes(file_stats),
+        )
+
+
+_COMMIT_INDEX: Optional[CommitIndex] = None
+_COMMIT_INDEX_LOCK = threading.Lock()
+
+
+def get_commit_index() -> CommitIndex:
+    """取得程序內共用的 commit 索引"""
+    global _COMMIT_INDEX
+    with _COMMIT_INDEX_LOCK:
+        if _COMMIT_INDEX is None:
+            _COMMIT_INDEX = CommitIndex()
+        return _COMMIT_INDEX
@@ -0,0 +1,120 @@
+"""
+精簡的 commit 記錄
+以 __slots__ 物件取代每個 commit 一組巢狀 dict：作者字串共用（intern）、
+短 sha 與 dict 結構在需要時才產生、commit 訊息在第一次讀取時才解碼，
+只有在輸出 JSON 時才轉成 API 使用的 dict 格式
+"""
+import sys
+from typing import Any, Dict, List, Optional, Union
+
+from services.churn import CommitChurn
+
+
+class CommitRecord:
+    """單一 commit 的資料"""
+
+    __slots__ = (
+        "full_hash",
+        "author_name",
+        "author_email",
+        "date",
+        "_message",
+        "files_added",
+        "files_modified",
+        "files_deleted",
+        "churn",
+        # 以下為選用欄位（多來源分析、patch-id 合併、變更摘錄時才會設定）
+        "sources",
+        "duplicates",
+        "diff_excerpt",
+    )
+
+    def __init__(
+        self,
+        full_hash: str,
+        author_name: str,
+        author_email: str,
+        date: str,
+        message: Union[bytes, str],
+        files_added: int = 0,
+        files_modified: int = 0,
+        files_deleted: int = 0,
+        churn: Optional[CommitChurn] = None,
+    ):
+        """
+        建立 commit 記錄
+
+        Args:
+            full_hash: 完整 sha
+            author_name: 作者名稱
+            author_email: 作者 Email
+            date: ISO 8601 日期字串
+            message: commit 訊息（可傳入未解碼的 UTF-8 bytes，第一次讀取時才解碼）
+            files_added: 新增的檔案數
+            files_modified: 修改的檔案數
+            files_deleted: 刪除的檔案數
+            churn: 逐檔行數變更（可選）
+        """
+        self.full_hash = full_hash
+        # 同一位作者在每個 commit 都相同，intern 後所有記錄共用同一個字串
+        self.author_name = sys.intern(author_name)
+        self.author_email = sys.intern(author_email)
+        self.date = date
+        self._message = message
+        self.files_added = files_added
+        self.files_modified = files_modified
+        self.files_deleted = files_deleted
+        self.churn = churn
+        self.sources: Optional[List[Dict[str, str]]] = None
+        self.duplicates: Optional[List[str]] = None
+        self.diff_excerpt: Optional[str] = None
+
+    @property
+    def hash(self) -> str:
+        """短 sha（前 8 碼）"""
+        return self.full_hash[:8]
+
+    @property
+    def message(self) -> str:
+        """commit 訊息（第一次讀取時才解碼）"""
+        message = self._message
+        if isinstance(message, bytes):
+            message = self._message = message.decode("utf-8", errors="replace").strip()
+        return message
+
+    def copy(self) -> "CommitRecord":
+        """淺層複製（選用欄位的 list 仍共用，修改前請先換成新的 list）"""
+        clone = CommitRecord.__new__(CommitRecord)
+        for name in self.__slots__:
+            setattr(clone, name, getattr(self, name))
+        return clone
+
+    def to_dict(self) -> Dict[str, Any]:
+        """轉為 API / AI 輸入使用的 JSON 格式"""
+        data: Dict[str, Any] = {
+            'hash': self.hash,
+            'full_hash': self.full_hash,
+            'author': {
+                'name': self.author_name,
+                'email': self.author_email
+            },
+            'date': self.date,
+            'message': self.message,
+            'files_changed': {
+                'added': self.files_added,
+                'modified': self.files_modified,
+                'deleted': self.files_deleted
+            }
+        }
+        if self.churn is not None:
+            data['churn'] = self.churn.to_dict()
+        if self.sources is not None:
+            data['sources'] = self.sources
+        if self.duplicates is not None:
+            data['duplicates'] = self.duplicates
+        if self.diff_excerpt is not None:
+            data['diff_excerpt'] = self.diff_excerpt
+        return data
+
+    def __repr__(self) -> str:
+        return f"CommitRecord({self.hash}, {self.author_name!r}, {self.date})"
@@ -0,0 +1,276 @@
+"""
+Commit 程式碼變更摘錄
+串流讀取 `git log -p` 的輸出，只保留檔案路徑、hunk 標頭與有限的變更行，
+讓 AI 分析時有實際的程式碼脈絡，同時控制每個 commit 與整體的大小上限
+"""
+import subprocess
+from typing import Any, Dict, Iterable, List, Optional
+from services.commit_record import CommitRecord
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 預設排除的檔案（lockfile 與產生的檔案）：以 pathspec 交給 git 排除，不會產生這些檔案的 diff
+DEFAULT_EXCLUDES = [
+    "**/package-lock.json",
+    "**/yarn.lock",
+    "**/pnpm-lock.yaml",
+    "**/poetry.lock",
+    "**/Pipfile.lock",
+    "**/Cargo.lock",
+    "**/composer.lock",
+    "**/Gemfile.lock",
+    "**/go.sum",
+    "**/*.min.js",
+    "**/*.min.css",
+    "**/*.map",
+    "**/*_pb2.py",
+    "**/*.pb.go",
+    "**/dist/**",
+    "**/build/**",
+    "**/vendor/**",
+    "**/node_modules/**",
+]
+
+# 單行最多讀取的位元組數（壓縮過的單行檔案可能有數 MB，超過的部分直接丟棄）
+_MAX_LINE_BYTES = 4096
+# 摘錄中每一行最多保留的字元數
+_MAX_EXCERPT_LINE_CHARS = 200
+# 每個 commit 保留給檔案路徑與 hunk 標頭的比例（變更行只能使用其餘的預算）
+_HEADER_RESERVE_RATIO = 0.25
+# 保留給結尾「已截斷」說明的位元組數，確保摘錄不會超過預算
+_SUFFIX_RESERVE = 64
+# 每個 commit 至少分配的預算（太少時摘錄沒有意義）
+_MIN_BYTES_PER_COMMIT = 256
+
+_RECORD_PREFIX = b"\x1e"
+
+
+def _file_path(diff_header: str) -> str:
+    """從 `diff --git a/x b/y` 取出變更後的路徑"""
+    _prefix, sep, path = diff_header.rpartition(" b/")
+    path = path if sep else diff_header[len("diff --git "):]
+    return path.strip().strip('"')
+
+
+class _CommitExcerpt:
+    """單一 commit 的摘錄緩衝區（大小受預算限制）"""
+
+    __slots__ = ("budget", "used", "parts", "files", "omitted_files", "truncated", "skipping")
+
+    def __init__(self, budget: int):
+        self.budget = max(0, budget - _SUFFIX_RESERVE)
+        self.used = 0
+        self.parts: List[str] = []
+        self.files = 0
+        self.omitted_files = 0
+        self.truncated = False
+        # 目前檔案的路徑沒有放進摘錄時，其 hunk 與變更行也一併略過
+        self.skipping = False
+
+    def _append(self, text: str, limit: int) -> bool:
+        size = len(text.encode("utf-8"))
+        if self.used + size > limit:
+            self.truncated = True
+            return False
+        self.parts.append(text)
+        self.used += size
+        return True
+
+    def add_file(self, path: str) -> None:
+        self.files += 1
+        self.skipping = not self._append(f"檔案: {path}\n", self.budget)
+        if self.skipping:
+            self.omitted_files += 1
+
+    def add_header(self, text: str) -> None:
+        if not self.skipping:
+            self._append(text + "\n", self.budget)
+
+    def add_line(self, text: str) -> None:
+        if self.skipping:
+            return
+        # 變更行不能用掉保留給路徑與 hunk 標頭的預算
+        self._append(text + "\n", int(self.budget * (1 - _HEADER_RESERVE_RATIO)))
+
+    def render(self) -> str:
+        text = "".join(self.parts)
+        if self.omitted_files:
+            text += f"…（另有 {self.omitted_files} 個檔案未列出）\n"
+        elif self.truncated:
+            text += "…（已截斷）\n"
+        return text
+
+
+def extract_diff_excerpts(
+    repo_path: str,
+    shas: Iterable[str],
+    max_bytes_per_commit: int = 4000,
+    max_total_bytes: int = 60000,
+    excludes: Optional[List[str]] = None,
+) -> Dict[str, str]:
+    """
+    以單一 `git log -p --no-walk --stdin` 串流取得多個 commit 的變更摘錄
+
+    - 只保留檔案路徑、hunk 標頭（含函式名稱）與 +/- 變更行，不含上下文行
+    - 二進位檔只標示檔名，lockfile 與產生的檔案由 pathspec 排除（git 不會讀取其內容產生 diff）
+    - 每次只讀一行、每行最多讀 4 KB，記憶體用量與 commit 大小無關
+    - 總預算用完時立即結束 git 子行程
+
+    Args:
+        repo_path: 儲存庫路徑
+        shas: commit sha 列表（依優先順序，預算先分給前面的 commit）
+        max_bytes_per_commit: 每個 commit 的摘錄上限（位元組）
+        max_total_bytes: 所有 commit 的摘錄總上限（位元組）
+        excludes: 要排除的 glob 路徑（可選，預設為 DEFAULT_EXCLUDES）
+
+    Returns:
+        {commit sha: 摘錄文字}
+
+    Raises:
+        ValueError: git 執行失敗
+    """
+    sha_list = list(dict.fromkeys(shas))
+    if not sha_list or max_total_bytes <= 0:
+        return {}
+    # commit 很多時平均分配總預算，避免前幾個 commit 用完全部預算；
+    # 平均下來每個 commit 太少時，只摘錄前面（優先順序較高）的 commit
+    max_commits = max(1, max_total_bytes // _MIN_BYTES_PER_COMMIT)
+    sha_list = sha_list[:max_commits]
+    per_commit = min(max_bytes_per_commit, max_total_bytes // len(sha_list))
+
+    pathspec = ["."] + [f":(exclude,glob){pattern}" for pattern in (excludes if excludes is not None else DEFAULT_EXCLUDES)]
+    cmd = [
+        "git", "-C", repo_path,
+        "-c", "core.quotePath=false",
+        "log", "--no-walk=unsorted", "--stdin",
+        "--format=%x1e%H", "-p", "--unified=0",
+        "--no-color", "--no-ext-diff", "--no-textconv", "--no-renames",
+        # merge commit 只看相對第一個父節點的變更
+        "--diff-merges=first-parent",
+        "--",
+    ] + pathspec
+    try:
+        proc = subprocess.Popen(
+            cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+    except FileNotFoundError:
+        raise ValueError("找不到 git 執行檔，請確認 Git 已安裝並在 PATH 中")
+
+    excerpts: Dict[str, str] = {}
+    total_used = 0
+    current_sha: Optional[str] = None
+    current: Optional[_CommitExcerpt] = None
+    in_file_header = False
+
+    def flush() -> None:
+        nonlocal total_used
+        if current_sha is not None and current is not None and current.parts:
+            text = current.render()
+            size = len(text.encode("utf-8"))
+            if total_used + size <= max_total_bytes:
+                excerpts[current_sha] = text
+                total_used += size
+
+    finished = False
+    try:
+        # git log --stdin 會先讀完所有 revision 才開始輸出，先寫完再讀不會卡住
+        proc.stdin.write("".join(f"{sha}\n" for sha in sha_list).encode("ascii"))
+        proc.stdin.close()
+
+        while True:
+            raw = proc.stdout.readline(_MAX_LINE_BYTES)
+            if not raw:
+                break
+            if not raw.endswith(b"\n"):
+                # 超長的行：丟棄剩下的部分
+                while True:
+                    rest = proc.stdout.readline(_MAX_LINE_BYTES)
+                    if not rest or rest.endswith(b"\n"):
+                        break
+
+            if raw.startswith(_RECORD_PREFIX):
+                flush()
+                current_sha, current = None, None
+                if total_used >= max_total_bytes:
+                    break
+                current_sha = raw[1:].strip().decode("ascii")
+                current = _CommitExcerpt(min(per_commit, max_total_bytes - total_used))
+                in_file_header = False
+                continue
+            if current is None:
+                continue
+
+            line = raw.rstrip(b"\r\n").decode("utf-8", errors="replace")
+            if line.startswith("diff --git "):
+                current.add_file(_file_path(line))
+                in_file_header = True
+            elif line.startswith("Binary files ") or line.startswith("GIT binary patch"):
+                current.add_header("  （二進位檔，略過內容）")
+            elif line.startswith("@@"):
+                current.add_header(line[:_MAX_EXCERPT_LINE_CHARS])
+                in_file_header = False
+            elif in_file_header:
+                # `diff --git` 與第一個 `@@` 之間的 `---` / `+++` 是檔案標頭；hunk 內的 `++counter;` 等是變更行
+                continue
+            elif line.startswith(("+", "-")):
+                current.add_line(line[:_MAX_EXCERPT_LINE_CHARS])
+        flush()
+
+        if total_used < max_total_bytes:
+            stderr = proc.stderr.read().decode("utf-8", errors="replace").strip()
+            returncode = proc.wait()
+            finished = True
+            if returncode != 0:
+                raise ValueError(f"git log -p 執行失敗: {stderr or returncode}")
+    finally:
+        if not finished:
+            # 預算用完而提早停止（或發生例外）時，結束 git 子行程
+            proc.kill()
+            proc.wait()
+        proc.stdout.close()
+        proc.stderr.close()
+    return excerpts
+
+
+def attach_diff_excerpts(
+    commits: List[CommitRecord],
+    repo_of: Dict[str, str],
+    options: Dict[str, Any],
+) -> None:
+    """
+    依設定設定 commit 的 diff_excerpt（每個儲存庫一次 git 呼叫；失敗時只記錄警告）
+
+    Args:
+        commits: commit 列表（依優先順序）
+        repo_of: {commit 完整 sha: 所屬儲存庫路徑}
+        options: ai.diff_context 設定（max_bytes_per_commit、max_total_bytes、exclude）
+    """
+    shas_by_repo: Dict[str, List[str]] = {}
+    for commit in commits:
+        shas_by_repo.setdefault(repo_of[commit.full_hash], []).append(commit.full_hash)
+
+    max_total = int(options.get('max_total_bytes', 60000))
+    excludes = DEFAULT_EXCLUDES + list(options.get('exclude', []))
+    excerpts: Dict[str, str] = {}
+    for repo_path, shas in shas_by_repo.items():
+        # 總預算依各儲存庫的 commit 數比例分配
+        budget = max_total * len(shas) // len(commits)
+        try:
+            excerpts.update(extract_diff_excerpts(
+                repo_path,
+                shas,
+                max_bytes_per_commit=int(options.get('max_bytes_per_commit', 4000)),
+                max_total_bytes=budget,
+                excludes=excludes,
+            ))
+        except ValueError as e:
+            logger.warning(f"無法取得 {repo_path} 的變更摘錄: {e}")
+
+    for commit in commits:
+        excerpt = excerpts.get(commit.full_hash)
+        if excerpt:
+            commit.diff_excerpt = excerpt
@@ -0,0 +1,528 @@
+"""
+可替換的 Git 後端
+GitService 透過 GitBackend 介面讀取儲存庫，目前有三種實作：
+- cli：直接執行 git 並串流解析輸出（services.git_log / services.git_refs）
+- gitpython：以 GitPython 物件走訪歷史（Repo 物件來自 services.repo_pool）
+- pygit2：以 libgit2 在程序內走訪歷史（需另外安裝 pygit2）
+
+預設（git.backend = "auto"）在第一次使用時以合成的小型儲存庫做一次微型效能測試，
+選出這台主機上最快的後端；設定檔可指定固定使用某個後端
+"""
+import abc
+import os
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from git import Repo, InvalidGitRepositoryError, GitCommandError, NULL_TREE
+from git.exc import NoSuchPathError
+from gitdb.exc import BadName
+from services.churn import CommitChurn
+from services.commit_record import CommitRecord
+from services.git_log import (
+    author_filter_args,
+    count_commits,
+    iter_log_commits,
+    resolve_mailmap_identities,
+)
+from services.git_refs import list_branches, read_ref
+from services.repo_pool import get_repo_pool
+from services.repo_scanner import get_repo_scanner
+import logging
+
+try:
+    import pygit2
+except ImportError:  # pygit2 為選用套件
+    pygit2 = None
+
+logger = logging.getLogger(__name__)
+
+# 自動選擇時依序嘗試的後端（效能相同時取前面的）
+BACKEND_NAMES = ("cli", "gitpython", "pygit2")
+
+# 微型效能測試使用的合成儲存庫大小
+_BENCH_COMMITS = 200
+_BENCH_ROUNDS = 2
+
+# pygit2 開啟儲存庫時不往上層目錄尋找（GIT_REPOSITORY_OPEN_NO_SEARCH），與 GitPython 的 Repo(repo_path) 相同
+_PYGIT2_OPEN_NO_SEARCH = 1
+
+# 走訪到早於 since 的 commit 後，再多看幾筆才停止（與 git 處理時間不單調的歷史相同）
+_WALK_SLOP = 5
+
+
+def _branch_refs(branch: str) -> Tuple[str, ...]:
+    """分支名稱依序對應的完整 ref 名稱（也接受 remote 分支、tag 或 commit sha）"""
+    return (f"refs/heads/{branch}", f"refs/remotes/{branch}", f"refs/tags/{branch}", branch)
+
+
+def _matches_author(name: str, email: str, names_lc: set, emails_lc: set) -> bool:
+    """與 author_filter_args 相同的比對規則：名稱或 Email 完全相符（不分大小寫）"""
+    if not names_lc and not emails_lc:
+        return True
+    return name.lower() in names_lc or email.lower() in emails_lc
+
+
+def _files_changed(files: List[Tuple[str, str, Optional[int], Optional[int]]]) -> Tuple[int, int, int]:
+    """由逐檔變更計算 (新增, 修改, 刪除) 檔案數（與 git log --raw 的分類相同）"""
+    added = modified = deleted = 0
+    for status, _path, _insertions, _deletions in files:
+        if status == "A":
+            added += 1
+        elif status == "D":
+            deleted += 1
+        else:
+            modified += 1
+    return added, modified, deleted
+
+
+class GitBackend(abc.ABC):
+    """
+    Git 後端介面
+
+    所有方法遇到無效的儲存庫、找不到分支或 git 執行失敗時一律拋出 ValueError。
+    儲存庫掃描只看檔案系統，所有後端共用同一個增量掃描器；
+    分支列表預設使用 `git for-each-ref`（一次取得日期與 ahead/behind），後端可以覆寫。
+    """
+
+    name = ""
+
+    @classmethod
+    def is_available(cls) -> bool:
+        """這台主機是否能使用此後端"""
+        return True
+
+    def list_repositories(self, roots: List[str]) -> List[Dict[str, Any]]:
+        """掃描路徑下的 Git 儲存庫"""
+        return get_repo_scanner().scan(roots)
+
+    @abc.abstractmethod
+    def validate_repository(self, repo_path: str) -> bool:
+        """是否為有效（非 bare）的 Git 儲存庫"""
+        raise NotImplementedError
+
+    def list_branches(self, repo_path: str) -> List[Dict[str, Any]]:
+        """本地分支列表（格式見 services.git_refs.list_branches）"""
+        return list_branches(repo_path)
+
+    @abc.abstractmethod
+    def resolve_branch(self, repo_path: str, branch: str) -> str:
+        """將分支名稱解析為 commit sha（不切換分支）"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def iter_commits(
+        self,
+        repo_path: str,
+        revs: Sequence[str],
+        since: datetime,
+        until: datetime,
+        names: Sequence[str] = (),
+        emails: Sequence[str] = (),
+    ) -> Iterator[CommitRecord]:
+        """
+        由新到舊逐筆回傳時間範圍內、可由起點到達的 commit（含檔案變更統計）
+
+        Args:
+            repo_path: 儲存庫路徑
+            revs: 走訪起點 commit sha（分支 tip，或 services.commit_graph 找到的 until 邊界起點；空列表時沒有結果）
+            since: 只列出此時間之後的 commit（commit 日期）
+            until: 只列出此時間之前的 commit（commit 日期）
+            names: 作者名稱（套用 .mailmap 後比對，不分大小寫；與 emails 都空白時不過濾）
+            emails: 作者 Email（同上）
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def count_commits(
+        self,
+        repo_path: str,
+        revs: Sequence[str],
+        since: datetime,
+        until: datetime,
+        names: Sequence[str] = (),
+        emails: Sequence[str] = (),
+    ) -> int:
+        """計算時間範圍內的 commit 數量（參數與 iter_commits 相同，不產生 diff）"""
+        raise NotImplementedError
+
+
+class CliGitBackend(GitBackend):
+    """直接執行 git 子行程並串流解析輸出"""
+
+    name = "cli"
+
+    @classmethod
+    def is_available(cls) -> bool:
+        try:
+            return subprocess.run(
+                ["git", "--version"], capture_output=True, stdin=subprocess.DEVNULL
+            ).returncode == 0
+        except OSError:
+            return False
+
+    def validate_repository(self, repo_path: str) -> bool:
+        # git 會往上層目錄尋找儲存庫；與 GitPython 的 Repo(repo_path) 相同，只接受工作目錄的根目錄或其 .git 目錄
+        try:
+            result = subprocess.run(
+                [
+                    "git", "-C", repo_path, "rev-parse",
+                    "--is-bare-repository", "--is-inside-git-dir", "--absolute-git-dir", "--show-prefix",
+                ],
+                capture_output=True,
+                stdin=subprocess.DEVNULL,
+            )
+        except (OSError, ValueError):
+            return False
+        if result.returncode != 0:
+            return False
+        lines = os.fsdecode(result.stdout).splitlines()
+        if len(lines) < 3 or lines[0] != "false":
+            return False
+        if lines[1] == "true":
+            return os.path.realpath(lines[2]) == os.path.realpath(repo_path)
+        # --show-prefix 為相對於工作目錄根目錄的路徑（根目錄時為空行）
+        return len(lines) < 4 or lines[3] == ""
+
+    def resolve_branch(self, repo_path: str, branch: str) -> str:
+        # 先只讀取 refs 檔案，不啟動 git 子行程；tag 可能指向 tag 物件，交給 rev-parse 解析
+        for ref in _branch_refs(branch)[:2]:
+            sha = read_ref(repo_path, ref)
+            if sha is not None:
+                return sha
+        try:
+            result = subprocess.run(
+                ["git", "-C", repo_path, "rev-parse", "--verify", "--quiet", "--end-of-options", f"{branch}^{{commit}}"],
+                capture_output=True,
+                stdin=subprocess.DEVNULL,
+            )
+        except FileNotFoundError:
+            raise ValueError("找不到 git 執行檔，請確認 Git 已安裝並在 PATH 中")
+        if result.returncode != 0:
+            raise ValueError(f"找不到分支 {branch}")
+        return result.stdout.decode("ascii").strip()
+
+    def iter_commits(self, repo_path, revs, since, until, names=(), emails=()):
+        if not revs:
+            return iter(())
+        # 作者過濾（含 .mailmap）直接交給 git 在走訪歷史時處理；多個起點以 --stdin 傳入
+        extra_args = author_filter_args(names, emails)
+        if len(revs) == 1:
+            return iter_log_commits(repo_path, revs[0], since=since, until=until, extra_args=extra_args)
+        return iter_log_commits(
+            repo_path,
+            None,
+            since=since,
+            until=until,
+            extra_args=extra_args + ["--stdin"],
+            stdin_data="".join(f"{rev}\n" for rev in revs).encode("ascii")
+        )
+
+    def count_commits(self, repo_path, revs, since, until, names=(), emails=()):
+        if not revs:
+            return 0
+        return count_commits(
+            repo_path, revs, since=since, until=until, extra_args=author_filter_args(names, emails)
+        )
+
+
+class GitPythonBackend(GitBackend):
+    """以 GitPython 物件走訪歷史（作者比對在 Python 中進行，.mailmap 以 `git check-mailmap` 解析）"""
+
+    name = "gitpython"
+
+    def validate_repository(self, repo_path: str) -> bool:
+        try:
+            with get_repo_pool().acquire(repo_path) as repo:
+                return not repo.bare
+        except (InvalidGitRepositoryError, NoSuchPathError, GitCommandError):
+            return False
+
+    def resolve_branch(self, repo_path: str, branch: str) -> str:
+        try:
+            with get_repo_pool().acquire(repo_path) as repo:
+                try:
+                    return repo.commit(branch).hexsha
+                except (BadName, ValueError, GitCommandError) as e:
+                    raise ValueError(f"找不到分支 {branch}: {e}")
+        except (InvalidGitRepositoryError, NoSuchPathError):
+            raise ValueError(f"無效的 Git 儲存庫: {repo_path}")
+
+    def _walk(self, repo: Repo, repo_path: str, revs, since, until, names, emails) -> Iterator[Tuple[Any, str, str]]:
+        """走訪時間範圍內符合作者條件的 commit，回傳 (commit 物件, 作者名稱, 作者 Email)（套用 .mailmap）"""
+        names_lc = {n.lower() for n in names if n}
+        emails_lc = {e.lower() for e in emails if e}
+        mapped: Dict[Tuple[str, str], Tuple[str, str]] = {}
+        has_mailmap = os.path.isfile(os.path.join(repo_path, ".mailmap"))
+        try:
+            if not revs:
+                return
+            for commit in repo.iter_commits(list(revs), since=since.isoformat(), until=until.isoformat()):
+                identity = (commit.author.name or "", commit.author.email or "")
+                if has_mailmap and identity not in mapped:
+                    # 每位不同的作者只解析一次
+                    mapped[identity] = resolve_mailmap_identities(repo_path, [identity])[0]
+                name, email = mapped.get(identity, identity)
+                if _matches_author(name, email, names_lc, emails_lc):
+                    yield commit, name, email
+        except GitCommandError as e:
+            raise ValueError(f"git 走訪歷史失敗: {e}")
+
+    @staticmethod
+    def _commit_files(commit) -> List[Tuple[str, str, Optional[int], Optional[int]]]:
+        """與第一個 parent 比較的逐檔變更 (狀態字母, 路徑, 新增行數, 刪除行數)"""
+        if commit.parents:
+            diffs = commit.parents[0].diff(commit)
+            numstat = commit.repo.git.diff(commit.parents[0].hexsha, commit.hexsha, numstat=True, M=True)
+        else:
+            diffs = commit.diff(NULL_TREE, R=True)
+            numstat = commit.repo.git.show(commit.hexsha, numstat=True, format="", M=True)
+        # numstat 與 diff-tree 的檔案順序相同
+        line_stats: List[Tuple[Optional[int], Optional[int]]] = []
+        for line in numstat.splitlines():
+            parts = line.split("\t", 2)
+            if len(parts) == 3:
+                line_stats.append((
+                    int(parts[0]) if parts[0].isdigit() else None,
+                    int(parts[1]) if parts[1].isdigit() else None,
+                ))
+        files = []
+        for i, diff in enumerate(diffs):
+            insertions, deletions = line_stats[i] if i < len(line_stats) else (None, None)
+            # 第一個 commit 與空 tree 比較時 GitPython 回報的 change_type 是反向的，一律視為新增
+            status = (diff.change_type or "M") if commit.parents else "A"
+            files.append((status, diff.b_path or diff.a_path, insertions, deletions))
+        return files
+
+    def iter_commits(self, repo_path, revs, since, until, names=(), emails=()):
+        try:
+            with get_repo_pool().acquire(repo_path) as repo:
+                for commit, name, email in self._walk(repo, repo_path, revs, since, until, names, emails):
+                    files = self._commit_files(commit)
+                    added, modified, deleted = _files_changed(files)
+                    yield CommitRecord(
+                        commit.hexsha,
+                        name,
+                        email,
+                        commit.committed_datetime.isoformat(),
+                        commit.message.strip(),
+                        added,
+                        modified,
+                        deleted,
+                        CommitChurn.from_files(files),
+                    )
+        except (InvalidGitRepositoryError, NoSuchPathError):
+            raise ValueError(f"無效的 Git 儲存庫: {repo_path}")
+
+    def count_commits(self, repo_path, revs, since, until, names=(), emails=()):
+        try:
+            with get_repo_pool().acquire(repo_path) as repo:
+                return sum(1 for _ in self._walk(repo, repo_path, revs, since, until, names, emails))
+        except (InvalidGitRepositoryError, NoSuchPathError):
+            raise ValueError(f"無效的 Git 儲存庫: {repo_path}")
+
+
+class Pygit2Backend(GitBackend):
+    """以 libgit2（pygit2）在程序內走訪歷史與計算 diff，不啟動 git 子行程"""
+
+    name = "pygit2"
+
+    @classmethod
+    def is_available(cls) -> bool:
+        return pygit2 is not None
+
+    @staticmethod
+    def _open(repo_path: str):
+        try:
+            return pygit2.Repository(repo_path, _PYGIT2_OPEN_NO_SEARCH)
+        except (pygit2.GitError, KeyError, OSError):
+            raise ValueError(f"無效的 Git 儲存庫: {repo_path}")
+
+    def validate_repository(self, repo_path: str) -> bool:
+        try:
+            return not self._open(repo_path).is_bare
+        except ValueError:
+            return False
+
+    def resolve_branch(self, repo_path: str, branch: str) -> str:
+        repo = self._open(repo_path)
+        for ref in _branch_refs(branch):
+            try:
+                return str(repo.revparse_single(ref).peel(pygit2.Commit).id)
+            except (KeyError, ValueError, pygit2.GitError, pygit2.InvalidSpecError):
+                continue
+        raise ValueError(f"找不到分支 {branch}")
+
+    def _walk(self, repo, revs, since, until, names, emails) -> Iterator[Tuple[Any, str, str]]:
+        """依 commit 日期由新到舊走訪，回傳符合條件的 (commit 物件, 作者名稱, 作者 Email)（套用 .mailmap）"""
+        names_lc = {n.lower() for n in names if n}
+        emails_lc = {e.lower() for e in emails if e}
+        since_ts = since.timestamp()
+        until_ts = until.timestamp()
+        try:
+            mailmap = pygit2.Mailmap.from_repository(repo)
+        except pygit2.GitError:
+            mailmap = None
+        if not revs:
+            return
+        older = 0
+        try:
+            walker = repo.walk(pygit2.Oid(hex=revs[0]), pygit2.GIT_SORT_TIME)
+            for rev in revs[1:]:
+                walker.push(pygit2.Oid(hex=rev))
+            for commit in walker:
+                if commit.commit_time > until_ts:
+                    continue
+                if commit.commit_time < since_ts:
+                    older += 1
+                    if older > _WALK_SLOP:
+                        break
+                    continue
+                older = 0
+                author = mailmap.resolve_signature(commit.author) if mailmap is not None else commit.author
+                if _matches_author(author.name, author.email, names_lc, emails_lc):
+                    yield commit, author.name, author.email
+        except (KeyError, ValueError, pygit2.GitError) as e:
+            raise ValueError(f"走訪歷史失敗: {e}")
+
+    @staticmethod
+    def _commit_files(repo, commit) -> List[Tuple[str, str, Optional[int], Optional[int]]]:
+        """與第一個 parent 比較的逐檔變更 (狀態字母, 路徑, 新增行數, 刪除行數)"""
+        if commit.parents:
+            diff = repo.diff(commit.parents[0], commit)
+        else:
+            diff = commit.tree.diff_to_tree(swap=True)
+        diff.find_similar()
+        files = []
+        for patch in diff:
+            delta = patch.delta
+            if delta.is_binary:
+                insertions = deletions = None
+            else:
+                _context, insertions, deletions = patch.line_stats
+            files.append((delta.status_char(), delta.new_file.path, insertions, deletions))
+        return files
+
+    def iter_commits(self, repo_path, revs, since, until, names=(), emails=()):
+        repo = self._open(repo_path)
+        for commit, name, email in self._walk(repo, revs, since, until, names, emails):
+            files = self._commit_files(repo, commit)
+            added, modified, deleted = _files_changed(files)
+            offset = timezone(timedelta(minutes=commit.commit_time_offset))
+            yield CommitRecord(
+                str(commit.id),
+                name,
+                email,
+                datetime.fromtimestamp(commit.commit_time, offset).isoformat(),
+                commit.raw_message,
+                added,
+                modified,
+                deleted,
+                CommitChurn.from_files(files),
+            )
+
+    def count_commits(self, repo_path, revs, since, until, names=(), emails=()):
+        repo = self._open(repo_path)
+        return sum(1 for _ in self._walk(repo, revs, since, until, names, emails))
+
+
+_BACKEND_CLASSES = {cls.name: cls for cls in (CliGitBackend, GitPythonBackend, Pygit2Backend)}
+
+
+def available_backends() -> List[str]:
+    """這台主機可使用的後端名稱"""
+    return [name for name in BACKEND_NAMES if _BACKEND_CLASSES[name].is_available()]
+
+
+def _create_bench_repo(path: str) -> None:
+    """用 git fast-import 建立微型效能測試用的合成儲存庫（兩位作者交錯 commit）"""
+    subprocess.run(["git", "init", "-q", path], check=True, capture_output=True, stdin=subprocess.DEVNULL)
+    stream = []
+    for i in range(_BENCH_COMMITS):
+        who = f"Bench {i % 2} <bench{i % 2}@example.com> {1_600_000_000 + i * 600} +0000"
+        message = f"commit {i}\n".encode()
+        content = f"line {i}\n".encode() * (1 + i % 10)
+        stream.append(b"commit refs/heads/main\n")
+        stream.append(f"author {who}\ncommitter {who}\n".encode())
+        stream.append(f"data {len(message)}\n".encode() + message)
+        stream.append(f"M 100644 inline dir{i % 5}/file{i % 40}.txt\n".encode())
+        stream.append(f"data {len(content)}\n".encode() + content + b"\n\n")
+    subprocess.run(
+        ["git", "-C", path, "fast-import", "--quiet"],
+        input=b"".join(stream), check=True, capture_output=True
+    )
+
+
+def _benchmark(backend: GitBackend, repo_path: str) -> float:
+    """以分支解析 + 作者過濾的 commit 走訪 + 計數衡量後端速度（取多次中最快的一次，單位秒）"""
+    since = datetime.fromtimestamp(1_600_000_000, timezone.utc)
+    until = since + timedelta(seconds=_BENCH_COMMITS * 600)
+    best = float("inf")
+    for _ in range(_BENCH_ROUNDS):
+        start = time.perf_counter()
+        tip_sha = backend.resolve_branch(repo_path, "main")
+        commits = list(backend.iter_commits(repo_path, [tip_sha], since, until, ["Bench 0"], []))
+        count = backend.count_commits(repo_path, [tip_sha], since, until)
+        best = min(best, time.perf_counter() - start)
+        if len(commits) != _BENCH_COMMITS // 2 or count != _BENCH_COMMITS:
+            raise ValueError(f"結果不正確（{len(commits)} / {count} 個 commit）")
+    return best
+
+
+def _select_fastest() -> GitBackend:
+    """對所有可用後端執行微型效能測試，回傳最快的後端（測試失敗時使用 cli）"""
+    names = available_backends()
+    if len(names) <= 1:
+        return _BACKEND_CLASSES[names[0] if names else "cli"]()
+
+    timings: Dict[str, float] = {}
+    with tempfile.TemporaryDirectory(prefix="git-backend-bench-") as repo_path:
+        try:
+            _create_bench_repo(repo_path)
+        except (OSError, subprocess.CalledProcessError) as e:
+            logger.warning(f"無法建立效能測試儲存庫，使用 cli 後端: {e}")
+            return CliGitBackend()
+        for name in names:
+            backend = _BACKEND_CLASSES[name]()
+            try:
+                timings[name] = _benchmark(backend, repo_path)
+            except Exception as e:
+                logger.warning(f"Git 後端 {name} 效能測試失敗: {e}")
+        # 測試用儲存庫的 Repo 物件不應留在池中
+        get_repo_pool().clear()
+
+    if not timings:
+        return CliGitBackend()
+    fastest = min(timings, key=timings.get)
+    summary = ", ".join(f"{name} {seconds * 1000:.1f} ms" for name, seconds in timings.items())
+    logger.info(f"Git 後端效能測試：{summary} → 使用 {fastest}")
+    return _BACKEND_CLASSES[fastest]()
+
+
+_BACKENDS: Dict[str, GitBackend] = {}
+_BACKENDS_LOCK = threading.Lock()
+
+
+def get_git_backend(name: str = "auto") -> GitBackend:
+    """
+    取得程序內共用的 Git 後端
+
+    Args:
+        name: "auto"（第一次呼叫時執行微型效能測試選出最快的後端）或後端名稱；
+              指定的後端不存在或無法使用時改為自動選擇
+
+    Returns:
+        Git 後端
+    """
+    name = (name or "auto").lower()
+    if name != "auto" and (name not in _BACKEND_CLASSES or not _BACKEND_CLASSES[name].is_available()):
+        logger.warning(f"Git 後端 {name} 無法使用，改為自動選擇")
+        name = "auto"
+    with _BACKENDS_LOCK:
+        backend = _BACKENDS.get(name)
+        if backend is None:
+            backend = _BACKENDS[name] = _select_fastest() if name == "auto" else _BACKEND_CLASSES[name]()
+        return backend
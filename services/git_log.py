@@ -0,0 +1,535 @@
+"""
+串流式 git log 引擎
+用單一個 `git log` 子行程一次取得 commit 資訊與檔案變更統計，邊讀邊解析
+"""
+import codecs
+import subprocess
+import threading
+from datetime import datetime
+from typing import Iterable, Iterator, Dict, List, Optional, Sequence, Tuple, Union
+from services.churn import CommitChurn
+from services.commit_record import CommitRecord
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 欄位分隔字元（ASCII 控制字元，不會出現在一般 commit 訊息中）
+_RECORD_SEP = b"\x1e"  # 每筆 commit 開頭
+_FIELD_SEP = b"\x1f"    # 欄位之間
+_MESSAGE_END = b"\x1d"  # commit 訊息結尾，之後是 --raw / --numstat 輸出
+
+# sha、parents、作者名稱、作者 Email（皆套用 .mailmap）、commit 日期（嚴格 ISO 8601）、完整訊息
+LOG_FORMAT = "%x1e%H%x1f%P%x1f%aN%x1f%aE%x1f%cI%x1f%B%x1d"
+
+# POSIX 延伸正規表示式（git --author -E）中需要跳脫的字元
+_ERE_SPECIAL_CHARS = set(".^$*+?()[]{}|\\")
+
+_READ_CHUNK_SIZE = 64 * 1024
+
+
+def _escape_ere(text: str) -> str:
+    """跳脫 POSIX 延伸正規表示式的特殊字元"""
+    return "".join("\\" + ch if ch in _ERE_SPECIAL_CHARS else ch for ch in text)
+
+
+def author_filter_args(names: Iterable[str], emails: Iterable[str]) -> List[str]:
+    """
+    產生在 git 歷史走訪時就過濾作者的參數
+
+    作者名稱需完全相符、Email 需完全相符（兩者皆不分大小寫），多個條件之間為 OR。
+    搭配 --use-mailmap，比對的是套用 .mailmap 後的作者身份。
+
+    Args:
+        names: 作者名稱列表
+        emails: 作者 Email 列表
+
+    Returns:
+        git log / rev-list 參數列表（沒有任何條件時回傳空列表）
+    """
+    args = []
+    for name in names:
+        if name:
+            args.append(f"--author=^{_escape_ere(name)} <")
+    for email in emails:
+        if email:
+            args.append(f"--author=<{_escape_ere(email)}>")
+    if args:
+        args = ["--use-mailmap", "--extended-regexp", "--regexp-ignore-case"] + args
+    return args
+
+
+def build_log_command(
+    repo_path: str,
+    rev: Optional[str],
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    extra_args: Optional[List[str]] = None,
+) -> List[str]:
+    """
+    組出 git log 指令
+
+    Args:
+        repo_path: 儲存庫路徑
+        rev: 起始 revision（分支名稱或 commit sha）；為 None 時由 extra_args 決定（例如 --stdin）
+        since: 只列出此時間之後的 commit（可選）
+        until: 只列出此時間之前的 commit（可選）
+        extra_args: 額外的 git log 參數（可選）
+
+    Returns:
+        指令參數列表
+    """
+    cmd = [
+        "git", "-C", repo_path,
+        "-c", "core.quotepath=off",
+        "-c", "i18n.logOutputEncoding=UTF-8",
+        "log",
+        "--use-mailmap",
+        "--no-color",
+        "--raw",
+        "--numstat",
+        "-M",
+        # merge commit 只和第一個 parent 比較（與原本 commit.diff(parents[0]) 行為一致）
+        "--diff-merges=first-parent",
+        f"--format={LOG_FORMAT}",
+    ]
+    if since is not None:
+        cmd.append(f"--since={since.isoformat()}")
+    if until is not None:
+        cmd.append(f"--until={until.isoformat()}")
+    if extra_args:
+        cmd.extend(extra_args)
+    if rev is not None:
+        cmd.append(rev)
+    cmd.append("--")
+    return cmd
+
+
+def _unquote_path(path: str) -> str:
+    """還原 git 以 C 字串格式加上引號的路徑（例如含有跳脫字元的檔名）"""
+    if len(path) >= 2 and path[0] == '"' and path[-1] == '"':
+        try:
+            return codecs.escape_decode(path[1:-1].encode("utf-8"))[0].decode("utf-8", errors="replace")
+        except Exception:
+            return path[1:-1]
+    return path
+
+
+def _parse_file_changes(stats: str) -> Tuple[Dict[str, int], List[Tuple[str, str, Optional[int], Optional[int]]]]:
+    """
+    解析 --raw 與 --numstat 輸出
+
+    Args:
+        stats: commit 訊息結尾之後的文字
+
+    Returns:
+        (檔案變更統計 {'added', 'modified', 'deleted'},
+         每個檔案的 (狀態字母, 路徑, 新增行數, 刪除行數)；二進位檔行數為 None)
+    """
+    files_changed = {'added': 0, 'modified': 0, 'deleted': 0}
+    raw_entries: List[Tuple[str, str]] = []
+    numstat_entries: List[Tuple[Optional[int], Optional[int]]] = []
+
+    for line in stats.split("\n"):
+        if not line:
+            continue
+        if line[0] == ":":
+            # :100644 100644 abc def M\tpath 或 R100\told\tnew
+            meta, _, paths = line.partition("\t")
+            status = meta.rsplit(" ", 1)[-1][:1]
+            path = paths.rsplit("\t", 1)[-1]
+            raw_entries.append((status, _unquote_path(path)))
+            if status == "A":
+                files_changed['added'] += 1
+            elif status == "D":
+                files_changed['deleted'] += 1
+            else:
+                files_changed['modified'] += 1
+        else:
+            # 新增行數\t刪除行數\tpath（二進位檔為 -\t-\tpath）
+            parts = line.split("\t", 2)
+            if len(parts) < 3:
+                continue
+            added, deleted = parts[0], parts[1]
+            numstat_entries.append((
+                int(added) if added.isdigit() else None,
+                int(deleted) if deleted.isdigit() else None,
+            ))
+
+    # --raw 與 --numstat 的檔案順序相同，依序配對
+    files = []
+    for i, (status, path) in enumerate(raw_entries):
+        insertions, deletions = numstat_entries[i] if i < len(numstat_entries) else (None, None)
+        files.append((status, path, insertions, deletions))
+    return files_changed, files
+
+
+def parse_log_record(record: bytes) -> Optional[CommitRecord]:
+    """
+    將單筆 git log 輸出解析為 commit 記錄
+
+    commit 訊息保留為原始 bytes，第一次讀取時才解碼。
+
+    Args:
+        record: 一筆 commit 的原始輸出（不含開頭的分隔字元）
+
+    Returns:
+        commit 記錄，格式不符時回傳 None
+    """
+    head, sep, stats = record.partition(_MESSAGE_END)
+    if not sep:
+        return None
+    fields = head.split(_FIELD_SEP, 5)
+    if len(fields) != 6:
+        return None
+    sha, _parents, author_name, author_email, date, message = fields
+    files_changed, files = _parse_file_changes(stats.decode("utf-8", errors="replace"))
+    return CommitRecord(
+        sha.decode("ascii"),
+        author_name.decode("utf-8", errors="replace"),
+        author_email.decode("utf-8", errors="replace"),
+        date.decode("ascii"),
+        message,
+        files_changed['added'],
+        files_changed['modified'],
+        files_changed['deleted'],
+        # 逐檔新增／刪除行數（陣列儲存，輸出 JSON 時才展開）
+        CommitChurn.from_files(files),
+    )
+
+
+def iter_log_records(cmd: List[str], stdin_data: Optional[bytes] = None) -> Iterator[bytes]:
+    """
+    執行 git log 並逐筆回傳原始 commit 記錄（串流讀取，不會一次載入全部輸出）
+
+    Args:
+        cmd: 由 build_log_command 產生的指令
+        stdin_data: 傳給 git 的標準輸入（搭配 --stdin 使用，可選）
+
+    Yields:
+        單筆 commit 的原始輸出
+
+    Raises:
+        ValueError: git 執行失敗
+    """
+    try:
+        proc = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            stdin=subprocess.DEVNULL if stdin_data is None else subprocess.PIPE,
+        )
+    except FileNotFoundError:
+        raise ValueError("找不到 git 執行檔，請確認 Git 已安裝並在 PATH 中")
+
+    finished = False
+    try:
+        if stdin_data is not None:
+            # git log --stdin 會先讀完所有 revision 才開始輸出，先寫完再讀不會卡住
+            proc.stdin.write(stdin_data)
+            proc.stdin.close()
+
+        # 目前這筆 commit 尚未讀完的片段（單筆很大時避免反覆串接整個緩衝區）
+        pending: List[bytes] = []
+        while True:
+            chunk = proc.stdout.read1(_READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            pos = chunk.find(_RECORD_SEP)
+            if pos == -1:
+                pending.append(chunk)
+                continue
+            pending.append(chunk[:pos])
+            record = b"".join(pending)
+            if record:
+                yield record
+            *records, tail = chunk[pos + 1:].split(_RECORD_SEP)
+            for record in records:
+                if record:
+                    yield record
+            pending = [tail]
+        record = b"".join(pending)
+        if record:
+            yield record
+
+        stderr = proc.stderr.read().decode("utf-8", errors="replace").strip()
+        returncode = proc.wait()
+        finished = True
+        if returncode != 0:
+            raise ValueError(f"git log 執行失敗: {stderr or returncode}")
+    finally:
+        if not finished:
+            # 呼叫端提早停止讀取（或發生例外）時，結束 git 子行程
+            proc.kill()
+            proc.wait()
+        proc.stdout.close()
+        proc.stderr.close()
+
+
+def iter_log_commits(
+    repo_path: str,
+    rev: Optional[str],
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    extra_args: Optional[List[str]] = None,
+    stdin_data: Optional[bytes] = None,
+) -> Iterator[CommitRecord]:
+    """
+    串流取得 commit 記錄
+
+    Args:
+        repo_path: 儲存庫路徑
+        rev: 起始 revision（分支名稱或 commit sha）；為 None 時由 extra_args 決定
+        since: 只列出此時間之後的 commit（可選）
+        until: 只列出此時間之前的 commit（可選）
+        extra_args: 額外的 git log 參數（可選）
+        stdin_data: 傳給 git 的標準輸入（搭配 --stdin 使用，可選）
+
+    Yields:
+        commit 記錄
+    """
+    cmd = build_log_command(repo_path, rev, since=since, until=until, extra_args=extra_args)
+    for record in iter_log_records(cmd, stdin_data=stdin_data):
+        commit = parse_log_record(record)
+        if commit is not None:
+            yield commit
+
+
+def count_commits(
+    repo_path: str,
+    rev: Union[str, Sequence[str]],
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    extra_args: Optional[List[str]] = None,
+) -> int:
+    """
+    計算 commit 數量（不產生 diff，也不輸出 commit 內容）
+
+    沒有額外參數時使用 `git rev-list --count`；有作者過濾時改用 `git log`，
+    因為 rev-list 不支援 --use-mailmap。此時每個 commit 只輸出一個字元，邊讀邊計數。
+
+    Args:
+        repo_path: 儲存庫路徑
+        rev: 起始 revision（分支名稱或 commit sha），或多個起始 revision 的列表
+        since: 只計算此時間之後的 commit（可選）
+        until: 只計算此時間之前的 commit（可選）
+        extra_args: 額外的參數，例如 author_filter_args 的結果（可選）
+
+    Returns:
+        commit 數量
+
+    Raises:
+        ValueError: git 執行失敗
+    """
+    if extra_args:
+        cmd = ["git", "-C", repo_path, "log", "--no-color", "--format=tformat:."]
+    else:
+        cmd = ["git", "-C", repo_path, "rev-list", "--count"]
+    if since is not None:
+        cmd.append(f"--since={since.isoformat()}")
+    if until is not None:
+        cmd.append(f"--until={until.isoformat()}")
+    if extra_args:
+        cmd.extend(extra_args)
+    cmd.extend([rev] if isinstance(rev, str) else rev)
+    cmd.append("--")
+
+    try:
+        proc = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            stdin=subprocess.DEVNULL,
+        )
+    except FileNotFoundError:
+        raise ValueError("找不到 git 執行檔，請確認 Git 已安裝並在 PATH 中")
+
+    with proc:
+        if extra_args:
+            count = 0
+            while True:
+                chunk = proc.stdout.read1(_READ_CHUNK_SIZE)
+                if not chunk:
+                    break
+                count += chunk.count(b"\n")
+        else:
+            count = int(proc.stdout.read().strip() or 0)
+        stderr = proc.stderr.read().decode("utf-8", errors="replace").strip()
+        returncode = proc.wait()
+
+    if returncode != 0:
+        raise ValueError(f"git 計算 commit 數量失敗: {stderr or returncode}")
+    return count
+
+
+def resolve_mailmap_identities(repo_path: str, identities: Iterable[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    """
+    透過 `git check-mailmap` 取得身份對應到的正式身份
+
+    Args:
+        repo_path: 儲存庫路徑
+        identities: (名稱, Email) 列表
+
+    Returns:
+        對應後的 (名稱, Email) 列表（順序與輸入相同；無法對應時回傳原值）
+    """
+    identities = list(identities)
+    if not identities:
+        return []
+    cmd = ["git", "-C", repo_path, "check-mailmap"]
+    cmd.extend(f"{name} <{email}>" if name else f"<{email}>" for name, email in identities)
+    try:
+        result = subprocess.run(cmd, capture_output=True, stdin=subprocess.DEVNULL)
+    except FileNotFoundError:
+        return identities
+    if result.returncode != 0:
+        return identities
+
+    resolved = []
+    lines = result.stdout.decode("utf-8", errors="replace").splitlines()
+    for original, line in zip(identities, lines):
+        name, sep, email = line.rpartition(" <")
+        if sep and email.endswith(">"):
+            resolved.append((name, email[:-1]))
+        else:
+            resolved.append(original)
+    return resolved
+
+
+def iter_rev_list(repo_path: str, args: List[str]) -> Iterator[str]:
+    """
+    串流執行 `git rev-list` 並逐一回傳 commit sha
+
+    Args:
+        repo_path: 儲存庫路徑
+        args: rev-list 參數（revision 與選項）
+
+    Yields:
+        commit sha
+
+    Raises:
+        ValueError: git 執行失敗
+    """
+    cmd = ["git", "-C", repo_path, "rev-list"] + list(args) + ["--"]
+    try:
+        proc = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            stdin=subprocess.DEVNULL,
+        )
+    except FileNotFoundError:
+        raise ValueError("找不到 git 執行檔，請確認 Git 已安裝並在 PATH 中")
+
+    finished = False
+    try:
+        for line in proc.stdout:
+            sha = line.strip()
+            if sha:
+                yield sha.decode("ascii")
+        stderr = proc.stderr.read().decode("utf-8", errors="replace").strip()
+        returncode = proc.wait()
+        finished = True
+        if returncode != 0:
+            raise ValueError(f"git rev-list 執行失敗: {stderr or returncode}")
+    finally:
+        if not finished:
+            proc.kill()
+            proc.wait()
+        proc.stdout.close()
+        proc.stderr.close()
+
+
+def is_ancestor(repo_path: str, ancestor: str, descendant: str) -> bool:
+    """
+    判斷 ancestor 是否為 descendant 的祖先（`git merge-base --is-ancestor`）
+
+    Args:
+        repo_path: 儲存庫路徑
+        ancestor: 可能的祖先 commit
+        descendant: 後代 commit
+
+    Returns:
+        是否為祖先（commit 不存在時回傳 False）
+    """
+    try:
+        result = subprocess.run(
+            ["git", "-C", repo_path, "merge-base", "--is-ancestor", ancestor, descendant],
+            capture_output=True,
+            stdin=subprocess.DEVNULL,
+        )
+    except FileNotFoundError:
+        raise ValueError("找不到 git 執行檔，請確認 Git 已安裝並在 PATH 中")
+    return result.returncode == 0
+
+
+def compute_patch_ids(repo_path: str, shas: Iterable[str]) -> Dict[str, str]:
+    """
+    以一次 `git diff-tree --stdin -p | git patch-id --stable` 計算多個 commit 的 patch-id
+
+    內容相同的變更（cherry-pick、rebase 後的 commit）會得到相同的 patch-id。
+    沒有內容差異的 commit（例如 merge commit、空 commit）不會出現在結果中。
+
+    Args:
+        repo_path: 儲存庫路徑
+        shas: commit sha 列表
+
+    Returns:
+        {commit sha: patch-id}
+
+    Raises:
+        ValueError: git 執行失敗
+    """
+    stdin_data = "".join(f"{sha}\n" for sha in shas).encode("ascii")
+    if not stdin_data:
+        return {}
+    try:
+        diff_proc = subprocess.Popen(
+            ["git", "-C", repo_path, "diff-tree", "--stdin", "-p", "-r", "--root",
+             "--no-color", "--no-ext-diff", "--no-renames"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        patch_proc = subprocess.Popen(
+            ["git", "-C", repo_path, "patch-id", "--stable"],
+            stdin=diff_proc.stdout,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+    except FileNotFoundError:
+        raise ValueError("找不到 git 執行檔，請確認 Git 已安裝並在 PATH 中")
+    # patch-id 已持有管線的讀取端，這裡關閉自己的副本，diff-tree 才能在 patch-id 結束時收到 SIGPIPE
+    diff_proc.stdout.close()
+
+    # 由另一個執行緒寫入 sha 清單，避免管線緩衝區滿時互相等待
+    def feed() -> None:
+        try:
+            diff_proc.stdin.write(stdin_data)
+        except (BrokenPipeError, OSError):
+            pass
+        finally:
+            try:
+                diff_proc.stdin.close()
+            except OSError:
+                pass
+
+    writer = threading.Thread(target=feed, name="patch-id-feed", daemon=True)
+    writer.start()
+
+    patch_ids: Dict[str, str] = {}
+    try:
+        # 輸出格式：<patch-id> <commit sha>
+        for line in patch_proc.stdout:
+            parts = line.split()
+            if len(parts) == 2:
+                patch_ids[parts[1].decode("ascii")] = parts[0].decode("ascii")
+    finally:
+        writer.join()
+        patch_proc.stdout.close()
+        patch_returncode = patch_proc.wait()
+        stderr = diff_proc.stderr.read().decode("utf-8", errors="replace").strip()
+        diff_proc.stderr.close()
+        diff_returncode = diff_proc.wait()
+    if diff_returncode != 0 or patch_returncode != 0:
+        raise ValueError(f"git patch-id 執行失敗: {stderr or diff_returncode or patch_returncode}")
+    return patch_ids
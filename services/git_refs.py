@@ -0,0 +1,266 @@
+"""
+Git refs 讀取
+直接讀取 .git 目錄結構與 `git for-each-ref` 取得分支資訊，不載入 GitPython 物件
+"""
+import os
+import re
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# git 版本快取（`git --version` 只需要執行一次）
+_GIT_VERSION: Optional[Tuple[int, ...]] = None
+
+
+def git_version() -> Tuple[int, ...]:
+    """取得 git 版本，例如 (2, 43, 0)；無法判斷時回傳 (0,)"""
+    global _GIT_VERSION
+    if _GIT_VERSION is None:
+        try:
+            output = subprocess.run(
+                ["git", "--version"], capture_output=True, text=True, stdin=subprocess.DEVNULL
+            ).stdout
+            match = re.search(r"(\d+)\.(\d+)(?:\.(\d+))?", output)
+            _GIT_VERSION = tuple(int(x) for x in match.groups() if x is not None) if match else (0,)
+        except (OSError, ValueError):
+            _GIT_VERSION = (0,)
+    return _GIT_VERSION
+
+
+def resolve_git_dirs(repo_path: str) -> Tuple[str, str]:
+    """
+    取得儲存庫的 git 目錄與共用 git 目錄（worktree 的 refs 放在共用目錄）
+
+    Args:
+        repo_path: 儲存庫工作目錄路徑
+
+    Returns:
+        (git 目錄, 共用 git 目錄)
+
+    Raises:
+        ValueError: 不是 Git 儲存庫
+    """
+    dot_git = os.path.join(repo_path, ".git")
+    if os.path.isdir(dot_git):
+        git_dir = dot_git
+    elif os.path.isfile(dot_git):
+        with open(dot_git, "r", encoding="utf-8", errors="replace") as f:
+            line = f.readline().strip()
+        if not line.startswith("gitdir:"):
+            raise ValueError(f"無效的 Git 儲存庫: {repo_path}")
+        git_dir = line[len("gitdir:"):].strip()
+        if not os.path.isabs(git_dir):
+            git_dir = os.path.normpath(os.path.join(repo_path, git_dir))
+    else:
+        raise ValueError(f"無效的 Git 儲存庫: {repo_path}")
+
+    common_dir = git_dir
+    commondir_file = os.path.join(git_dir, "commondir")
+    if os.path.isfile(commondir_file):
+        with open(commondir_file, "r", encoding="utf-8", errors="replace") as f:
+            common = f.read().strip()
+        common_dir = common if os.path.isabs(common) else os.path.normpath(os.path.join(git_dir, common))
+    return git_dir, common_dir
+
+
+def refs_signature(repo_path: str) -> Tuple:
+    """
+    計算 refs 的簽章：HEAD、packed-refs 與 refs/heads、refs/remotes 下所有目錄的 mtime
+
+    git 更新 loose ref 時是寫入 lock 檔再 rename，所在目錄的 mtime 會改變，
+    因此只需要 stat 目錄，不需要讀每個 ref 檔案。
+
+    Args:
+        repo_path: 儲存庫路徑
+
+    Returns:
+        可比較的簽章 tuple
+    """
+    git_dir, common_dir = resolve_git_dirs(repo_path)
+    paths = [
+        os.path.join(git_dir, "HEAD"),
+        os.path.join(common_dir, "packed-refs"),
+    ]
+    for top in ("heads", "remotes"):
+        for root, _dirs, _files in os.walk(os.path.join(common_dir, "refs", top)):
+            paths.append(root)
+
+    signature = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            signature.append((path, st.st_mtime_ns, st.st_size))
+        except OSError:
+            signature.append((path, None, None))
+    return tuple(signature)
+
+
+def read_ref(repo_path: str, ref: str) -> Optional[str]:
+    """
+    只讀取 refs 檔案（loose ref 與 packed-refs）取得 ref 指向的 sha，不啟動 git 子行程
+
+    符號 ref（例如 HEAD、refs/remotes/origin/HEAD）會繼續解析。
+
+    Args:
+        repo_path: 儲存庫路徑
+        ref: 完整 ref 名稱，例如 refs/heads/main
+
+    Returns:
+        sha；找不到時回傳 None
+
+    Raises:
+        ValueError: 不是 Git 儲存庫
+    """
+    git_dir, common_dir = resolve_git_dirs(repo_path)
+    for _ in range(5):
+        # HEAD 等 worktree 專屬的 ref 放在 git 目錄，其他放在共用目錄
+        base = common_dir if ref.startswith("refs/") else git_dir
+        try:
+            with open(os.path.join(base, ref), "r", encoding="utf-8", errors="replace") as f:
+                content = f.read().strip()
+        except OSError:
+            content = None
+        if content is None:
+            break
+        if content.startswith("ref:"):
+            ref = content[len("ref:"):].strip()
+            continue
+        return content if re.fullmatch(r"[0-9a-f]{40}|[0-9a-f]{64}", content) else None
+
+    target = f" {ref}"
+    try:
+        with open(os.path.join(common_dir, "packed-refs"), "r", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                line = line.rstrip("\n")
+                if line.endswith(target) and not line.startswith(("#", "^")):
+                    return line.split(" ", 1)[0]
+    except OSError:
+        pass
+    return None
+
+
+def _run_git(repo_path: str, args: List[str]) -> str:
+    try:
+        result = subprocess.run(
+            ["git", "-C", repo_path] + args,
+            capture_output=True,
+            stdin=subprocess.DEVNULL,
+        )
+    except FileNotFoundError:
+        raise ValueError("找不到 git 執行檔，請確認 Git 已安裝並在 PATH 中")
+    if result.returncode != 0:
+        stderr = result.stderr.decode("utf-8", errors="replace").strip()
+        raise ValueError(f"git {args[0]} 執行失敗: {stderr or result.returncode}")
+    return result.stdout.decode("utf-8", errors="replace")
+
+
+def _local_branch_exists(common_dir: str, name: str) -> bool:
+    """檢查本地分支是否存在（loose ref 或 packed-refs）"""
+    if os.path.isfile(os.path.join(common_dir, "refs", "heads", name)):
+        return True
+    target = f" refs/heads/{name}"
+    try:
+        with open(os.path.join(common_dir, "packed-refs"), "r", encoding="utf-8", errors="replace") as f:
+            return any(line.rstrip("\n").endswith(target) for line in f)
+    except OSError:
+        return False
+
+
+def _default_branch(repo_path: str) -> Optional[str]:
+    """
+    判斷預設分支：origin/HEAD 指向的分支（優先使用同名本地分支）→ main → master
+    只讀取 refs 檔案；回傳本地分支名稱或 remote 分支（例如 origin/main），找不到時回傳 None
+    """
+    _git_dir, common_dir = resolve_git_dirs(repo_path)
+    origin_head = os.path.join(common_dir, "refs", "remotes", "origin", "HEAD")
+    try:
+        with open(origin_head, "r", encoding="utf-8") as f:
+            content = f.read().strip()
+        if content.startswith("ref: refs/remotes/"):
+            remote_branch = content[len("ref: refs/remotes/"):]
+            local_name = remote_branch.split("/", 1)[-1]
+            return local_name if _local_branch_exists(common_dir, local_name) else remote_branch
+    except OSError:
+        pass
+    for name in ("main", "master"):
+        if _local_branch_exists(common_dir, name):
+            return name
+    return None
+
+
+def _ahead_behind_fallback(repo_path: str, base: str, names: List[str]) -> Dict[str, Tuple[int, int]]:
+    """舊版 git（< 2.41）沒有 %(ahead-behind)，改為每個分支執行一次 rev-list --left-right --count"""
+    def count(name: str) -> Tuple[str, Optional[Tuple[int, int]]]:
+        try:
+            output = _run_git(repo_path, ["rev-list", "--left-right", "--count", f"{base}...refs/heads/{name}", "--"])
+            behind, ahead = (int(x) for x in output.split())
+            return name, (ahead, behind)
+        except (ValueError, OSError):
+            return name, None
+
+    result: Dict[str, Tuple[int, int]] = {}
+    with ThreadPoolExecutor(max_workers=min(8, max(1, len(names))), thread_name_prefix="ahead-behind") as pool:
+        for name, value in pool.map(count, names):
+            if value is not None:
+                result[name] = value
+    return result
+
+
+def list_branches(repo_path: str) -> List[Dict[str, Any]]:
+    """
+    以一次 `git for-each-ref` 取得本地分支資訊
+    （git 2.41 以上連同 ahead/behind 一起取得；較舊版本另外以 rev-list 計算）
+
+    Args:
+        repo_path: 儲存庫路徑
+
+    Returns:
+        分支列表：name、is_current、is_default、sha、last_commit_date（ISO 8601）、
+        ahead / behind（相對於預設分支，無法計算時為 None）、commit_count（不計算，固定為 None）
+    """
+    default = _default_branch(repo_path)
+    base = None
+    if default:
+        _git_dir, common_dir = resolve_git_dirs(repo_path)
+        base = f"refs/heads/{default}" if _local_branch_exists(common_dir, default) else f"refs/remotes/{default}"
+    with_ahead_behind = base is not None and git_version() >= (2, 41)
+
+    fields = ["%(refname:short)", "%(objectname)", "%(committerdate:iso-strict)", "%(HEAD)"]
+    if with_ahead_behind:
+        fields.append(f"%(ahead-behind:{base})")
+    output = _run_git(repo_path, ["for-each-ref", "--format=" + "%00".join(fields), "refs/heads"])
+
+    rows = []
+    ahead_behind: Dict[str, Tuple[int, int]] = {}
+    for line in output.splitlines():
+        parts = line.split("\0")
+        if len(parts) != len(fields):
+            continue
+        name, sha, date, head = parts[:4]
+        rows.append((name, sha, date, head == "*"))
+        if with_ahead_behind and parts[4]:
+            ahead, behind = (int(x) for x in parts[4].split())
+            ahead_behind[name] = (ahead, behind)
+
+    if base is not None and not with_ahead_behind:
+        ahead_behind = _ahead_behind_fallback(repo_path, base, [r[0] for r in rows if r[0] != default])
+        ahead_behind[default] = (0, 0)
+
+    branches = []
+    for name, sha, date, is_current in rows:
+        ahead, behind = ahead_behind.get(name, (None, None))
+        branches.append({
+            'name': name,
+            'is_current': is_current,
+            'is_default': name == default,
+            'sha': sha,
+            'last_commit_date': date,
+            'ahead': ahead,
+            'behind': behind,
+            # 計算 commit_count 會很慢（會列舉整個分支歷史），先不做
+            'commit_count': None
+        })
+    return branches
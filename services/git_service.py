@@ -3,11 +3,19 @@ Git 整合服務
 處理 Git 儲存庫操作、分支管理和 commit 過濾
 """
 import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import Iterator, List, Dict, Any, Optional, Tuple
 from datetime import datetime
-from git import Repo, InvalidGitRepositoryError, GitCommandError
-from git.exc import NoSuchPathError
+from services.commit_graph import bounded_walk_starts, ensure_commit_graph
+from services.commit_index import CommitIndex
+from services.commit_record import CommitRecord
+from services.diff_context import attach_diff_excerpts
+from services.git_backends import GitBackend, get_git_backend
+from services.git_refs import refs_signature
+from services.git_log import compute_patch_ids, resolve_mailmap_identities
 import logging
 
 logger = logging.getLogger(__name__)
@@ -16,32 +24,116 @@ logger = logging.getLogger(__name__)
 class GitService:
     """Git 操作服務類別"""
     
-    def __init__(self, user_name: str, user_email: str):
+    # .mailmap 身份對應快取（LRU，避免每次都執行 `git check-mailmap`）
+    # key: (repo_path, .mailmap 的 (mtime_ns, size), 身份 tuple)
+    # value: 對應後的 (名稱, Email) 列表
+    _MAILMAP_CACHE: "OrderedDict[tuple, List[Tuple[str, str]]]" = OrderedDict()
+    _MAILMAP_CACHE_MAX_ENTRIES = 256
+    _MAILMAP_CACHE_LOCK = threading.Lock()
+    
+    # commit 數量快取（LRU）
+    # key: (repo 實際路徑, 分支 sha, 作者過濾參數, 開始時間, 結束時間)
+    # value: commit 數量
+    _COUNT_CACHE: "OrderedDict[tuple, int]" = OrderedDict()
+    _COUNT_CACHE_MAX_ENTRIES = 512
+    _COUNT_CACHE_LOCK = threading.Lock()
+    
+    # 分支列表快取
+    # key: repo 實際路徑
+    # value: (refs 簽章, 分支列表)
+    _BRANCH_CACHE: dict = {}
+    _BRANCH_CACHE_LOCK = threading.Lock()
+    
+    # patch-id 快取（LRU；commit 內容不會改變，以 sha 為 key 即可）
+    # key: commit sha
+    # value: patch-id（沒有內容差異的 commit，例如 merge commit，為 None）
+    _PATCH_ID_CACHE: "OrderedDict[str, Optional[str]]" = OrderedDict()
+    _PATCH_ID_CACHE_MAX_ENTRIES = 100000
+    _PATCH_ID_CACHE_LOCK = threading.Lock()
+    
+    def __init__(
+        self,
+        user_name: str,
+        user_email: str,
+        aliases: Optional[List[str]] = None,
+        commit_index: Optional[CommitIndex] = None,
+        dedupe_patches: bool = True,
+        diff_context: Optional[Dict[str, Any]] = None,
+        backend: Optional[GitBackend] = None,
+        write_commit_graph: bool = False,
+    ):
         """
         初始化 Git 服務
         
         Args:
             user_name: 當前使用者名稱（用於過濾 commit）
             user_email: 當前使用者 Email（用於過濾 commit）
+            aliases: 其他屬於當前使用者的名稱或 Email（可選，含 @ 的視為 Email）
+            commit_index: 本機 commit 索引（可選，提供時 commit 查詢改由索引處理）
+            dedupe_patches: 是否以 patch-id 合併內容相同的 commit（cherry-pick、rebase）
+            diff_context: 變更摘錄設定（可選，ai.diff_context；啟用時 commit 會多出 diff_excerpt 欄位）
+            backend: Git 後端（可選，預設自動選擇這台主機上最快的後端）
+            write_commit_graph: 儲存庫沒有 commit-graph 檔案時是否在背景產生
         """
         self.user_name = user_name
         self.user_email = user_email
-
-    @staticmethod
-    def _safe_current_branch(repo: Repo) -> Optional[str]:
+        self.aliases = [a.strip() for a in (aliases or []) if a and a.strip()]
+        self.commit_index = commit_index
+        self.dedupe_patches = dedupe_patches
+        self.diff_context = diff_context
+        self.backend = backend or get_git_backend()
+        self.write_commit_graph = write_commit_graph
+    
+    def _author_identities(self, repo_path: str) -> tuple[List[str], List[str]]:
         """
-        安全取得目前分支名稱。
-        detached HEAD 時，repo.active_branch 會丟例外，這裡回傳 None。
+        取得用於過濾 commit 的作者名稱與 Email（包含別名與 .mailmap 對應後的身份）
+        
+        Args:
+            repo_path: 儲存庫路徑
+        
+        Returns:
+            (名稱列表, Email 列表)，Email 一律轉為小寫
         """
+        names = [self.user_name] + [a for a in self.aliases if '@' not in a]
+        emails = [self.user_email] + [a for a in self.aliases if '@' in a]
+        
+        mailmap_file = Path(repo_path) / ".mailmap"
         try:
-            if repo.head.is_valid():
-                return repo.active_branch.name
-        except TypeError:
-            # detached HEAD
-            return None
-        except Exception:
-            return None
-        return None
+            st = mailmap_file.stat()
+        except OSError:
+            st = None
+        if st is not None:
+            identities = tuple([(self.user_name, self.user_email)] + [("", e) for e in emails[1:]])
+            cache_key = (repo_path, (st.st_mtime_ns, st.st_size), identities)
+            with self._MAILMAP_CACHE_LOCK:
+                resolved = self._MAILMAP_CACHE.get(cache_key)
+                if resolved is not None:
+                    self._MAILMAP_CACHE.move_to_end(cache_key)
+            if resolved is None:
+                resolved = resolve_mailmap_identities(repo_path, identities)
+                with self._MAILMAP_CACHE_LOCK:
+                    self._MAILMAP_CACHE[cache_key] = resolved
+                    while len(self._MAILMAP_CACHE) > self._MAILMAP_CACHE_MAX_ENTRIES:
+                        self._MAILMAP_CACHE.popitem(last=False)
+            for name, email in resolved:
+                if name:
+                    names.append(name)
+                emails.append(email)
+        
+        # 去除重複（保留順序）
+        names = list(dict.fromkeys(n for n in names if n))
+        emails = list(dict.fromkeys(e.lower() for e in emails if e))
+        return names, emails
+
+    @staticmethod
+    def default_scan_paths() -> List[str]:
+        """預設常用路徑（未設定 scan_paths 時使用）"""
+        return [
+            str(Path.home() / "Projects"),
+            "D:/Projects",
+            "C:/Projects",
+            str(Path.home() / "Documents" / "Projects"),
+        ]
     
     def scan_repositories(self, common_paths: Optional[List[str]] = None) -> List[Dict[str, Any]]:
         """
@@ -54,69 +146,12 @@ class GitService:
             找到的 Git 儲存庫列表
         """
         if common_paths is None:
-            # 預設常用路徑
-            common_paths = [
-                str(Path.home() / "Projects"),
-                "D:/Projects",
-                "C:/Projects",
-                str(Path.home() / "Documents" / "Projects"),
-            ]
-        
-        # 性能優先：掃描階段只找「有 .git 目錄的資料夾」即可。
+            common_paths = self.default_scan_paths()
+        
+        # 性能優先：掃描階段只找「有 .git 的資料夾」即可。
         # 不在掃描時初始化 Repo（GitPython 會較慢），分支等資訊延後到選擇 repo 時再載入。
-        repositories: List[Dict[str, Any]] = []
-        seen_repo_paths: set[str] = set()
-
-        def depth_ok(root: str, current: str, max_depth: int) -> bool:
-            try:
-                rel = os.path.relpath(current, root)
-                if rel in (".", ""):
-                    return True
-                depth = len([p for p in rel.split(os.sep) if p and p != "."])
-                return depth <= max_depth
-            except Exception:
-                return True
-
-        MAX_DEPTH = 6  # 避免掃到太深（可視需要調整）
-
-        for base_path in common_paths:
-            if not base_path:
-                continue
-            if not os.path.exists(base_path):
-                continue
-
-            base_path_str = str(Path(base_path).resolve())
-
-            try:
-                for root, dirs, _files in os.walk(base_path_str):
-                    # 限制掃描深度
-                    if not depth_ok(base_path_str, root, MAX_DEPTH):
-                        dirs[:] = []
-                        continue
-
-                    # 避免掃描一些常見大型資料夾
-                    dirs[:] = [d for d in dirs if d not in ("node_modules", ".venv", "venv", "__pycache__", ".git")]
-
-                    git_dir = os.path.join(root, ".git")
-                    if os.path.isdir(git_dir):
-                        repo_path = root
-                        if repo_path not in seen_repo_paths:
-                            repositories.append(
-                                {
-                                    "path": repo_path,
-                                    "name": os.path.basename(repo_path),
-                                    "current_branch": None,  # 延後到 get_branches 時再看
-                                }
-                            )
-                            seen_repo_paths.add(repo_path)
-
-                        # 找到 repo 後不需要再深入該 repo
-                        dirs[:] = []
-            except Exception as e:
-                logger.warning(f"掃描路徑 {base_path_str} 時發生錯誤: {e}")
-                continue
-
-        return repositories
+        # 各路徑平行掃描，且只重新列舉 mtime 有變動的目錄（狀態保存在快取目錄）
+        return self.backend.list_repositories(common_paths)
     
     def validate_repository(self, repo_path: str) -> bool:
         """
@@ -128,49 +163,191 @@ class GitService:
         Returns:
             是否為有效的 Git 儲存庫
         """
-        try:
-            repo = Repo(repo_path)
-            return not repo.bare
-        except (InvalidGitRepositoryError, NoSuchPathError, GitCommandError):
-            return False
+        return self.backend.validate_repository(repo_path)
     
     def get_branches(self, repo_path: str) -> List[Dict[str, Any]]:
         """
         取得儲存庫的所有分支
         
+        由 Git 後端取得（預設為一次 `git for-each-ref`），結果依 refs 的 mtime 快取，分支沒有變動時不會執行 git。
+        
         Args:
             repo_path: 儲存庫路徑
         
         Returns:
-            分支列表，包含當前分支標記
+            分支列表，包含當前分支標記、最後 commit 時間、sha 與相對預設分支的 ahead/behind
         """
         try:
-            repo = Repo(repo_path)
-            branches = []
-            current_branch = self._safe_current_branch(repo)
+            cache_key = os.path.realpath(repo_path)
+            signature = refs_signature(repo_path)
+            with self._BRANCH_CACHE_LOCK:
+                cached = self._BRANCH_CACHE.get(cache_key)
+            if cached is not None and cached[0] == signature:
+                return [dict(branch) for branch in cached[1]]
             
-            for branch in repo.branches:
-                branches.append({
-                    'name': branch.name,
-                    'is_current': branch.name == current_branch,
-                    # 計算 commit_count 會很慢（會列舉整個分支歷史），先不做
-                    'commit_count': None
-                })
-            
-            return branches
-        except InvalidGitRepositoryError:
-            raise ValueError(f"無效的 Git 儲存庫: {repo_path}")
+            branches = self.backend.list_branches(repo_path)
+            with self._BRANCH_CACHE_LOCK:
+                self._BRANCH_CACHE[cache_key] = (signature, branches)
+            return [dict(branch) for branch in branches]
+        except ValueError:
+            raise
         except Exception as e:
             logger.error(f"取得分支列表失敗: {e}")
             raise ValueError(f"無法取得分支列表: {e}")
     
+    def _branch_tip(self, repo_path: str, branch: str) -> str:
+        """
+        解析分支目前指向的 sha（不切換分支）
+        
+        Raises:
+            ValueError: 無效的儲存庫或找不到分支
+        """
+        return self.backend.resolve_branch(repo_path, branch)
+    
+    def _walk_starts(self, repo_path: str, tip_sha: str, end_date: datetime) -> List[str]:
+        """
+        時間範圍查詢的走訪起點：直接從 until 邊界開始，不走訪 end_date 之後的歷史
+        
+        Returns:
+            起點 sha 列表（計算失敗時退回 [tip_sha]）
+        """
+        if self.write_commit_graph:
+            ensure_commit_graph(repo_path)
+        try:
+            return bounded_walk_starts(repo_path, tip_sha, end_date)
+        except ValueError as e:
+            logger.warning(f"無法計算走訪起點，改從分支 tip 走訪: {e}")
+            return [tip_sha]
+    
+    def count_user_commits(
+        self,
+        repo_path: str,
+        branch: str,
+        start_date: datetime,
+        end_date: datetime
+    ) -> int:
+        """
+        計算指定時間範圍內當前使用者的 commit 數量（供預覽使用）
+        
+        只計數，不產生 diff、不解析 commit 訊息。cli 後端經由 services.git_log.count_commits：
+        沒有作者過濾時為 `git rev-list --count`；有作者過濾（一般情況）時因為需要 --use-mailmap，
+        改用 `git log --format=tformat:.` 每個 commit 輸出一行並計算行數。
+        結果以 (儲存庫, 分支目前的 sha, 作者條件, 時間範圍) 快取，分支沒有移動前重複預覽不會再執行 git。
+        
+        Args:
+            repo_path: 儲存庫路徑
+            branch: 分支名稱
+            start_date: 開始日期
+            end_date: 結束日期
+        
+        Returns:
+            commit 數量
+        
+        Raises:
+            ValueError: 無效的儲存庫或找不到分支
+        """
+        tip_sha = self._branch_tip(repo_path, branch)
+        names, emails = self._author_identities(repo_path)
+        
+        cache_key = (
+            os.path.realpath(repo_path),
+            tip_sha,
+            tuple(names),
+            tuple(emails),
+            start_date.isoformat(),
+            end_date.isoformat(),
+        )
+        with self._COUNT_CACHE_LOCK:
+            cached = self._COUNT_CACHE.get(cache_key)
+            if cached is not None:
+                self._COUNT_CACHE.move_to_end(cache_key)
+                return cached
+        
+        if self.commit_index is not None:
+            self.commit_index.refresh(repo_path, branch, tip_sha)
+            count = self.commit_index.count_commits(repo_path, branch, start_date, end_date, names, emails)
+        else:
+            starts = self._walk_starts(repo_path, tip_sha, end_date)
+            count = self.backend.count_commits(repo_path, starts, start_date, end_date, names, emails)
+        
+        with self._COUNT_CACHE_LOCK:
+            self._COUNT_CACHE[cache_key] = count
+            while len(self._COUNT_CACHE) > self._COUNT_CACHE_MAX_ENTRIES:
+                self._COUNT_CACHE.popitem(last=False)
+        return count
+    
+    def _collect_user_commits(
+        self,
+        repo_path: str,
+        branch: str,
+        start_date: datetime,
+        end_date: datetime
+    ) -> tuple[List[CommitRecord], str]:
+        """
+        取得指定時間範圍內當前使用者的 commit（找不到時回傳空列表，不拋出錯誤）
+        
+        Returns:
+            (commit 列表, 分支指向的 commit sha)
+        """
+        # 唯讀模式：只解析分支指向的 commit，不 checkout（不動工作目錄、HEAD 與 index），
+        # 同一個儲存庫可以同時被多個請求讀取
+        tip_sha = self._branch_tip(repo_path, branch)
+        
+        if self.commit_index is not None:
+            # 先增量更新本機索引（只走訪上次索引之後的新 commit），再以時間範圍查詢
+            self.commit_index.refresh(repo_path, branch, tip_sha)
+            names, emails = self._author_identities(repo_path)
+            user_commits = self.commit_index.query_commits(
+                repo_path, branch, start_date, end_date, names, emails
+            )
+        else:
+            # 由 Git 後端走訪歷史，同時取得 commit 與檔案變更統計；
+            # 作者過濾（含別名與 .mailmap）在走訪時處理
+            names, emails = self._author_identities(repo_path)
+            starts = self._walk_starts(repo_path, tip_sha, end_date)
+            user_commits = list(self.backend.iter_commits(
+                repo_path, starts, start_date, end_date, names, emails
+            ))
+        return user_commits, tip_sha
+
+    def stream_user_commits(
+        self,
+        repo_path: str,
+        branch: str,
+        start_date: datetime,
+        end_date: datetime
+    ) -> Iterator[CommitRecord]:
+        """
+        邊走訪歷史邊逐筆回傳當前使用者的 commit（不保留完整列表）
+
+        儲存庫與分支在呼叫時立即檢查，錯誤會直接拋出；走訪（cli 後端為 git log 子行程）在第一次讀取時才開始，
+        呼叫端提早關閉 iterator 時子行程會一併結束。
+        不使用本機索引（更新索引需要先走訪新 commit，會延後第一筆結果）。
+
+        Args:
+            repo_path: 儲存庫路徑
+            branch: 分支名稱
+            start_date: 開始日期
+            end_date: 結束日期
+
+        Returns:
+            commit iterator（新到舊）
+
+        Raises:
+            ValueError: 無效的儲存庫或找不到分支；走訪途中 git 執行失敗時於讀取時拋出
+        """
+        tip_sha = self._branch_tip(repo_path, branch)
+        names, emails = self._author_identities(repo_path)
+        starts = self._walk_starts(repo_path, tip_sha, end_date)
+        return self.backend.iter_commits(repo_path, starts, start_date, end_date, names, emails)
+
     def get_user_commits(
         self,
         repo_path: str,
         branch: str,
         start_date: datetime,
         end_date: datetime
-    ) -> List[Dict[str, Any]]:
+    ) -> List[CommitRecord]:
         """
         取得指定時間範圍內當前使用者的 commit
         
@@ -187,69 +364,20 @@ class GitService:
             ValueError: 如果沒有找到當前使用者的 commit 或發生其他錯誤
         """
         try:
-            repo = Repo(repo_path)
-            
-            # 切換到指定分支
-            try:
-                repo.git.checkout(branch)
-            except GitCommandError as e:
-                raise ValueError(f"無法切換到分支 {branch}: {e}")
-            
-            # 取得該時間範圍內的所有 commit
-            all_commits = list(repo.iter_commits(
-                branch,
-                since=start_date,
-                until=end_date
-            ))
-            
-            if not all_commits:
-                raise ValueError(
-                    f"在 {start_date.date()} 至 {end_date.date()} 的時間範圍內沒有找到任何 commit。\n"
-                    f"請檢查時間範圍或分支選擇。"
-                )
-            
-            # 過濾：只保留當前使用者的 commit
-            user_commits = []
-            for commit in all_commits:
-                author_name = commit.author.name
-                author_email = commit.author.email
-                
-                if (author_name == self.user_name or author_email == self.user_email):
-                    # 計算檔案變更
-                    files_changed = {
-                        'added': 0,
-                        'modified': 0,
-                        'deleted': 0
-                    }
-                    
-                    try:
-                        if commit.parents:
-                            diff = commit.diff(commit.parents[0])
-                            for item in diff:
-                                if item.new_file:
-                                    files_changed['added'] += 1
-                                elif item.deleted_file:
-                                    files_changed['deleted'] += 1
-                                else:
-                                    files_changed['modified'] += 1
-                    except Exception:
-                        # 如果無法計算 diff，跳過
-                        pass
-                    
-                    user_commits.append({
-                        'hash': commit.hexsha[:8],
-                        'full_hash': commit.hexsha,
-                        'author': {
-                            'name': author_name,
-                            'email': author_email
-                        },
-                        'date': commit.committed_datetime.isoformat(),
-                        'message': commit.message.strip(),
-                        'files_changed': files_changed
-                    })
+            user_commits, tip_sha = self._collect_user_commits(repo_path, branch, start_date, end_date)
             
             if not user_commits:
-                total_count = len(all_commits)
+                # 只有在找不到自己的 commit 時，才另外計算該時間範圍內的 commit 總數
+                if self.commit_index is not None:
+                    total_count = self.commit_index.count_commits(repo_path, branch, start_date, end_date)
+                else:
+                    starts = self._walk_starts(repo_path, tip_sha, end_date)
+                    total_count = self.backend.count_commits(repo_path, starts, start_date, end_date)
+                if total_count == 0:
+                    raise ValueError(
+                        f"在 {start_date.date()} 至 {end_date.date()} 的時間範圍內沒有找到任何 commit。\n"
+                        f"請檢查時間範圍或分支選擇。"
+                    )
                 raise ValueError(
                     f"在 {start_date.date()} 至 {end_date.date()} 的時間範圍內沒有找到你的 commit。\n"
                     f"當前使用者：{self.user_name} ({self.user_email})\n"
@@ -260,13 +388,272 @@ class GitService:
                     f"3. 是否選擇了正確的分支"
                 )
             
-            return user_commits
+            return self._finalize_commits(
+                user_commits, {c.full_hash: repo_path for c in user_commits}
+            )
             
-        except InvalidGitRepositoryError:
-            raise ValueError(f"無效的 Git 儲存庫: {repo_path}")
         except ValueError:
             # 重新拋出我們自己的 ValueError
             raise
         except Exception as e:
             logger.error(f"取得 commit 失敗: {e}")
             raise ValueError(f"無法取得 commit: {e}")
+    
+    def get_user_commits_multi(
+        self,
+        sources: List[Tuple[str, str]],
+        start_date: datetime,
+        end_date: datetime,
+        max_workers: int = 4
+    ) -> List[CommitRecord]:
+        """
+        從多個 (儲存庫, 分支) 平行取得當前使用者的 commit，並合併成單一列表
+        
+        同一個 commit 出現在多個分支（或同一儲存庫的多個 worktree）時只保留一筆，
+        並在 `sources` 欄位記錄它出現在哪些儲存庫與分支。
+        
+        Args:
+            sources: (儲存庫路徑, 分支名稱) 列表
+            start_date: 開始日期
+            end_date: 結束日期
+            max_workers: 同時處理的來源數上限
+        
+        Returns:
+            合併後的 commit 列表（依日期由新到舊）
+        
+        Raises:
+            ValueError: 來源無效、所有來源都沒有當前使用者的 commit 或發生其他錯誤
+        """
+        # 重複的來源只處理一次
+        unique_sources = list(dict.fromkeys(sources))
+        if not unique_sources:
+            raise ValueError("請至少選擇一個儲存庫與分支")
+        
+        def collect(source: Tuple[str, str]) -> List[CommitRecord]:
+            repo_path, branch = source
+            try:
+                commits, _tip_sha = self._collect_user_commits(repo_path, branch, start_date, end_date)
+                return commits
+            except ValueError as e:
+                raise ValueError(f"{repo_path} ({branch}): {e}")
+            except Exception as e:
+                logger.error(f"取得 commit 失敗 ({repo_path}, {branch}): {e}")
+                raise ValueError(f"無法取得 {repo_path} ({branch}) 的 commit: {e}")
+        
+        workers = max(1, min(max_workers, len(unique_sources)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="collect-commits") as pool:
+            results = list(pool.map(collect, unique_sources))
+        
+        # 以完整 sha 去除重複（依來源順序合併，保留第一次出現的資料）
+        merged: Dict[str, CommitRecord] = {}
+        repo_of: Dict[str, str] = {}
+        for (repo_path, branch), commits in zip(unique_sources, results):
+            source = {'repository': os.path.basename(os.path.normpath(repo_path)), 'branch': branch}
+            for commit in commits:
+                existing = merged.get(commit.full_hash)
+                if existing is None:
+                    existing = merged[commit.full_hash] = commit
+                    existing.sources = []
+                    repo_of[commit.full_hash] = repo_path
+                if source not in existing.sources:
+                    existing.sources.append(source)
+        
+        if not merged:
+            raise ValueError(
+                f"在 {start_date.date()} 至 {end_date.date()} 的時間範圍內，"
+                f"所選的 {len(unique_sources)} 個儲存庫／分支中都沒有找到你的 commit。\n"
+                f"當前使用者：{self.user_name} ({self.user_email})"
+            )
+        
+        # 日期字串含時區，轉成 datetime 再排序
+        commits = sorted(
+            merged.values(),
+            key=lambda c: datetime.fromisoformat(c.date),
+            reverse=True
+        )
+        return self._finalize_commits(commits, repo_of)
+    
+    def get_user_commits_by_issue(
+        self,
+        issue_id: int,
+        start_date: datetime,
+        end_date: datetime,
+        sources: Optional[List[Tuple[str, str]]] = None
+    ) -> List[CommitRecord]:
+        """
+        由本機索引取得當前使用者訊息中引用指定 Issue（例如 `refs #123`）的 commit
+        
+        未指定來源時查詢所有已索引的儲存庫（由背景索引器維護）；
+        指定來源時會先更新這些分支的索引，且只回傳位於這些分支上的 commit。
+        
+        Args:
+            issue_id: Redmine Issue 編號
+            start_date: 開始日期
+            end_date: 結束日期
+            sources: (儲存庫路徑, 分支名稱) 列表（可選）
+        
+        Returns:
+            commit 列表（含 `sources` 欄位，依日期由新到舊）
+        
+        Raises:
+            ValueError: 未啟用 commit 索引、來源無效或沒有找到引用該 Issue 的 commit
+        """
+        if self.commit_index is None:
+            raise ValueError("依 Issue 引用查詢 commit 需要啟用本機 commit 索引（git.commit_index）")
+        
+        selected: Optional[Dict[str, set]] = None
+        if sources:
+            selected = {}
+            for repo_path, branch in dict.fromkeys(sources):
+                tip_sha = self._branch_tip(repo_path, branch)
+                self.commit_index.refresh(repo_path, branch, tip_sha)
+                selected.setdefault(os.path.realpath(repo_path), set()).add(branch)
+        
+        rows = self.commit_index.query_issue_commits(
+            issue_id, start_date, end_date,
+            repo_paths=list(selected) if selected is not None else None
+        )
+        
+        identities: Dict[str, tuple] = {}
+        commits: List[CommitRecord] = []
+        repo_of: Dict[str, str] = {}
+        for repo_path, branches, commit in rows:
+            if selected is not None:
+                branches = [b for b in branches if b in selected.get(repo_path, ())]
+                if not branches:
+                    continue
+            if repo_path not in identities:
+                names, emails = self._author_identities(repo_path)
+                identities[repo_path] = ({n.lower() for n in names}, set(emails))
+            names_lc, emails_lc = identities[repo_path]
+            if commit.author_name.lower() not in names_lc and commit.author_email.lower() not in emails_lc:
+                continue
+            # 不同儲存庫（例如 fork）中的同一個 commit 只保留第一筆
+            if commit.full_hash in repo_of:
+                continue
+            repo_name = os.path.basename(repo_path)
+            commit.sources = [{'repository': repo_name, 'branch': b} for b in branches]
+            repo_of[commit.full_hash] = repo_path
+            commits.append(commit)
+        
+        if not commits:
+            raise ValueError(
+                f"在 {start_date.date()} 至 {end_date.date()} 的時間範圍內沒有找到引用 #{issue_id} 的 commit。\n"
+                f"當前使用者：{self.user_name} ({self.user_email})\n"
+                f"請確認 commit 訊息中有 `#{issue_id}`，以及背景索引（issue_index.enabled）已完成。"
+            )
+        
+        return self._finalize_commits(commits, repo_of)
+    
+    def _finalize_commits(
+        self,
+        commits: List[CommitRecord],
+        repo_of: Dict[str, str]
+    ) -> List[CommitRecord]:
+        """
+        回傳前的共同處理：以 patch-id 合併重複 commit，並依設定加上變更摘錄
+        
+        Args:
+            commits: commit 列表（依日期由新到舊）
+            repo_of: {commit 完整 sha: 所屬儲存庫路徑}
+        
+        Returns:
+            處理後的 commit 列表
+        """
+        if self.dedupe_patches:
+            commits = self._dedupe_by_patch_id(commits, repo_of)
+        if self.diff_context and self.diff_context.get('enabled', False):
+            attach_diff_excerpts(commits, repo_of, self.diff_context)
+        return commits
+    
+    def _patch_ids(self, repo_path: str, shas: List[str]) -> Dict[str, Optional[str]]:
+        """
+        取得 commit 的 patch-id（未快取的 sha 以單一批次 git 呼叫計算）
+        
+        Args:
+            repo_path: 儲存庫路徑
+            shas: commit sha 列表
+        
+        Returns:
+            {commit sha: patch-id 或 None}
+        """
+        result: Dict[str, Optional[str]] = {}
+        missing: List[str] = []
+        with self._PATCH_ID_CACHE_LOCK:
+            for sha in shas:
+                if sha in self._PATCH_ID_CACHE:
+                    self._PATCH_ID_CACHE.move_to_end(sha)
+                    result[sha] = self._PATCH_ID_CACHE[sha]
+                else:
+                    missing.append(sha)
+        if not missing:
+            return result
+        
+        computed = compute_patch_ids(repo_path, missing)
+        with self._PATCH_ID_CACHE_LOCK:
+            for sha in missing:
+                result[sha] = self._PATCH_ID_CACHE[sha] = computed.get(sha)
+            while len(self._PATCH_ID_CACHE) > self._PATCH_ID_CACHE_MAX_ENTRIES:
+                self._PATCH_ID_CACHE.popitem(last=False)
+        return result
+    
+    def _dedupe_by_patch_id(
+        self,
+        commits: List[CommitRecord],
+        repo_of: Dict[str, str]
+    ) -> List[CommitRecord]:
+        """
+        以 patch-id 合併內容相同的 commit（cherry-pick 到其他分支、rebase 前後的版本）
+        
+        每組只保留最早的一筆作為代表，其他 commit 的短 sha 記錄在 `duplicates`，
+        來源分支合併到代表 commit 的 `sources`（若有）。
+        沒有 patch-id 的 commit（merge commit、空 commit）不合併。
+        
+        Args:
+            commits: commit 列表（依日期由新到舊）
+            repo_of: {commit 完整 sha: 所屬儲存庫路徑}
+        
+        Returns:
+            合併後的 commit 列表（順序不變）
+        """
+        if len(commits) < 2:
+            return commits
+        
+        shas_by_repo: Dict[str, List[str]] = {}
+        for commit in commits:
+            shas_by_repo.setdefault(repo_of[commit.full_hash], []).append(commit.full_hash)
+        patch_ids: Dict[str, Optional[str]] = {}
+        try:
+            for repo_path, shas in shas_by_repo.items():
+                patch_ids.update(self._patch_ids(repo_path, shas))
+        except ValueError as e:
+            # patch-id 只是去除重複用，失敗時照原樣回傳
+            logger.warning(f"無法計算 patch-id，略過重複 commit 合併: {e}")
+            return commits
+        
+        groups: Dict[str, List[CommitRecord]] = {}
+        for commit in commits:
+            key = patch_ids.get(commit.full_hash) or commit.full_hash
+            groups.setdefault(key, []).append(commit)
+        if len(groups) == len(commits):
+            return commits
+        
+        representatives: Dict[str, CommitRecord] = {}
+        for key, group in groups.items():
+            if len(group) == 1:
+                representatives[group[0].full_hash] = group[0]
+                continue
+            # 列表由新到舊，最後一筆是最早的原始 commit
+            representative = group[-1].copy()
+            representative.duplicates = [c.hash for c in group[:-1]]
+            if representative.sources is not None:
+                sources = list(representative.sources)
+                for commit in group[:-1]:
+                    for source in commit.sources or []:
+                        if source not in sources:
+                            sources.append(source)
+                representative.sources = sources
+            representatives[representative.full_hash] = representative
+        
+        logger.info(f"以 patch-id 合併重複 commit：{len(commits)} → {len(representatives)}")
+        return [representatives[c.full_hash] for c in commits if c.full_hash in representatives]
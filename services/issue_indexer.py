@@ -0,0 +1,149 @@
+"""
+Issue 引用背景索引
+定期把所有已知儲存庫的本地分支更新到本機 commit 索引，
+讓 commit 訊息中的 `#123` 引用可以直接以 Issue 編號查詢
+"""
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from services.commit_index import CommitIndex, get_commit_index
+from services.git_refs import list_branches
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class IssueRefIndexer:
+    """在背景執行緒中定期更新所有儲存庫的 commit 索引"""
+
+    def __init__(
+        self,
+        repo_paths: Callable[[], List[str]],
+        commit_index: Optional[CommitIndex] = None,
+        interval: float = 600.0,
+    ):
+        """
+        初始化索引器
+
+        Args:
+            repo_paths: 回傳目前要索引的儲存庫路徑列表（每一輪都會重新呼叫）
+            commit_index: 本機 commit 索引（可選，預設使用共用索引）
+            interval: 兩輪索引之間的間隔（秒）
+        """
+        self.repo_paths = repo_paths
+        self.commit_index = commit_index or get_commit_index()
+        self.interval = interval
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._status_lock = threading.Lock()
+        self._status: Dict[str, Any] = {
+            "running": False,
+            "last_finished": None,
+            "last_duration": None,
+            "repositories": 0,
+            "errors": 0,
+        }
+
+    @property
+    def status(self) -> Dict[str, Any]:
+        """最近一輪索引的狀態"""
+        with self._status_lock:
+            return dict(self._status)
+
+    def index_repository(self, repo_path: str) -> None:
+        """
+        更新單一儲存庫所有本地分支的索引（分支沒有移動時幾乎不花時間）
+
+        Args:
+            repo_path: 儲存庫路徑
+
+        Raises:
+            ValueError: 無法讀取儲存庫
+        """
+        for branch in list_branches(repo_path):
+            if self._stop.is_set():
+                return
+            self.commit_index.refresh(repo_path, branch['name'], branch['sha'])
+
+    def index_all(self) -> None:
+        """索引目前所有已知的儲存庫"""
+        started = time.monotonic()
+        with self._status_lock:
+            self._status["running"] = True
+        repo_paths = list(dict.fromkeys(self.repo_paths()))
+        errors = 0
+        for repo_path in repo_paths:
+            if self._stop.is_set():
+                break
+            try:
+                self.index_repository(repo_path)
+            except Exception as e:
+                errors += 1
+                logger.warning(f"索引儲存庫 {repo_path} 失敗: {e}")
+        duration = time.monotonic() - started
+        with self._status_lock:
+            self._status.update({
+                "running": False,
+                "last_finished": time.time(),
+                "last_duration": round(duration, 3),
+                "repositories": len(repo_paths),
+                "errors": errors,
+            })
+        logger.info(f"Issue 引用索引完成：{len(repo_paths)} 個儲存庫，耗時 {duration:.1f} 秒")
+
+    def trigger(self) -> None:
+        """立即開始下一輪索引（例如儲存庫列表變更時）"""
+        self._wakeup.set()
+
+    def start(self) -> None:
+        """啟動背景索引（第一輪在背景執行，不阻塞啟動）"""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="issue-indexer", daemon=True)
+        self._thread.start()
+        logger.info(f"Issue 引用背景索引已啟動（每 {self.interval} 秒更新）")
+
+    def stop(self) -> None:
+        """停止背景索引（目前正在索引的分支完成後才會結束）"""
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=30)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.index_all()
+            except Exception as e:
+                logger.warning(f"Issue 引用索引發生錯誤: {e}")
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+
+
+_ISSUE_INDEXER: Optional[IssueRefIndexer] = None
+
+
+def start_issue_indexer(repo_paths: Callable[[], List[str]], interval: float = 600.0) -> IssueRefIndexer:
+    """啟動程序內共用的 Issue 引用索引器"""
+    global _ISSUE_INDEXER
+    if _ISSUE_INDEXER is None:
+        _ISSUE_INDEXER = IssueRefIndexer(repo_paths, interval=interval)
+        _ISSUE_INDEXER.start()
+    return _ISSUE_INDEXER
+
+
+def get_issue_indexer() -> Optional[IssueRefIndexer]:
+    """取得執行中的 Issue 引用索引器（未啟用時回傳 None）"""
+    return _ISSUE_INDEXER
+
+
+def stop_issue_indexer() -> None:
+    """停止程序內共用的 Issue 引用索引器"""
+    global _ISSUE_INDEXER
+    if _ISSUE_INDEXER is not None:
+        _ISSUE_INDEXER.stop()
+        _ISSUE_INDEXER = None
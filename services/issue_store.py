@@ -0,0 +1,266 @@
+"""
+本機工單快取
+第一次載入時完整同步指派給當前使用者的工單，之後只向 Redmine 查詢 `updated_on` 在上次同步之後有變動的工單；
+搜尋由記憶體中的 trigram 索引處理，不需要逐筆比對所有工單
+"""
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 兩次增量同步的最短間隔（秒），期間內的查詢直接使用快取
+SYNC_MIN_INTERVAL_SECONDS = 5
+
+# 每隔此秒數做一次完整同步（增量查詢無法得知工單被刪除）
+FULL_SYNC_INTERVAL_SECONDS = 3600
+
+# 搜尋索引的 n-gram 長度（較短的關鍵字改為逐筆比對）
+_NGRAM = 3
+
+# 可排序的欄位（名稱與 Redmine 的 sort 參數相同）→ 快取中工單的排序 key
+# Redmine 的 status / priority 依管理介面中的順序排序，快取中以 ID 近似
+SORT_KEYS: Dict[str, Callable[[Dict[str, Any]], Any]] = {
+    'id': lambda issue: issue['id'],
+    'subject': lambda issue: issue['subject'].lower(),
+    'status': lambda issue: issue['status']['id'],
+    'priority': lambda issue: issue['priority']['id'] if issue['priority'] else 0,
+    'done_ratio': lambda issue: issue['done_ratio'] or 0,
+    'created_on': lambda issue: issue['created_on'],
+    'updated_on': lambda issue: issue['updated_on'],
+}
+
+
+def parse_sort(sort: Optional[str]) -> List[Tuple[str, bool]]:
+    """
+    解析 Redmine 格式的排序參數（例如 `updated_on:desc,id`）
+
+    Returns:
+        (欄位, 是否遞減) 列表；未指定時為 [('id', True)]（與 Redmine 預設相同）
+
+    Raises:
+        ValueError: 欄位或方向不支援
+    """
+    if not sort:
+        return [('id', True)]
+    result = []
+    for part in sort.split(','):
+        column, _, direction = part.strip().partition(':')
+        if column not in SORT_KEYS:
+            raise ValueError(f"不支援的排序欄位: {column}（可用：{', '.join(SORT_KEYS)}）")
+        if direction not in ('', 'asc', 'desc'):
+            raise ValueError(f"不支援的排序方向: {direction}（可用：asc、desc）")
+        result.append((column, direction == 'desc'))
+    return result
+
+
+def _ngrams(text: str) -> Set[str]:
+    return {text[i:i + _NGRAM] for i in range(len(text) - _NGRAM + 1)}
+
+
+class IssueStore:
+    """指派給當前使用者的工單快取（含所有狀態，預設列表只顯示未關閉的工單）"""
+
+    def __init__(self, redmine, format_issue: Callable[[Any], Dict[str, Any]], user_id: int):
+        """
+        初始化工單快取
+
+        Args:
+            redmine: python-redmine 的 Redmine 物件
+            format_issue: 將 Issue 物件轉為 API 回傳格式的函式
+            user_id: 當前使用者 ID（增量同步時判斷工單是否仍指派給自己）
+        """
+        self.redmine = redmine
+        self.format_issue = format_issue
+        self.user_id = user_id
+        self._lock = threading.Lock()
+        self._issues: Dict[int, Dict[str, Any]] = {}
+        self._search_text: Dict[int, str] = {}
+        self._index: Dict[str, Set[int]] = {}
+        self._closed_status_ids: Optional[Set[int]] = None
+        # 視為「指派給自己」的負責人 ID：使用者本身與完整同步時出現的群組（Redmine 的 me 包含所屬群組）
+        self._assignee_ids: Set[int] = {user_id}
+        # 已同步到的最新 updated_on（Redmine 伺服器時間，UTC）
+        self._watermark: Optional[str] = None
+        self._synced_at: Optional[float] = None
+        self._full_synced_at: Optional[float] = None
+        self._background_sync: Optional[threading.Thread] = None
+
+    @property
+    def ready(self) -> bool:
+        """是否已完成第一次完整同步（之後的查詢都能由快取回答）"""
+        return self._full_synced_at is not None
+
+    def sync_in_background(self) -> None:
+        """在背景執行 sync()（已有背景同步在執行時略過）"""
+        with self._lock:
+            if self._background_sync is not None and self._background_sync.is_alive():
+                return
+
+            def run() -> None:
+                try:
+                    self.sync()
+                except Exception as e:
+                    logger.warning(f"背景同步工單快取失敗: {e}")
+
+            self._background_sync = threading.Thread(target=run, name="issue-store-sync", daemon=True)
+            self._background_sync.start()
+
+    def _load_closed_statuses(self) -> Set[int]:
+        """取得「已關閉」的狀態 ID（只查詢一次；無法取得時視為全部未關閉）"""
+        if self._closed_status_ids is None:
+            try:
+                self._closed_status_ids = {
+                    status.id for status in self.redmine.issue_status.all()
+                    if getattr(status, 'is_closed', False)
+                }
+            except Exception as e:
+                logger.warning(f"無法取得工單狀態列表，所有狀態視為未關閉: {e}")
+                return set()
+        return self._closed_status_ids
+
+    def _put(self, issue: Dict[str, Any]) -> None:
+        issue_id = issue['id']
+        self._remove(issue_id)
+        text = f"{issue_id} {issue['subject']}".lower()
+        self._issues[issue_id] = issue
+        self._search_text[issue_id] = text
+        for gram in _ngrams(text):
+            self._index.setdefault(gram, set()).add(issue_id)
+        self._advance_watermark(issue['updated_on'])
+
+    def _advance_watermark(self, updated_on: str) -> None:
+        if self._watermark is None or updated_on > self._watermark:
+            self._watermark = updated_on
+
+    def _remove(self, issue_id: int) -> None:
+        text = self._search_text.pop(issue_id, None)
+        self._issues.pop(issue_id, None)
+        if text is None:
+            return
+        for gram in _ngrams(text):
+            ids = self._index.get(gram)
+            if ids is not None:
+                ids.discard(issue_id)
+                if not ids:
+                    del self._index[gram]
+
+    def _fetch(self, **filters) -> List[Dict[str, Any]]:
+        return [self.format_issue(issue) for issue in self.redmine.issue.filter(**filters)]
+
+    def _full_sync(self) -> None:
+        # 先記下整個伺服器最新的 updated_on（在取得工單之前，期間的變動仍會被下次增量同步取得），
+        # 否則第一次增量同步會取回自己最後一個工單更新之後、所有人的變動
+        newest = self._fetch(status_id='*', sort='updated_on:desc', limit=1)
+        issues = self._fetch(assigned_to_id='me', status_id='*')
+        self._issues.clear()
+        self._search_text.clear()
+        self._index.clear()
+        self._watermark = None
+        self._assignee_ids = {self.user_id}
+        for issue in issues:
+            self._put(issue)
+            if issue['assigned_to'] is not None:
+                self._assignee_ids.add(issue['assigned_to']['id'])
+        if newest:
+            self._advance_watermark(newest[0]['updated_on'])
+        self._full_synced_at = time.monotonic()
+        logger.info(f"工單快取完整同步：{len(issues)} 個工單")
+
+    def _delta_sync(self) -> None:
+        # python-redmine 將 Redmine 的 UTC 時間轉成不含時區的 datetime，這裡補回 Z
+        # 不限定負責人，才能同時得知哪些快取中的工單已改派給其他人（被刪除的工單留給完整同步處理）
+        changed = 0
+        for issue in self._fetch(status_id='*', updated_on=f">={self._watermark}Z"):
+            issue_id = issue['id']
+            # 所有回傳的工單（含與自己無關的）都推進 watermark，下次只取之後的變動
+            self._advance_watermark(issue['updated_on'])
+            assigned_to = issue['assigned_to']
+            if assigned_to is not None and assigned_to['id'] in self._assignee_ids:
+                previous = self._issues.get(issue_id)
+                # >= 會再次回傳 updated_on 等於 watermark 的工單，沒有變動時略過
+                if previous is not None and previous['updated_on'] == issue['updated_on']:
+                    continue
+                self._put(issue)
+                changed += 1
+            elif issue_id in self._issues:
+                self._remove(issue_id)
+                changed += 1
+        if changed:
+            logger.info(f"工單快取增量同步：{changed} 個工單有變動")
+
+    def sync(self, force: bool = False) -> None:
+        """
+        與 Redmine 同步（距離上次同步不到 SYNC_MIN_INTERVAL_SECONDS 秒時略過，除非 force）
+
+        Raises:
+            Exception: python-redmine 的錯誤（由呼叫端轉換）
+        """
+        with self._lock:
+            now = time.monotonic()
+            if not force and self._synced_at is not None and now - self._synced_at < SYNC_MIN_INTERVAL_SECONDS:
+                return
+            if (
+                self._full_synced_at is None
+                or self._watermark is None
+                or now - self._full_synced_at >= FULL_SYNC_INTERVAL_SECONDS
+            ):
+                self._full_sync()
+            else:
+                self._delta_sync()
+            self._synced_at = time.monotonic()
+
+    def mark_stale(self) -> None:
+        """下次 sync() 時不論間隔一定向 Redmine 查詢（工單被本程式更新後呼叫）"""
+        with self._lock:
+            self._synced_at = None
+
+    def _search_ids(self, search: str) -> Iterable[int]:
+        query = search.lower()
+        if len(query) < _NGRAM:
+            return [issue_id for issue_id, text in self._search_text.items() if query in text]
+        candidates: Optional[Set[int]] = None
+        for gram in sorted(_ngrams(query), key=lambda g: len(self._index.get(g, ()))):
+            ids = self._index.get(gram)
+            if not ids:
+                return []
+            candidates = set(ids) if candidates is None else candidates & ids
+            if not candidates:
+                return []
+        # n-gram 都出現不代表相連，最後再確認一次
+        return [issue_id for issue_id in candidates if query in self._search_text[issue_id]]
+
+    def query(
+        self,
+        status_id: Optional[int] = None,
+        search: Optional[str] = None,
+        sort: Optional[List[Tuple[str, bool]]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        由快取查詢工單
+
+        Args:
+            status_id: 狀態 ID（可選；未指定時只回傳未關閉的工單，與 Redmine 預設相同）
+            search: 搜尋關鍵字（比對工單編號與標題，不分大小寫）
+            sort: parse_sort() 的結果（可選；預設依 ID 由新到舊）
+
+        Returns:
+            工單列表
+        """
+        closed = self._load_closed_statuses()
+        with self._lock:
+            ids = self._search_ids(search) if search else list(self._issues)
+            result = []
+            for issue_id in ids:
+                issue = self._issues[issue_id]
+                issue_status = issue['status']['id']
+                if status_id is not None and issue_status != status_id:
+                    continue
+                if status_id is None and issue_status in closed:
+                    continue
+                result.append(dict(issue))
+        # 由最後一個排序欄位開始做穩定排序，前面的欄位優先
+        for column, descending in reversed(sort or parse_sort(None)):
+            result.sort(key=SORT_KEYS[column], reverse=descending)
+        return result
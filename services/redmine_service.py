@@ -2,13 +2,42 @@
 Redmine API 整合服務
 處理 Redmine 連線、工單查詢和更新
 """
-from typing import List, Dict, Any, Optional
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Set, Tuple
 from redminelib import Redmine
 from redminelib.exceptions import ResourceNotFoundError, ValidationError, AuthError
+from requests.adapters import HTTPAdapter
+from services.issue_store import IssueStore, parse_sort
 import logging
 
 logger = logging.getLogger(__name__)
 
+# 認證成功後在此秒數內不再呼叫 auth()
+AUTH_TTL_SECONDS = 300
+
+# 每個 Redmine 主機保留的 HTTP keep-alive 連線數
+HTTP_POOL_SIZE = 10
+
+# 批次更新時同時處理的工單數上限（每個工單最多同時佔用兩條連線：工單更新與新增工時）
+BATCH_MAX_WORKERS = HTTP_POOL_SIZE // 2
+
+# 工單列表可回傳的欄位（`fields` 參數可選擇其中幾個，id 一定會回傳）
+ISSUE_FIELDS = (
+    'id', 'subject', 'status', 'priority', 'assigned_to', 'done_ratio',
+    'spent_hours', 'created_on', 'updated_on',
+)
+
+# 單次分頁查詢的筆數上限（Redmine REST API 的上限）
+MAX_PAGE_SIZE = 100
+
+# 單一工單快取：在此秒數內直接使用快取，過期後以 ETag 向 Redmine 確認是否有變動
+ISSUE_CACHE_TTL_SECONDS = 60
+ISSUE_CACHE_MAX_ENTRIES = 256
+
 
 class RedmineService:
     """Redmine API 服務類別"""
@@ -26,24 +55,94 @@ class RedmineService:
         self.api_key = api_key
         self.user_id = user_id
         self.redmine = None
+        self.current_user = None
+        self._auth_lock = threading.Lock()
+        self._authenticated_at: Optional[float] = None
+        # issue_id → (取得時間, ETag, 工單資料)，依最近使用排序
+        self._issue_cache: "OrderedDict[int, Tuple[float, Optional[str], Dict[str, Any]]]" = OrderedDict()
+        self._issue_cache_lock = threading.Lock()
         self._connect()
+        # _connect() 已完成認證，current_user 一定有值
+        self._issue_store = IssueStore(self.redmine, self._format_issue, self.current_user.id)
     
     def _connect(self) -> None:
         """連線到 Redmine API"""
         try:
             self.redmine = Redmine(self.url, key=self.api_key)
-            # 測試連線：取得當前使用者資訊
-            self.redmine.auth()
-            logger.info(f"成功連線到 Redmine: {self.url}")
-        except AuthError as e:
-            raise ValueError(f"Redmine 認證失敗: {e}")
         except Exception as e:
             raise ValueError(f"無法連線到 Redmine: {e}")
+        # python-redmine 的每個 Redmine 物件使用同一個 requests.Session，
+        # 加大連線池讓同時進行的請求都能重複使用 keep-alive 連線
+        adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+        session = self.redmine.engine.session
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        self.authenticate()
+    
+    def authenticate(self, force: bool = False) -> None:
+        """
+        確認 API Key 有效（取得當前使用者資訊）
+        
+        成功的結果保留 AUTH_TTL_SECONDS 秒，期間內不會再呼叫 auth()。
+        
+        Args:
+            force: 忽略快取，一定重新呼叫 auth()
+        
+        Raises:
+            ValueError: 認證失敗或無法連線
+        """
+        with self._auth_lock:
+            if (
+                not force
+                and self._authenticated_at is not None
+                and time.monotonic() - self._authenticated_at < AUTH_TTL_SECONDS
+            ):
+                return
+            self._authenticated_at = None
+            try:
+                self.current_user = self.redmine.auth()
+            except AuthError as e:
+                raise ValueError(f"Redmine 認證失敗: {e}")
+            except Exception as e:
+                raise ValueError(f"無法連線到 Redmine: {e}")
+            self._authenticated_at = time.monotonic()
+            logger.info(f"成功連線到 Redmine: {self.url}")
     
+    def close(self) -> None:
+        """關閉 HTTP 連線池"""
+        if self.redmine is not None:
+            self.redmine.engine.session.close()
+    
+    @staticmethod
+    def _format_issue(issue) -> Dict[str, Any]:
+        """將 python-redmine 的 Issue 物件轉為 API 回傳格式"""
+        return {
+            'id': issue.id,
+            'subject': issue.subject,
+            'status': {
+                'id': issue.status.id,
+                'name': issue.status.name
+            },
+            'priority': {
+                'id': issue.priority.id,
+                'name': issue.priority.name
+            } if hasattr(issue, 'priority') and issue.priority else None,
+            'assigned_to': {
+                'id': issue.assigned_to.id,
+                'name': issue.assigned_to.name
+            } if hasattr(issue, 'assigned_to') and issue.assigned_to else None,
+            'done_ratio': issue.done_ratio,
+            'spent_hours': getattr(issue, 'spent_hours', 0.0),
+            'created_on': issue.created_on.isoformat() if hasattr(issue.created_on, 'isoformat') else str(issue.created_on),
+            'updated_on': issue.updated_on.isoformat() if hasattr(issue.updated_on, 'isoformat') else str(issue.updated_on),
+        }
+
     def get_assigned_issues(self, status_id: Optional[int] = None, search: Optional[str] = None) -> List[Dict[str, Any]]:
         """
         取得指派給當前使用者的工單列表
-        
+
+        工單由本機快取提供：第一次呼叫時完整同步，之後只向 Redmine 查詢有變動的工單。
+
         Args:
             status_id: 狀態 ID 過濾（可選）
             search: 搜尋關鍵字（可選）
@@ -51,51 +150,237 @@ class RedmineService:
         Returns:
             工單列表
         """
+        return self.list_assigned_issues(status_id=status_id, search=search)['issues']
+    
+    def list_assigned_issues(
+        self,
+        status_id: Optional[int] = None,
+        search: Optional[str] = None,
+        limit: Optional[int] = None,
+        offset: int = 0,
+        sort: Optional[str] = None,
+        fields: Optional[List[str]] = None,
+    ) -> Dict[str, Any]:
+        """
+        分頁取得指派給當前使用者的工單
+
+        本機快取完成第一次同步前，不含搜尋的分頁查詢直接以 Redmine 的 limit/offset/sort 參數取得該頁，
+        同時在背景同步快取；之後的查詢都由快取回答。
+
+        Args:
+            status_id: 狀態 ID 過濾（可選）
+            search: 搜尋關鍵字（可選）
+            limit: 每頁筆數（1～MAX_PAGE_SIZE；未指定時回傳全部）
+            offset: 略過的筆數
+            sort: Redmine 格式的排序（例如 `updated_on:desc,id`；預設 `id:desc`）
+            fields: 要回傳的欄位（ISSUE_FIELDS 的子集；未指定時回傳全部）
+
+        Returns:
+            {'issues': [...], 'total_count': 符合條件的總數, 'offset': offset, 'limit': limit}
+
+        Raises:
+            ValueError: 參數不正確、認證失敗或無法取得工單
+        """
+        if limit is not None and not 1 <= limit <= MAX_PAGE_SIZE:
+            raise ValueError(f"limit 必須介於 1 到 {MAX_PAGE_SIZE}")
+        if offset < 0:
+            raise ValueError("offset 不可為負數")
+        sort_keys = parse_sort(sort)
+        if fields:
+            unknown = [field for field in fields if field not in ISSUE_FIELDS]
+            if unknown:
+                raise ValueError(f"不支援的欄位: {', '.join(unknown)}（可用：{', '.join(ISSUE_FIELDS)}）")
+            fields = ['id'] + [field for field in fields if field != 'id']
+
         try:
-            # 建立查詢條件
-            filters = {'assigned_to_id': 'me'}
-            if status_id:
-                filters['status_id'] = status_id
-            
-            issues = self.redmine.issue.filter(**filters)
-            
-            # 如果提供搜尋關鍵字，進行過濾
-            if search:
-                search_lower = search.lower()
-                issues = [
-                    issue for issue in issues
-                    if search_lower in str(issue.subject).lower() or
-                       search_lower in str(issue.id)
-                ]
-            
-            # 格式化工單資料
-            result = []
-            for issue in issues:
-                result.append({
-                    'id': issue.id,
-                    'subject': issue.subject,
-                    'status': {
-                        'id': issue.status.id,
-                        'name': issue.status.name
-                    },
-                    'priority': {
-                        'id': issue.priority.id,
-                        'name': issue.priority.name
-                    } if hasattr(issue, 'priority') and issue.priority else None,
-                    'assigned_to': {
-                        'id': issue.assigned_to.id,
-                        'name': issue.assigned_to.name
-                    } if hasattr(issue, 'assigned_to') and issue.assigned_to else None,
-                    'done_ratio': issue.done_ratio,
-                    'spent_hours': getattr(issue, 'spent_hours', 0.0),
-                    'created_on': issue.created_on.isoformat() if hasattr(issue.created_on, 'isoformat') else str(issue.created_on),
-                    'updated_on': issue.updated_on.isoformat() if hasattr(issue.updated_on, 'isoformat') else str(issue.updated_on),
-                })
-            
-            return result
+            if limit is not None and not search and not self._issue_store.ready:
+                filters = {
+                    'assigned_to_id': 'me',
+                    'sort': ','.join(f"{column}:desc" if descending else column for column, descending in sort_keys),
+                    'limit': limit,
+                    'offset': offset,
+                }
+                if status_id:
+                    filters['status_id'] = status_id
+                resources = self.redmine.issue.filter(**filters)
+                page = [self._format_issue(issue) for issue in resources]
+                total_count = resources.total_count
+                self._issue_store.sync_in_background()
+            else:
+                self._issue_store.sync()
+                issues = self._issue_store.query(status_id=status_id or None, search=search, sort=sort_keys)
+                total_count = len(issues)
+                page = issues[offset:None if limit is None else offset + limit]
+        except AuthError as e:
+            # API Key 已失效，下次請求時重新認證
+            self._authenticated_at = None
+            raise ValueError(f"Redmine 認證失敗: {e}")
         except Exception as e:
             logger.error(f"取得工單列表失敗: {e}")
             raise ValueError(f"無法取得工單列表: {e}")
+
+        if fields:
+            page = [{field: issue[field] for field in fields} for issue in page]
+        return {'issues': page, 'total_count': total_count, 'offset': offset, 'limit': limit}
+    
+    def get_issue(self, issue_id: int) -> Dict[str, Any]:
+        """
+        取得單一工單（含描述與最新一則備註）
+
+        結果快取 ISSUE_CACHE_TTL_SECONDS 秒；過期後帶 If-None-Match 重新查詢，Redmine 回 304 時沿用快取。
+
+        Args:
+            issue_id: Issue ID
+
+        Returns:
+            與工單列表相同的欄位，另加 'description' 與 'latest_journal'
+            （{'user': 名稱, 'created_on': 時間, 'notes': 內容}，沒有備註時為 None）
+
+        Raises:
+            ValueError: 工單不存在、認證失敗或無法連線
+        """
+        with self._issue_cache_lock:
+            cached = self._issue_cache.get(issue_id)
+            if cached is not None:
+                self._issue_cache.move_to_end(issue_id)
+                if time.monotonic() - cached[0] < ISSUE_CACHE_TTL_SECONDS:
+                    return dict(cached[2])
+
+        engine = self.redmine.engine
+        headers = {'If-None-Match': cached[1]} if cached is not None and cached[1] else {}
+        try:
+            # python-redmine 不提供條件式請求，直接使用同一個 session（已帶 API Key 與連線池）
+            response = engine.session.get(
+                f"{self.redmine.url}/issues/{issue_id}.json",
+                params={'include': 'journals'},
+                headers=headers,
+            )
+            if response.status_code == 304 and cached is not None:
+                issue, etag = cached[2], cached[1]
+            else:
+                raw = engine.process_response(response)['issue']
+                issue = self._format_issue(self.redmine.issue.to_resource(raw))
+                issue['description'] = raw.get('description') or ''
+                notes = [journal for journal in raw.get('journals', []) if journal.get('notes')]
+                issue['latest_journal'] = {
+                    'user': notes[-1].get('user', {}).get('name'),
+                    'created_on': notes[-1].get('created_on'),
+                    'notes': notes[-1]['notes'],
+                } if notes else None
+                etag = response.headers.get('ETag')
+        except ResourceNotFoundError:
+            raise ValueError(f"Issue #{issue_id} 不存在")
+        except AuthError as e:
+            self._authenticated_at = None
+            raise ValueError(f"Redmine 認證失敗: {e}")
+        except Exception as e:
+            logger.error(f"取得 Issue #{issue_id} 失敗: {e}")
+            raise ValueError(f"無法取得 Issue #{issue_id}: {e}")
+
+        with self._issue_cache_lock:
+            self._issue_cache[issue_id] = (time.monotonic(), etag, issue)
+            self._issue_cache.move_to_end(issue_id)
+            while len(self._issue_cache) > ISSUE_CACHE_MAX_ENTRIES:
+                self._issue_cache.popitem(last=False)
+        return dict(issue)
+    
+    @staticmethod
+    def issue_update_data(
+        notes: Optional[str] = None,
+        percent_done: Optional[int] = None,
+        status_id: Optional[int] = None
+    ) -> Tuple[Dict[str, Any], List[str]]:
+        """
+        將更新參數轉為 Redmine 的工單欄位
+
+        Returns:
+            (PUT 的欄位, 對應的回報欄位名稱列表（notes / percent_done / status）)
+        """
+        update_data = {}
+        fields = []
+        if notes:
+            # 將換行符號轉換為 HTML <br> 標籤，以便在 Redmine 中正確顯示換行
+            update_data['notes'] = notes.replace('\r\n', '<br>').replace('\n', '<br>').replace('\r', '<br>')
+            fields.append('notes')
+        if percent_done is not None:
+            update_data['done_ratio'] = percent_done
+            fields.append('percent_done')
+        if status_id is not None:
+            update_data['status_id'] = status_id
+            fields.append('status')
+        return update_data, fields
+    
+    def _invalidate_issue(self, issue_id: int) -> None:
+        """工單已變動：下次列表查詢時立即與 Redmine 同步，並捨棄單一工單快取"""
+        self._issue_store.mark_stale()
+        with self._issue_cache_lock:
+            self._issue_cache.pop(issue_id, None)
+    
+    def apply_issue_update(self, issue_id: int, update_data: Dict[str, Any]) -> None:
+        """直接 PUT 更新的欄位（不必先 GET 整個工單）；python-redmine 的例外原樣拋出"""
+        self.redmine.issue.update(issue_id, **update_data)
+        self._invalidate_issue(issue_id)
+    
+    def create_time_entry(self, issue_id: int, spent_time: float, comments: Optional[str] = None) -> int:
+        """
+        新增工時紀錄；python-redmine 的例外原樣拋出
+
+        Returns:
+            工時紀錄 ID
+        """
+        fields = {
+            'issue_id': issue_id,
+            'hours': spent_time,
+            'activity_id': 9,  # 預設活動 ID，可能需要根據實際情況調整
+        }
+        if comments:
+            fields['comments'] = comments
+        time_entry = self.redmine.time_entry.create(**fields)
+        self._invalidate_issue(issue_id)
+        return time_entry.id
+    
+    def find_time_entry(
+        self,
+        issue_id: int,
+        hours: float,
+        since: datetime,
+        exclude_ids: Optional[Set[int]] = None,
+    ) -> Optional[int]:
+        """
+        找出當前使用者在 since（UTC）之後新增到此工單、時數為 hours 的工時紀錄
+
+        Args:
+            exclude_ids: 不列入比對的工時紀錄 ID（已對應到其他更新的紀錄）
+
+        Returns:
+            工時紀錄 ID（找不到時為 None；有多筆時取最早新增的）
+        """
+        exclude_ids = exclude_ids or set()
+        matches = [
+            time_entry
+            for time_entry in self.redmine.time_entry.filter(issue_id=issue_id, user_id='me', from_date=since.date())
+            if time_entry.id not in exclude_ids
+            and abs(time_entry.hours - hours) < 0.005
+            and time_entry.created_on >= since
+        ]
+        if not matches:
+            return None
+        return min(matches, key=lambda time_entry: time_entry.created_on).id
+    
+    def has_journal_note(self, issue_id: int, notes: str, since: datetime) -> bool:
+        """
+        工單在 since（UTC）之後是否已有當前使用者寫入、內容為 notes 的備註
+
+        notes 需為 issue_update_data() 轉換後的內容。
+        """
+        issue = self.redmine.issue.get(issue_id, include=['journals'])
+        user_id = getattr(self.current_user, 'id', None)
+        for journal in issue.journals:
+            if getattr(journal, 'notes', None) != notes or journal.created_on < since:
+                continue
+            if user_id is None or journal.user.id == user_id:
+                return True
+        return False
     
     def update_issue(
         self,
@@ -103,7 +388,8 @@ class RedmineService:
         notes: Optional[str] = None,
         percent_done: Optional[int] = None,
         spent_time: Optional[float] = None,
-        status_id: Optional[int] = None
+        status_id: Optional[int] = None,
+        overlap_time_entry: bool = False
     ) -> Dict[str, Any]:
         """
         更新 Redmine issue
@@ -114,6 +400,8 @@ class RedmineService:
             percent_done: 完成百分比 (0-100)
             spent_time: 已花費工時（小時）
             status_id: 狀態 ID
+            overlap_time_entry: 工單更新與新增工時同時送出（不變更狀態時才會同時送出，
+                避免工單被關閉後無法記錄工時）；此時工單更新失敗也記錄在 failed_fields，不會拋出例外
         
         Returns:
             更新結果，包含成功/失敗的欄位資訊
@@ -125,69 +413,136 @@ class RedmineService:
             'errors': []
         }
         
+        update_data, fields = self.issue_update_data(notes, percent_done, status_id)
+        log_time = spent_time is not None and spent_time > 0
+        
+        time_entry_future = None
+        executor = None
+        if overlap_time_entry and log_time and update_data and status_id is None:
+            executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="redmine-time-entry")
+            time_entry_future = executor.submit(self.create_time_entry, issue_id, spent_time)
+        
         try:
-            issue = self.redmine.issue.get(issue_id)
-            update_data = {}
-            
-            # 更新備註
-            if notes:
-                try:
-                    # 將換行符號轉換為 HTML <br> 標籤，以便在 Redmine 中正確顯示換行
-                    notes_html = notes.replace('\r\n', '<br>').replace('\n', '<br>').replace('\r', '<br>')
-                    issue.notes = notes_html
-                    update_data['notes'] = notes_html
-                    result['updated_fields'].append('notes')
-                except Exception as e:
-                    result['failed_fields'].append('notes')
-                    result['errors'].append(f"更新備註失敗: {e}")
-            
-            # 更新完成百分比
-            if percent_done is not None:
-                try:
-                    issue.done_ratio = percent_done
-                    update_data['done_ratio'] = percent_done
-                    result['updated_fields'].append('percent_done')
-                except Exception as e:
-                    result['failed_fields'].append('percent_done')
-                    result['errors'].append(f"更新完成百分比失敗: {e}")
-            
-            # 更新狀態
-            if status_id is not None:
+            if update_data:
                 try:
-                    issue.status_id = status_id
-                    update_data['status_id'] = status_id
-                    result['updated_fields'].append('status')
+                    self.apply_issue_update(issue_id, update_data)
+                    result['updated_fields'].extend(fields)
                 except Exception as e:
-                    result['failed_fields'].append('status')
-                    result['errors'].append(f"更新狀態失敗: {e}")
-            
-            # 儲存更新
-            if update_data:
-                issue.save()
+                    # 工時可能已經記錄，不能整個工單視為失敗
+                    if time_entry_future is None:
+                        raise
+                    result['failed_fields'].extend(fields)
+                    result['errors'].append(self.describe_update_error(issue_id, e))
+            elif log_time:
+                # 只記錄工時時先確認工單存在
+                self.redmine.issue.get(issue_id)
             
             # 更新工時
-            if spent_time is not None and spent_time > 0:
+            if log_time:
                 try:
-                    time_entry = self.redmine.time_entry.create(
-                        issue_id=issue_id,
-                        hours=spent_time,
-                        activity_id=9  # 預設活動 ID，可能需要根據實際情況調整
-                    )
+                    if time_entry_future is not None:
+                        time_entry_future.result()
+                    else:
+                        self.create_time_entry(issue_id, spent_time)
                     result['updated_fields'].append('spent_time')
                 except Exception as e:
                     result['failed_fields'].append('spent_time')
                     result['errors'].append(f"更新工時失敗: {e}")
             
-            # 如果有任何失敗的欄位，標記為部分成功
-            if result['failed_fields']:
-                result['success'] = False
-            
-            return result
-            
-        except ResourceNotFoundError:
-            raise ValueError(f"Issue #{issue_id} 不存在")
-        except ValidationError as e:
-            raise ValueError(f"更新驗證失敗: {e}")
+        except (ResourceNotFoundError, AuthError, ValidationError) as e:
+            raise ValueError(self.describe_update_error(issue_id, e))
         except Exception as e:
             logger.error(f"更新 Issue #{issue_id} 失敗: {e}")
             raise ValueError(f"無法更新 Issue: {e}")
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=True)
+        
+        # 如果有任何失敗的欄位，標記為部分成功
+        if result['failed_fields']:
+            result['success'] = False
+        
+        return result
+    
+    def describe_update_error(self, issue_id: int, error: Exception) -> str:
+        """將 python-redmine 的更新錯誤轉為訊息（認證失敗時下次請求重新認證）"""
+        if isinstance(error, ResourceNotFoundError):
+            return f"Issue #{issue_id} 不存在"
+        if isinstance(error, AuthError):
+            self._authenticated_at = None
+            return f"Redmine 認證失敗: {error}"
+        if isinstance(error, ValidationError):
+            return f"更新驗證失敗: {error}"
+        logger.error(f"更新 Issue #{issue_id} 失敗: {error}")
+        return f"無法更新 Issue: {error}"
+    
+    def update_issues(self, updates: List[Dict[str, Any]], max_workers: int = BATCH_MAX_WORKERS) -> List[Dict[str, Any]]:
+        """
+        批次更新多個 Redmine issue
+        
+        以最多 max_workers 個執行緒同時更新，每個工單的更新與新增工時也會同時送出（見 update_issue）。
+        
+        Args:
+            updates: update_issue 的參數 dict 列表（必須包含 issue_id）
+            max_workers: 同時更新的工單數（上限 BATCH_MAX_WORKERS）
+        
+        Returns:
+            與 updates 順序相同的結果列表，每筆為 update_issue 的結果加上 'issue_id'；
+            整個工單更新失敗時 success 為 False，要求更新的欄位都列在 failed_fields
+        """
+        def update(params: Dict[str, Any]) -> Dict[str, Any]:
+            try:
+                result = self.update_issue(**params, overlap_time_entry=True)
+            except ValueError as e:
+                requested = [
+                    field for field, value in (
+                        ('notes', params.get('notes')),
+                        ('percent_done', params.get('percent_done')),
+                        ('status', params.get('status_id')),
+                        ('spent_time', params.get('spent_time') or None),
+                    ) if value is not None and value != ''
+                ]
+                result = {'success': False, 'updated_fields': [], 'failed_fields': requested, 'errors': [str(e)]}
+            return {'issue_id': params['issue_id'], **result}
+        
+        if not updates:
+            return []
+        workers = max(1, min(max_workers, BATCH_MAX_WORKERS, len(updates)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="redmine-update") as pool:
+            return list(pool.map(update, updates))
+
+
+_REDMINE_SERVICE: Optional[RedmineService] = None
+_REDMINE_SERVICE_LOCK = threading.Lock()
+
+
+def get_redmine_service(url: str, api_key: str, user_id: Optional[int] = None) -> RedmineService:
+    """
+    取得程序內共用的 Redmine 服務
+
+    同一組 (url, api_key) 重複使用同一個連線池與認證結果；設定變更時才重新建立。
+
+    Raises:
+        ValueError: 認證失敗或無法連線
+    """
+    global _REDMINE_SERVICE
+    with _REDMINE_SERVICE_LOCK:
+        service = _REDMINE_SERVICE
+        if service is None or (service.url, service.api_key) != (url, api_key):
+            if service is not None:
+                service.close()
+                _REDMINE_SERVICE = None
+            service = RedmineService(url=url, api_key=api_key, user_id=user_id)
+            _REDMINE_SERVICE = service
+        service.user_id = user_id
+    service.authenticate()
+    return service
+
+
+def reset_redmine_service() -> None:
+    """捨棄程序內共用的 Redmine 服務（Redmine 設定變更或應用關閉時呼叫）"""
+    global _REDMINE_SERVICE
+    with _REDMINE_SERVICE_LOCK:
+        service, _REDMINE_SERVICE = _REDMINE_SERVICE, None
+    if service is not None:
+        service.close()
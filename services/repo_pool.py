@@ -0,0 +1,196 @@
+"""
+GitPython Repo 物件池
+同一個儲存庫的 Repo 物件在請求之間重複使用，保留 GitPython 啟動的
+`git cat-file --batch` / `--batch-check` 常駐子行程；
+閒置過久或超過數量上限（LRU）的物件會關閉並結束這些子行程
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Tuple
+
+from git import Repo
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 池中最多保留的閒置 Repo 物件數（所有儲存庫合計）
+MAX_IDLE_HANDLES = 16
+
+# 閒置超過此秒數的 Repo 物件會被關閉
+IDLE_TIMEOUT_SECONDS = 300.0
+
+
+def _close_repo(repo: Repo) -> None:
+    """關閉 Repo 物件並結束它的常駐 cat-file 子行程"""
+    try:
+        repo.close()
+    except Exception as e:
+        logger.debug(f"關閉 Repo 物件失敗 ({repo.git_dir}): {e}")
+
+
+class RepoPool:
+    """以儲存庫實際路徑為 key 的 Repo 物件池"""
+
+    def __init__(
+        self,
+        max_idle: int = MAX_IDLE_HANDLES,
+        idle_timeout: float = IDLE_TIMEOUT_SECONDS,
+    ):
+        """
+        初始化物件池
+
+        Args:
+            max_idle: 最多保留的閒置 Repo 物件數（超過時關閉最久沒用的）
+            idle_timeout: 閒置超過此秒數的 Repo 物件會被關閉
+        """
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        # 閒置中的物件（最久沒用的在前）
+        # key: (儲存庫實際路徑, 物件 id)
+        # value: (Repo 物件, 歸還時間)
+        self._idle: "OrderedDict[Tuple[str, int], Tuple[Repo, float]]" = OrderedDict()
+        self._closed = False
+        self._reaper: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @contextmanager
+    def acquire(self, repo_path: str) -> Iterator[Repo]:
+        """
+        借出一個 Repo 物件，離開 with 區塊時歸還
+
+        GitPython 的 Repo 物件（含常駐 cat-file 子行程）不能同時被多個執行緒使用，
+        所以每個物件同一時間只借給一個呼叫端；同一個儲存庫同時有多個請求時會各自建立物件，
+        歸還後都留在池中供之後重複使用。
+        區塊內拋出 ValueError（例如找不到分支）時照常歸還；其他錯誤時物件可能已損壞，直接關閉。
+
+        Args:
+            repo_path: 儲存庫路徑
+
+        Raises:
+            InvalidGitRepositoryError, NoSuchPathError: 與 `Repo(repo_path)` 相同
+        """
+        key_path = os.path.realpath(repo_path)
+        repo = self._take_idle(key_path)
+        if repo is None:
+            repo = Repo(repo_path)
+        try:
+            yield repo
+        except ValueError:
+            self._release(key_path, repo)
+            raise
+        except BaseException:
+            _close_repo(repo)
+            raise
+        self._release(key_path, repo)
+
+    def _take_idle(self, key_path: str) -> Optional[Repo]:
+        """取出同一個儲存庫最近歸還的閒置物件（沒有時回傳 None）"""
+        expired = []
+        taken = None
+        now = time.monotonic()
+        with self._lock:
+            expired = self._pop_expired(now)
+            for key in reversed(self._idle):
+                if key[0] == key_path:
+                    taken = self._idle.pop(key)[0]
+                    break
+        for repo in expired:
+            _close_repo(repo)
+        return taken
+
+    def _release(self, key_path: str, repo: Repo) -> None:
+        """歸還物件；超過數量上限時關閉最久沒用的物件"""
+        evicted: List[Repo] = []
+        with self._lock:
+            if self._closed:
+                evicted.append(repo)
+            else:
+                self._idle[(key_path, id(repo))] = (repo, time.monotonic())
+                while len(self._idle) > self.max_idle:
+                    evicted.append(self._idle.popitem(last=False)[1][0])
+                self._ensure_reaper()
+        for old in evicted:
+            _close_repo(old)
+
+    def _pop_expired(self, now: float) -> List[Repo]:
+        """移除閒置超過時限的物件（需持有鎖；回傳的物件由呼叫端在鎖外關閉）"""
+        expired = []
+        while self._idle:
+            key, (repo, released_at) = next(iter(self._idle.items()))
+            if now - released_at < self.idle_timeout:
+                break
+            del self._idle[key]
+            expired.append(repo)
+        return expired
+
+    def _ensure_reaper(self) -> None:
+        """啟動背景清理執行緒（需持有鎖），沒有新請求時閒置物件也會依時限關閉"""
+        if self._reaper is None or not self._reaper.is_alive():
+            self._stop.clear()
+            self._reaper = threading.Thread(target=self._run_reaper, name="repo-pool-reaper", daemon=True)
+            self._reaper.start()
+
+    def _run_reaper(self) -> None:
+        interval = max(1.0, self.idle_timeout / 2)
+        while not self._stop.wait(interval):
+            with self._lock:
+                expired = self._pop_expired(time.monotonic())
+                done = not self._idle
+                if done:
+                    # 池已清空，結束執行緒（下次歸還時再啟動）
+                    self._reaper = None
+            for repo in expired:
+                _close_repo(repo)
+            if done:
+                return
+
+    def clear(self) -> None:
+        """關閉所有閒置物件（借出中的物件歸還時仍會放回池中）"""
+        with self._lock:
+            repos = [repo for repo, _released_at in self._idle.values()]
+            self._idle.clear()
+        for repo in repos:
+            _close_repo(repo)
+
+    def close(self) -> None:
+        """關閉物件池：結束所有閒置物件與背景清理執行緒，之後歸還的物件直接關閉"""
+        with self._lock:
+            self._closed = True
+            reaper = self._reaper
+            self._reaper = None
+        self._stop.set()
+        if reaper is not None:
+            reaper.join(timeout=5)
+        self.clear()
+
+    @property
+    def idle_count(self) -> int:
+        """目前池中的閒置物件數"""
+        with self._lock:
+            return len(self._idle)
+
+
+_REPO_POOL: Optional[RepoPool] = None
+_REPO_POOL_LOCK = threading.Lock()
+
+
+def get_repo_pool() -> RepoPool:
+    """取得程序內共用的 Repo 物件池"""
+    global _REPO_POOL
+    with _REPO_POOL_LOCK:
+        if _REPO_POOL is None:
+            _REPO_POOL = RepoPool()
+        return _REPO_POOL
+
+
+def close_repo_pool() -> None:
+    """關閉程序內共用的 Repo 物件池（結束所有常駐 cat-file 子行程）"""
+    global _REPO_POOL
+    with _REPO_POOL_LOCK:
+        pool, _REPO_POOL = _REPO_POOL, None
+    if pool is not None:
+        pool.close()
@@ -0,0 +1,261 @@
+"""
+本機 Git 儲存庫掃描
+多個掃描路徑平行走訪（os.scandir），並記錄每個目錄的 mtime；
+之後重新掃描時，mtime 沒變的目錄直接沿用上次的子目錄列表，不再重新列舉
+"""
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.config import CACHE_DIR
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STATE_FILE = CACHE_DIR / "repo_scan_state.json"
+
+# 避免掃描一些常見大型資料夾
+EXCLUDED_DIR_NAMES = frozenset(("node_modules", ".venv", "venv", "__pycache__", ".git"))
+
+MAX_DEPTH = 6  # 避免掃到太深（可視需要調整）
+
+# 狀態檔格式版本（格式變更時遞增，舊狀態直接捨棄）
+_STATE_VERSION = 1
+
+
+def _git_marker(path: str) -> Optional[str]:
+    """
+    判斷目錄是否為 Git 儲存庫的工作目錄
+
+    Returns:
+        "dir"：一般儲存庫（.git 是目錄）
+        "file"：worktree 或 submodule（.git 是內容為 `gitdir: ...` 的檔案）
+        None：不是儲存庫
+    """
+    git_path = os.path.join(path, ".git")
+    try:
+        if os.path.isdir(git_path):
+            return "dir"
+        if os.path.isfile(git_path):
+            with open(git_path, "r", encoding="utf-8", errors="replace") as f:
+                if f.readline().startswith("gitdir:"):
+                    return "file"
+    except OSError:
+        pass
+    return None
+
+
+class RepoScanner:
+    """增量式 Git 儲存庫掃描器"""
+
+    def __init__(
+        self,
+        state_file: Optional[Path] = None,
+        max_depth: int = MAX_DEPTH,
+        max_workers: int = 8,
+    ):
+        """
+        初始化掃描器
+
+        Args:
+            state_file: 目錄 mtime 狀態檔路徑（可選，預設放在快取目錄）
+            max_depth: 最大掃描深度
+            max_workers: 同時掃描的路徑數上限
+        """
+        self.state_file = Path(state_file) if state_file else DEFAULT_STATE_FILE
+        self.max_depth = max_depth
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        # root -> {目錄路徑: {"mtime": int, "git": Optional[str], "children": [子目錄路徑]}}
+        self._state: Optional[Dict[str, Dict[str, Dict[str, Any]]]] = None
+
+    def _load_state(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        if self._state is None:
+            state: Dict[str, Dict[str, Dict[str, Any]]] = {}
+            try:
+                with open(self.state_file, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("version") == _STATE_VERSION:
+                    state = data.get("roots", {})
+            except (OSError, ValueError):
+                pass
+            self._state = state
+        return self._state
+
+    def _save_state(self) -> None:
+        try:
+            self.state_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp_file = self.state_file.with_suffix(".tmp")
+            with open(tmp_file, "w", encoding="utf-8") as f:
+                json.dump({"version": _STATE_VERSION, "roots": self._state}, f, ensure_ascii=False)
+            os.replace(tmp_file, self.state_file)
+        except OSError as e:
+            logger.warning(f"無法儲存儲存庫掃描狀態: {e}")
+
+    def _list_dir(self, path: str) -> Tuple[Optional[str], List[str]]:
+        """
+        列舉目錄：回傳 (儲存庫標記, 需要繼續走訪的子目錄)
+        """
+        marker = _git_marker(path)
+        if marker:
+            # 找到 repo 後不需要再深入該 repo
+            return marker, []
+        children = []
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    if entry.name in EXCLUDED_DIR_NAMES:
+                        continue
+                    try:
+                        if entry.is_dir():  # 會跟隨符號連結，迴圈由 inode 檢查處理
+                            children.append(entry.path)
+                    except OSError:
+                        continue
+        except OSError:
+            pass
+        return None, children
+
+    def _scan_root(
+        self,
+        root: str,
+        old_entries: Dict[str, Dict[str, Any]],
+    ) -> Tuple[Dict[str, Dict[str, Any]], List[Tuple[str, str]]]:
+        """
+        掃描單一路徑
+
+        Returns:
+            (新的目錄狀態, [(儲存庫路徑, 標記)])
+        """
+        entries: Dict[str, Dict[str, Any]] = {}
+        repos: List[Tuple[str, str]] = []
+        visited: set = set()
+        stack = [(root, 0)]
+
+        while stack:
+            path, depth = stack.pop()
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+
+            # 符號連結迴圈（或同一目錄經由不同路徑出現）只走訪一次
+            inode_key = (st.st_dev, st.st_ino)
+            if inode_key in visited:
+                continue
+            visited.add(inode_key)
+
+            entry = old_entries.get(path)
+            if entry is None or entry["mtime"] != st.st_mtime_ns:
+                marker, children = self._list_dir(path)
+                entry = {"mtime": st.st_mtime_ns, "git": marker, "children": children}
+            entries[path] = entry
+
+            if entry["git"]:
+                repos.append((path, entry["git"]))
+                continue
+
+            if depth < self.max_depth:
+                # 反向放入 stack，讓結果維持目錄列舉順序
+                for child in reversed(entry["children"]):
+                    stack.append((child, depth + 1))
+
+        return entries, repos
+
+    def known_directories(self, roots: List[str]) -> List[str]:
+        """
+        取得上次掃描走訪過的目錄（供檔案系統監看使用）
+
+        Args:
+            roots: 掃描路徑列表
+
+        Returns:
+            目錄路徑列表（包含找到的儲存庫目錄本身）
+        """
+        with self._lock:
+            state = self._load_state()
+            directories: List[str] = []
+            for base_path in roots:
+                if not base_path:
+                    continue
+                root = str(Path(base_path).resolve())
+                directories.extend(state.get(root, {}).keys())
+            return list(dict.fromkeys(directories))
+
+    def scan(self, roots: List[str]) -> List[Dict[str, Any]]:
+        """
+        掃描多個路徑下的 Git 儲存庫
+
+        Args:
+            roots: 要掃描的路徑列表
+
+        Returns:
+            找到的 Git 儲存庫列表
+        """
+        resolved_roots = []
+        for base_path in roots:
+            if not base_path or not os.path.exists(base_path):
+                continue
+            root = str(Path(base_path).resolve())
+            if root not in resolved_roots:
+                resolved_roots.append(root)
+
+        with self._lock:
+            state = self._load_state()
+            old_states = {root: state.get(root, {}) for root in resolved_roots}
+
+            results: Dict[str, Tuple[Dict[str, Dict[str, Any]], List[Tuple[str, str]]]] = {}
+            if resolved_roots:
+                workers = max(1, min(self.max_workers, len(resolved_roots)))
+                with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="repo-scan") as pool:
+                    futures = {
+                        root: pool.submit(self._scan_root, root, old_states[root])
+                        for root in resolved_roots
+                    }
+                    for root, future in futures.items():
+                        try:
+                            results[root] = future.result()
+                        except Exception as e:
+                            logger.warning(f"掃描路徑 {root} 時發生錯誤: {e}")
+
+            changed = False
+            for root, (entries, _repos) in results.items():
+                if state.get(root) != entries:
+                    state[root] = entries
+                    changed = True
+            if changed:
+                self._save_state()
+
+        repositories: List[Dict[str, Any]] = []
+        seen_repo_paths: set = set()
+        for root in resolved_roots:
+            if root not in results:
+                continue
+            for repo_path, marker in results[root][1]:
+                # 同一個儲存庫可能經由符號連結或重疊的掃描路徑出現多次
+                real_path = os.path.realpath(repo_path)
+                if real_path in seen_repo_paths:
+                    continue
+                seen_repo_paths.add(real_path)
+                repositories.append({
+                    "path": repo_path,
+                    "name": os.path.basename(repo_path),
+                    "current_branch": None,  # 延後到 get_branches 時再看
+                    "is_worktree": marker == "file",
+                })
+        return repositories
+
+
+_REPO_SCANNER: Optional[RepoScanner] = None
+_REPO_SCANNER_LOCK = threading.Lock()
+
+
+def get_repo_scanner() -> RepoScanner:
+    """取得程序內共用的儲存庫掃描器"""
+    global _REPO_SCANNER
+    with _REPO_SCANNER_LOCK:
+        if _REPO_SCANNER is None:
+            _REPO_SCANNER = RepoScanner()
+        return _REPO_SCANNER
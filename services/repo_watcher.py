@@ -0,0 +1,294 @@
+"""
+儲存庫列表即時監看
+監看 scan_paths 下的目錄（Linux 使用 inotify，其他平台或 inotify 不可用時改為定期輪詢），
+有目錄新增、刪除或搬移時以增量掃描更新儲存庫列表
+"""
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from services.repo_scanner import RepoScanner, get_repo_scanner
+import logging
+
+logger = logging.getLogger(__name__)
+
+# inotify 常數（linux/inotify.h）
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_MOVE_SELF = 0x00000800
+_IN_Q_OVERFLOW = 0x00004000
+_IN_ONLYDIR = 0x01000000
+_IN_ISDIR = 0x40000000
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+
+_WATCH_MASK = (
+    _IN_CREATE | _IN_DELETE | _IN_MOVED_FROM | _IN_MOVED_TO
+    | _IN_DELETE_SELF | _IN_MOVE_SELF | _IN_ONLYDIR
+)
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class _Inotify:
+    """以 ctypes 呼叫 libc 的最小 inotify 包裝（不需要額外套件）"""
+
+    def __init__(self):
+        libc_name = ctypes.util.find_library("c") or "libc.so.6"
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self.fd = self._libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失敗")
+        self.watches: Dict[str, int] = {}
+
+    def add_watch(self, path: str) -> None:
+        if path in self.watches:
+            return
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), _WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err == errno.ENOSPC:
+                # 超過 fs.inotify.max_user_watches，交由呼叫端改用輪詢
+                raise OSError(err, "inotify watch 數量已達上限")
+            # 目錄已不存在或沒有權限，略過
+            return
+        self.watches[path] = wd
+
+    def remove_watch(self, path: str) -> None:
+        wd = self.watches.pop(path, None)
+        if wd is not None:
+            self._libc.inotify_rm_watch(self.fd, wd)
+
+    def read_relevant_events(self) -> bool:
+        """
+        讀出所有待處理事件
+
+        Returns:
+            是否有需要重新掃描的事件（目錄或 .git 的新增、刪除、搬移）
+        """
+        relevant = False
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            if not data:
+                break
+            offset = 0
+            while offset + _EVENT_HEADER.size <= len(data):
+                _wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+                name = data[offset + _EVENT_HEADER.size:offset + _EVENT_HEADER.size + length].rstrip(b"\0")
+                offset += _EVENT_HEADER.size + length
+                if mask & (_IN_Q_OVERFLOW | _IN_DELETE_SELF | _IN_MOVE_SELF):
+                    relevant = True
+                elif mask & _IN_ISDIR or name == b".git":
+                    relevant = True
+        return relevant
+
+    def close(self) -> None:
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
+        self.watches.clear()
+
+
+class RepoWatcher:
+    """在背景執行緒中維護即時的儲存庫列表"""
+
+    def __init__(
+        self,
+        roots: List[str],
+        scanner: Optional[RepoScanner] = None,
+        poll_interval: float = 5.0,
+        debounce: float = 0.5,
+    ):
+        """
+        初始化監看器
+
+        Args:
+            roots: 要監看的掃描路徑
+            scanner: 儲存庫掃描器（可選，預設使用共用掃描器）
+            poll_interval: 輪詢模式下的重新掃描間隔（秒）
+            debounce: 收到事件後等待的時間（秒），合併短時間內的大量事件（例如 git clone）
+        """
+        self.scanner = scanner or get_repo_scanner()
+        self.poll_interval = poll_interval
+        self.debounce = debounce
+        self._roots = list(roots)
+        self._repos: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._rescan_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        # 第一次掃描完成後才設定（之前 repositories 是空的）
+        self._scanned = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._inotify: Optional[_Inotify] = None
+        # 用來喚醒卡在 select() 的背景執行緒（停止或變更路徑時）
+        self._wake_pipe: Optional[tuple] = None
+        self.mode = "stopped"
+
+    @property
+    def roots(self) -> List[str]:
+        with self._lock:
+            return list(self._roots)
+
+    @property
+    def ready(self) -> bool:
+        """是否已完成第一次掃描"""
+        return self._scanned.is_set()
+
+    @property
+    def repositories(self) -> List[Dict[str, Any]]:
+        """目前的儲存庫列表（常數時間讀取；每次重新掃描都會換成新的 list，呼叫端請勿修改）"""
+        with self._lock:
+            return self._repos
+
+    def set_roots(self, roots: List[str]) -> None:
+        """變更監看路徑（例如設定頁修改了 scan_paths），立即重新掃描"""
+        with self._lock:
+            self._roots = list(roots)
+        self.rescan()
+        self._wake()
+
+    def _wake(self) -> None:
+        self._wakeup.set()
+        if self._wake_pipe is not None:
+            try:
+                os.write(self._wake_pipe[1], b"\0")
+            except OSError:
+                pass
+
+    def rescan(self) -> None:
+        """以增量掃描更新儲存庫列表，並同步 inotify 監看的目錄"""
+        with self._rescan_lock:
+            roots = self.roots
+            repos = self.scanner.scan(roots)
+            with self._lock:
+                self._repos = repos
+            self._scanned.set()
+            if self._inotify is not None:
+                self._sync_watches(roots)
+
+    def _sync_watches(self, roots: List[str]) -> None:
+        directories = set(self.scanner.known_directories(roots))
+        try:
+            for path in list(self._inotify.watches):
+                if path not in directories:
+                    self._inotify.remove_watch(path)
+            for path in directories:
+                self._inotify.add_watch(path)
+        except OSError as e:
+            logger.warning(f"無法使用 inotify 監看所有目錄（{e}），改為每 {self.poll_interval} 秒輪詢")
+            self._inotify.close()
+            self._inotify = None
+            self.mode = "polling"
+
+    def start(self) -> None:
+        """啟動背景監看（第一次掃描在背景執行，不阻塞啟動）"""
+        if self._thread is not None:
+            return
+        if sys.platform.startswith("linux"):
+            try:
+                self._inotify = _Inotify()
+                self.mode = "inotify"
+            except (OSError, AttributeError) as e:
+                logger.warning(f"inotify 不可用（{e}），改用輪詢")
+                self._inotify = None
+        if self._inotify is None:
+            self.mode = "polling"
+        else:
+            self._wake_pipe = os.pipe()
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="repo-watcher", daemon=True)
+        self._thread.start()
+        logger.info(f"儲存庫監看已啟動（{self.mode}）")
+
+    def stop(self) -> None:
+        """停止背景監看"""
+        self._stop.set()
+        self._wake()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+        if self._wake_pipe is not None:
+            for fd in self._wake_pipe:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+            self._wake_pipe = None
+        self.mode = "stopped"
+
+    def _run(self) -> None:
+        # 第一次掃描（失敗時重試；inotify 監看的目錄也在掃描後才建立）
+        while not self._stop.is_set() and not self.ready:
+            try:
+                self.rescan()
+                logger.info(f"儲存庫監看第一次掃描完成，目前 {len(self.repositories)} 個儲存庫")
+            except Exception as e:
+                logger.warning(f"儲存庫監看第一次掃描失敗: {e}")
+                self._stop.wait(self.poll_interval)
+        while not self._stop.is_set():
+            try:
+                inotify = self._inotify
+                if inotify is not None:
+                    wake_fd = self._wake_pipe[0]
+                    readable, _, _ = select.select([inotify.fd, wake_fd], [], [], self.poll_interval)
+                    if wake_fd in readable:
+                        os.read(wake_fd, 4096)
+                    if self._stop.is_set() or self._inotify is not inotify:
+                        continue
+                    if inotify.fd not in readable or not inotify.read_relevant_events():
+                        continue
+                    # 合併短時間內連續發生的事件
+                    time.sleep(self.debounce)
+                    inotify.read_relevant_events()
+                    self.rescan()
+                else:
+                    self._wakeup.wait(self.poll_interval)
+                    self._wakeup.clear()
+                    if not self._stop.is_set():
+                        self.rescan()
+            except Exception as e:
+                logger.warning(f"儲存庫監看發生錯誤: {e}")
+                self._stop.wait(self.poll_interval)
+
+
+_REPO_WATCHER: Optional[RepoWatcher] = None
+
+
+def start_repo_watcher(roots: List[str], poll_interval: float = 5.0) -> RepoWatcher:
+    """啟動程序內共用的儲存庫監看器"""
+    global _REPO_WATCHER
+    if _REPO_WATCHER is None:
+        _REPO_WATCHER = RepoWatcher(roots, poll_interval=poll_interval)
+        _REPO_WATCHER.start()
+    return _REPO_WATCHER
+
+
+def get_repo_watcher() -> Optional[RepoWatcher]:
+    """取得執行中的儲存庫監看器（未啟用時回傳 None）"""
+    return _REPO_WATCHER
+
+
+def stop_repo_watcher() -> None:
+    """停止程序內共用的儲存庫監看器"""
+    global _REPO_WATCHER
+    if _REPO_WATCHER is not None:
+        _REPO_WATCHER.stop()
+        _REPO_WATCHER = None
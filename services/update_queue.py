@@ -0,0 +1,461 @@
+"""
+Redmine 更新的持久化寫入佇列
+更新請求先寫入 SQLite 日誌（.cache/redmine_queue.sqlite3）並立即回傳工作 ID，
+由背景執行緒送到 Redmine；Redmine 變慢或無法連線時以指數退避（含隨機抖動）重試，程式重新啟動後繼續處理。
+每個工作分成「更新工單」與「新增工時」兩個步驟，重試前會先確認上一次是否其實已經成功
+（新增的工時紀錄 ID 記錄在工作中，回應遺失時依工單、使用者、日期與時數找回），同一筆工時不會被記錄兩次
+"""
+import json
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from redminelib.exceptions import (
+    AuthError,
+    ForbiddenError,
+    ImpersonateError,
+    RequestEntityTooLargeError,
+    ResourceNotFoundError,
+    ValidationError,
+)
+
+from services.redmine_service import RedmineService
+from utils.config import CACHE_DIR
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = CACHE_DIR / "redmine_queue.sqlite3"
+
+# 結構變更時遞增（佇列內容不可重建，舊版結構只能在此處加上遷移）
+SCHEMA_VERSION = 2
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
+    idempotency_key TEXT UNIQUE,
+    issue_id INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    steps TEXT NOT NULL DEFAULT '{}',
+    last_error TEXT,
+    result TEXT,
+    time_entry_id INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_due ON jobs (state, next_attempt_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_issue ON jobs (issue_id, state);
+"""
+
+# 工作狀態（步驟狀態也使用 RUNNING / DONE / FAILED；步驟為 RUNNING 表示請求可能已送出）
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# 重試：第 n 次失敗後等待 uniform(0, min(MAX_DELAY, BASE_DELAY * 2^n)) 秒（full jitter），最多嘗試 MAX_ATTEMPTS 次
+BASE_DELAY_SECONDS = 2.0
+MAX_DELAY_SECONDS = 300.0
+MAX_ATTEMPTS = 10
+
+# 同時處理的工作數（同一個工單的工作一定依序處理）
+DEFAULT_WORKERS = 2
+
+# 重試時比對已寫入的備註：Redmine 與本機時鐘可能有誤差
+_CLOCK_SKEW_SECONDS = 300
+
+# 這些錯誤重試也不會成功（工單不存在、權限或驗證錯誤），直接記錄為失敗的欄位
+_PERMANENT_ERRORS = (
+    ResourceNotFoundError,
+    ValidationError,
+    AuthError,
+    ForbiddenError,
+    ImpersonateError,
+    RequestEntityTooLargeError,
+)
+
+
+class RedmineUpdateQueue:
+    """Redmine 更新的持久化佇列與背景處理執行緒"""
+
+    def __init__(
+        self,
+        service_factory: Callable[[], RedmineService],
+        db_path: Optional[Path] = None,
+        workers: int = DEFAULT_WORKERS,
+    ):
+        """
+        初始化佇列
+
+        Args:
+            service_factory: 回傳目前設定的 Redmine 服務（每個工作處理前呼叫，設定變更後使用新的連線）
+            db_path: SQLite 檔案路徑（可選，預設放在快取目錄）
+            workers: 同時處理的工作數
+        """
+        self.service_factory = service_factory
+        self.db_path = Path(db_path) if db_path else DEFAULT_DB_PATH
+        self.workers = max(1, workers)
+        self._local = threading.local()
+        self._claim_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wakeup = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        self._init_schema()
+
+    def _connection(self) -> sqlite3.Connection:
+        """取得目前執行緒的資料庫連線（每個執行緒各自一條連線）"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.db_path), timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            # 佇列內容不可重建，每次交易都寫入磁碟
+            conn.execute("PRAGMA synchronous=FULL")
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self) -> None:
+        conn = self._connection()
+        conn.executescript(_SCHEMA)
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+        if "time_entry_id" not in columns:
+            # 第 1 版：工時紀錄以註解中的工作 ID 辨識，沒有這個欄位
+            conn.execute("ALTER TABLE jobs ADD COLUMN time_entry_id INTEGER")
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        # 上次程式結束時正在處理的工作：重新排入佇列（重試前會確認哪些步驟其實已經完成）
+        recovered = conn.execute(
+            "UPDATE jobs SET state = ?, next_attempt_at = ? WHERE state = ?",
+            (PENDING, time.time(), RUNNING),
+        ).rowcount
+        conn.commit()
+        if recovered:
+            logger.info(f"Redmine 更新佇列：{recovered} 個中斷的工作已重新排入佇列")
+
+    @staticmethod
+    def _job_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        return {
+            "job_id": row["id"],
+            "issue_id": row["issue_id"],
+            "state": row["state"],
+            "attempts": row["attempts"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+            "next_attempt_at": row["next_attempt_at"] if row["state"] == PENDING else None,
+            "last_error": row["last_error"],
+            "time_entry_id": row["time_entry_id"],
+            "request": json.loads(row["payload"]),
+            "result": json.loads(row["result"]) if row["result"] else None,
+        }
+
+    def enqueue(self, update: Dict[str, Any], idempotency_key: Optional[str] = None) -> Dict[str, Any]:
+        """
+        將一筆更新加入佇列
+
+        Args:
+            update: RedmineService.update_issue 的參數（必須包含 issue_id）
+            idempotency_key: 用戶端提供的冪等鍵（可選）；同一個鍵重複送出時回傳原本的工作，不會再加入一次
+
+        Returns:
+            工作狀態（見 get_job）
+        """
+        now = time.time()
+        job_id = uuid.uuid4().hex[:16]
+        conn = self._connection()
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT INTO jobs (id, idempotency_key, issue_id, payload, state, next_attempt_at, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (job_id, idempotency_key, update["issue_id"], json.dumps(update, ensure_ascii=False), PENDING, now, now, now),
+                )
+        except sqlite3.IntegrityError:
+            row = conn.execute("SELECT * FROM jobs WHERE idempotency_key = ?", (idempotency_key,)).fetchone()
+            if row is None:
+                raise
+            return self._job_dict(row)
+        self._notify()
+        logger.info(f"Issue #{update['issue_id']} 的更新已加入佇列（工作 {job_id}）")
+        return self.get_job(job_id)
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """取得工作狀態（不存在時回傳 None）"""
+        row = self._connection().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._job_dict(row) if row is not None else None
+
+    def status(self, limit: int = 50) -> Dict[str, Any]:
+        """
+        佇列狀態
+
+        Returns:
+            {'counts': {狀態: 數量}, 'jobs': 最近 limit 個工作（新到舊）}
+        """
+        conn = self._connection()
+        counts = {state: 0 for state in (PENDING, RUNNING, DONE, FAILED)}
+        for state, count in conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state"):
+            counts[state] = count
+        rows = conn.execute("SELECT * FROM jobs ORDER BY seq DESC LIMIT ?", (limit,)).fetchall()
+        return {"counts": counts, "jobs": [self._job_dict(row) for row in rows]}
+
+    def retry(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        將失敗的工作重新排入佇列（已完成的步驟不會重做）
+
+        Raises:
+            ValueError: 工作不是失敗狀態
+        """
+        conn = self._connection()
+        with conn:
+            row = conn.execute("SELECT state FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            if row["state"] != FAILED:
+                raise ValueError(f"工作 {job_id} 目前為 {row['state']}，只有失敗的工作可以重試")
+            now = time.time()
+            # 只重新執行未完成的步驟（可能已送出的步驟保留 RUNNING，重試前先確認）；
+            # attempts 設為 1，下一次嘗試仍視為重試（先確認步驟是否其實已經完成）
+            steps = {
+                step: state
+                for step, state in json.loads(
+                    conn.execute("SELECT steps FROM jobs WHERE id = ?", (job_id,)).fetchone()["steps"]
+                ).items()
+                if state != FAILED
+            }
+            conn.execute(
+                "UPDATE jobs SET state = ?, attempts = 1, next_attempt_at = ?, updated_at = ?, steps = ?, "
+                "last_error = NULL, result = NULL WHERE id = ?",
+                (PENDING, now, now, json.dumps(steps), job_id),
+            )
+        self._notify()
+        return self.get_job(job_id)
+
+    def _claim(self) -> Optional[sqlite3.Row]:
+        """取出一個到期的工作並標記為處理中（同一個工單有較早的工作未完成時略過）"""
+        now = time.time()
+        with self._claim_lock:
+            conn = self._connection()
+            with conn:
+                row = conn.execute(
+                    "SELECT * FROM jobs AS j WHERE state = ? AND next_attempt_at <= ? "
+                    "AND NOT EXISTS (SELECT 1 FROM jobs AS o WHERE o.issue_id = j.issue_id AND o.seq < j.seq "
+                    "AND o.state IN (?, ?)) "
+                    "ORDER BY next_attempt_at, seq LIMIT 1",
+                    (PENDING, now, PENDING, RUNNING),
+                ).fetchone()
+                if row is None:
+                    return None
+                conn.execute(
+                    "UPDATE jobs SET state = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                    (RUNNING, now, row["id"]),
+                )
+            return conn.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone()
+
+    def _next_due_in(self) -> Optional[float]:
+        """距離下一個待處理工作到期的秒數（沒有待處理工作時為 None）"""
+        row = self._connection().execute(
+            "SELECT MIN(next_attempt_at) FROM jobs WHERE state = ?", (PENDING,)
+        ).fetchone()
+        if row[0] is None:
+            return None
+        return max(0.0, row[0] - time.time())
+
+    def _save_steps(self, job_id: str, steps: Dict[str, str], time_entry_id: Optional[int] = None) -> None:
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "UPDATE jobs SET steps = ?, time_entry_id = COALESCE(?, time_entry_id), updated_at = ? WHERE id = ?",
+                (json.dumps(steps), time_entry_id, time.time(), job_id),
+            )
+
+    def _claimed_time_entries(self, issue_id: int, job_id: str) -> Set[int]:
+        """此工單的其他工作已記錄的工時紀錄 ID（找回工時紀錄時排除）"""
+        rows = self._connection().execute(
+            "SELECT time_entry_id FROM jobs WHERE issue_id = ? AND id != ? AND time_entry_id IS NOT NULL",
+            (issue_id, job_id),
+        )
+        return {row[0] for row in rows}
+
+    def _process(self, row: sqlite3.Row) -> None:
+        """
+        執行一個工作；暫時性錯誤（連線失敗、逾時、5xx）拋出，由呼叫端排入重試
+
+        各步驟完成後立即記錄，重試時只執行尚未完成的步驟；
+        非第一次嘗試時先向 Redmine 確認步驟是否其實已經成功（回應在途中遺失的情況）。
+        """
+        job_id = row["id"]
+        update = json.loads(row["payload"])
+        issue_id = update["issue_id"]
+        steps: Dict[str, str] = json.loads(row["steps"])
+        errors: Dict[str, str] = {}
+        is_retry = row["attempts"] > 1
+        service = self.service_factory()
+
+        update_data, fields = RedmineService.issue_update_data(
+            update.get("notes"), update.get("percent_done"), update.get("status_id")
+        )
+        if update_data and steps.get("issue") is None:
+            try:
+                since = datetime.fromtimestamp(row["created_at"] - _CLOCK_SKEW_SECONDS, timezone.utc).replace(tzinfo=None)
+                if is_retry and "notes" in update_data and service.has_journal_note(issue_id, update_data["notes"], since):
+                    logger.info(f"工作 {job_id}：Issue #{issue_id} 的更新先前已完成")
+                else:
+                    service.apply_issue_update(issue_id, update_data)
+                steps["issue"] = DONE
+            except _PERMANENT_ERRORS as e:
+                steps["issue"] = FAILED
+                errors["issue"] = service.describe_update_error(issue_id, e)
+            self._save_steps(job_id, steps)
+
+        spent_time = update.get("spent_time")
+        if spent_time is not None and spent_time > 0 and steps.get("time_entry") not in (DONE, FAILED):
+            time_entry_id = None
+            try:
+                if steps.get("time_entry") == RUNNING:
+                    # 上一次可能已送出但沒有收到回應：找出工作建立後新增、時數相同且尚未對應到其他工作的工時紀錄
+                    since = datetime.fromtimestamp(row["created_at"] - _CLOCK_SKEW_SECONDS, timezone.utc).replace(tzinfo=None)
+                    time_entry_id = service.find_time_entry(
+                        issue_id, spent_time, since, exclude_ids=self._claimed_time_entries(issue_id, job_id)
+                    )
+                    if time_entry_id is not None:
+                        logger.info(f"工作 {job_id}：Issue #{issue_id} 的工時先前已記錄（#{time_entry_id}）")
+                if time_entry_id is None:
+                    steps["time_entry"] = RUNNING
+                    self._save_steps(job_id, steps)
+                    time_entry_id = service.create_time_entry(issue_id, spent_time)
+                steps["time_entry"] = DONE
+            except _PERMANENT_ERRORS as e:
+                steps["time_entry"] = FAILED
+                errors["time_entry"] = f"更新工時失敗: {e}"
+            self._save_steps(job_id, steps, time_entry_id)
+
+        result = {"success": True, "updated_fields": [], "failed_fields": [], "errors": []}
+        for step, step_fields in (("issue", fields), ("time_entry", ["spent_time"])):
+            if steps.get(step) == DONE:
+                result["updated_fields"].extend(step_fields)
+            elif steps.get(step) == FAILED:
+                result["failed_fields"].extend(step_fields)
+                result["errors"].append(errors.get(step, "先前的嘗試失敗"))
+        result["success"] = not result["failed_fields"]
+        self._finish(job_id, DONE if result["success"] else FAILED, result, "; ".join(result["errors"]) or None)
+
+    def _finish(self, job_id: str, state: str, result: Optional[Dict[str, Any]], error: Optional[str]) -> None:
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "UPDATE jobs SET state = ?, result = ?, last_error = ?, updated_at = ? WHERE id = ?",
+                (state, json.dumps(result, ensure_ascii=False) if result is not None else None, error, time.time(), job_id),
+            )
+
+    def _reschedule(self, row: sqlite3.Row, error: Exception) -> None:
+        """暫時性錯誤：以指數退避加隨機抖動排入重試，超過 MAX_ATTEMPTS 時標記為失敗"""
+        job_id = row["id"]
+        attempts = row["attempts"]
+        message = f"{type(error).__name__}: {error}"
+        if attempts >= MAX_ATTEMPTS:
+            logger.error(f"工作 {job_id}（Issue #{row['issue_id']}）重試 {attempts} 次仍失敗: {message}")
+            update = json.loads(row["payload"])
+            _update_data, fields = RedmineService.issue_update_data(
+                update.get("notes"), update.get("percent_done"), update.get("status_id")
+            )
+            steps = json.loads(self._connection().execute("SELECT steps FROM jobs WHERE id = ?", (job_id,)).fetchone()["steps"])
+            updated = fields if steps.get("issue") == DONE else []
+            failed = [field for field in fields if field not in updated]
+            if (update.get("spent_time") or 0) > 0:
+                (updated if steps.get("time_entry") == DONE else failed).append("spent_time")
+            result = {"success": False, "updated_fields": updated, "failed_fields": failed, "errors": [message]}
+            self._finish(job_id, FAILED, result, message)
+            return
+        delay = random.uniform(0, min(MAX_DELAY_SECONDS, BASE_DELAY_SECONDS * 2 ** attempts))
+        logger.warning(f"工作 {job_id}（Issue #{row['issue_id']}）第 {attempts} 次嘗試失敗，{delay:.1f} 秒後重試: {message}")
+        now = time.time()
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "UPDATE jobs SET state = ?, next_attempt_at = ?, last_error = ?, updated_at = ? WHERE id = ?",
+                (PENDING, now + delay, message, now, job_id),
+            )
+
+    def _notify(self) -> None:
+        with self._wakeup:
+            self._wakeup.notify_all()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                row = self._claim()
+            except Exception as e:
+                logger.warning(f"讀取 Redmine 更新佇列失敗: {e}")
+                row = None
+            if row is None:
+                with self._wakeup:
+                    if self._stop.is_set():
+                        break
+                    try:
+                        timeout = self._next_due_in()
+                    except Exception:
+                        timeout = BASE_DELAY_SECONDS
+                    self._wakeup.wait(timeout if timeout is not None else None)
+                continue
+            try:
+                self._process(row)
+            except Exception as e:
+                try:
+                    self._reschedule(self._connection().execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone(), e)
+                except Exception as reschedule_error:
+                    logger.error(f"無法更新工作 {row['id']} 的狀態: {reschedule_error}")
+
+    def start(self) -> None:
+        """啟動背景處理執行緒"""
+        if self._threads:
+            return
+        self._stop.clear()
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"redmine-queue-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"Redmine 更新佇列已啟動（{self.workers} 個處理執行緒）")
+
+    def stop(self) -> None:
+        """停止背景處理（正在送出的請求完成後才會結束；未完成的工作下次啟動時繼續）"""
+        self._stop.set()
+        self._notify()
+        for thread in self._threads:
+            thread.join(timeout=30)
+        self._threads = []
+
+
+_UPDATE_QUEUE: Optional[RedmineUpdateQueue] = None
+_UPDATE_QUEUE_LOCK = threading.Lock()
+
+
+def start_update_queue(service_factory: Callable[[], RedmineService], workers: int = DEFAULT_WORKERS) -> RedmineUpdateQueue:
+    """啟動程序內共用的 Redmine 更新佇列"""
+    global _UPDATE_QUEUE
+    with _UPDATE_QUEUE_LOCK:
+        if _UPDATE_QUEUE is None:
+            _UPDATE_QUEUE = RedmineUpdateQueue(service_factory, workers=workers)
+            _UPDATE_QUEUE.start()
+        return _UPDATE_QUEUE
+
+
+def get_update_queue() -> Optional[RedmineUpdateQueue]:
+    """取得執行中的 Redmine 更新佇列（未啟動時回傳 None）"""
+    return _UPDATE_QUEUE
+
+
+def stop_update_queue() -> None:
+    """停止程序內共用的 Redmine 更新佇列"""
+    global _UPDATE_QUEUE
+    with _UPDATE_QUEUE_LOCK:
+        queue, _UPDATE_QUEUE = _UPDATE_QUEUE, None
+    if queue is not None:
+        queue.stop()
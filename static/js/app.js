@@ -10,7 +10,10 @@ const state = {
   selectedBranch: null,
   timeRange: null,
   analysisResult: null,
+  updateJob: null, // 最近一次 Redmine 更新工作
   issues: [],
+  issuesTotal: 0,
+  issuesQuery: { statusId: null, search: null },
   repositories: [],
   repoViewMode: 'list', // 'list' | 'select'
 };
@@ -250,23 +253,76 @@ async function apiCall(endpoint, options = {}) {
   }
 }
 
-// 載入工單列表
-async function loadIssues(statusId = null, search = null) {
+// NDJSON 串流呼叫：每解析出一行就呼叫 onItem（可用 signal 中途取消）
+async function streamNdjson(endpoint, onItem, signal) {
+  const response = await fetch(`${API_BASE}${endpoint}`, { signal });
+  if (!response.ok) {
+    const error = await response.json();
+    throw new Error(error.detail || `HTTP ${response.status}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let trailer = null;
+  const handleLine = (line) => {
+    if (!line) return;
+    const item = JSON.parse(line);
+    if (item.error) throw new Error(item.error);
+    if (item.done) {
+      trailer = item;
+    } else {
+      onItem(item);
+    }
+  };
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    const lines = buffer.split('\n');
+    buffer = lines.pop();
+    lines.forEach(handleLine);
+  }
+  handleLine((buffer + decoder.decode()).trim());
+  return trailer;
+}
+
+// 工單列表每頁筆數與卡片用到的欄位（由伺服器分頁與裁剪欄位）
+const ISSUE_PAGE_SIZE = 50;
+const ISSUE_CARD_FIELDS = 'id,subject,status,priority,done_ratio,spent_hours,updated_on';
+
+// 載入工單列表（append 為 true 時載入下一頁並接在現有列表後）
+async function loadIssues(statusId = null, search = null, append = false) {
   const loadingState = document.getElementById('loadingState');
   const issueList = document.getElementById('issueList');
   const emptyState = document.getElementById('emptyState');
+  const loadMoreBtn = document.getElementById('loadMoreIssuesBtn');
   
-  if (loadingState) loadingState.style.display = 'block';
-  if (emptyState) emptyState.classList.add('hidden');
-  issueList.innerHTML = '';
+  if (append) {
+    ({ statusId, search } = state.issuesQuery);
+  } else {
+    state.issuesQuery = { statusId, search };
+    if (loadingState) loadingState.style.display = 'block';
+    if (emptyState) emptyState.classList.add('hidden');
+    issueList.innerHTML = '';
+  }
+  if (loadMoreBtn) loadMoreBtn.classList.add('hidden');
   
   try {
     const params = new URLSearchParams();
     if (statusId) params.append('status_id', statusId);
     if (search) params.append('search', search);
+    params.append('limit', ISSUE_PAGE_SIZE);
+    params.append('offset', append ? state.issues.length : 0);
+    params.append('fields', ISSUE_CARD_FIELDS);
     
     const data = await apiCall(`/issues?${params.toString()}`);
-    state.issues = data.issues || [];
+    // 篩選或搜尋條件已改變時捨棄較早送出的回應
+    if (state.issuesQuery.statusId !== statusId || state.issuesQuery.search !== search) return;
+    const page = data.issues || [];
+    state.issues = append ? state.issues.concat(page) : page;
+    state.issuesTotal = data.total_count ?? state.issues.length;
     
     if (loadingState) loadingState.style.display = 'none';
     
@@ -275,10 +331,14 @@ async function loadIssues(statusId = null, search = null) {
       return;
     }
     
-    state.issues.forEach(issue => {
+    page.forEach(issue => {
       const card = createIssueCard(issue);
       issueList.appendChild(card);
     });
+    if (loadMoreBtn && state.issues.length < state.issuesTotal && page.length > 0) {
+      loadMoreBtn.textContent = `載入更多（${state.issues.length} / ${state.issuesTotal}）`;
+      loadMoreBtn.classList.remove('hidden');
+    }
   } catch (error) {
     if (loadingState) loadingState.style.display = 'none';
     showToast(`載入工單失敗：${error.message}`, 'error');
@@ -407,6 +467,8 @@ async function loadBranches(repoPath) {
   try {
     const data = await apiCall(`/repositories/${encodeURIComponent(repoPath)}/branches`);
     const branches = data.branches || [];
+    // 依最後 commit 時間排序（最近的在前）
+    branches.sort((a, b) => (b.last_commit_date || '').localeCompare(a.last_commit_date || ''));
     
     branchList.innerHTML = '';
     branches.forEach(branch => {
@@ -431,8 +493,20 @@ async function loadBranches(repoPath) {
       const span = document.createElement('span');
       span.textContent = branch.name + (branch.is_current ? ' (當前)' : '');
       
+      const meta = document.createElement('span');
+      meta.className = 'ml-auto text-xs text-slate-500';
+      const metaParts = [];
+      if (branch.ahead != null && branch.behind != null && !branch.is_default) {
+        metaParts.push(`↑${branch.ahead} ↓${branch.behind}`);
+      }
+      if (branch.last_commit_date) {
+        metaParts.push(new Date(branch.last_commit_date).toLocaleString('zh-TW'));
+      }
+      meta.textContent = metaParts.join(' · ');
+      
       label.appendChild(radio);
       label.appendChild(span);
+      label.appendChild(meta);
       branchList.appendChild(label);
     });
     
@@ -550,6 +624,48 @@ async function updateCommitPreview() {
     const commitCountEl = document.getElementById('commitCount');
     if (commitCountEl) commitCountEl.textContent = '?';
   }
+
+  updateCommitPreviewList(timeRange);
+}
+
+// 最多顯示的預覽 commit 數（收到足夠的 commit 後即中斷串流，伺服器端的 git 也會停止）
+const PREVIEW_LIST_LIMIT = 50;
+let previewStreamController = null;
+
+// 以 /api/commits 串流逐筆顯示 commit 預覽列表
+async function updateCommitPreviewList(timeRange) {
+  const listEl = document.getElementById('commitPreviewList');
+  if (!listEl) return;
+
+  // 選擇變更時取消上一次尚未完成的串流
+  if (previewStreamController) previewStreamController.abort();
+  const controller = new AbortController();
+  previewStreamController = controller;
+  listEl.innerHTML = '';
+
+  let shown = 0;
+  try {
+    await streamNdjson(
+      `/commits?repository_path=${encodeURIComponent(state.selectedRepo)}&branch=${encodeURIComponent(state.selectedBranch)}&start_date=${timeRange.start}&end_date=${timeRange.end}`,
+      (commit) => {
+        if (shown >= PREVIEW_LIST_LIMIT) return;
+        const firstLine = (commit.message || '').split('\n')[0];
+        const li = document.createElement('li');
+        li.className = 'truncate';
+        li.innerHTML = `<span class="font-mono text-blue-700">${escapeHtml(commit.hash)}</span> ${escapeHtml(firstLine)}`;
+        listEl.appendChild(li);
+        shown += 1;
+        if (shown >= PREVIEW_LIST_LIMIT) controller.abort();
+      },
+      controller.signal
+    );
+  } catch (error) {
+    if (error.name !== 'AbortError') {
+      console.error('載入 commit 列表失敗:', error);
+    }
+  } finally {
+    if (previewStreamController === controller) previewStreamController = null;
+  }
 }
 
 // 開始分析
@@ -633,6 +749,72 @@ function displayAnalysisResult(result) {
   } else {
     commitsDiv.innerHTML = '<p class="text-slate-500">無相關 commit</p>';
   }
+  
+  // 實際行數變更統計（對照 AI 的工時估算）
+  if (result.churn && result.churn.commits > 0) {
+    const churn = result.churn;
+    const dirs = (churn.directories || []).slice(0, 3)
+      .map(d => `${escapeHtml(d.path)} (+${d.insertions} -${d.deletions})`).join(', ');
+    commitsDiv.insertAdjacentHTML('afterbegin',
+      `<div class="text-slate-500 mb-1">行數變更：+${churn.insertions} -${churn.deletions}，${churn.files} 個檔案${dirs ? `（${dirs}）` : ''}</div>`
+    );
+  }
+}
+
+// Redmine 更新在背景佇列中送出；結果頁最多等待此時間，之後顯示「已加入佇列」
+const UPDATE_JOB_WAIT_MS = 10000;
+const UPDATE_JOB_POLL_MS = 800;
+
+// 等待 Redmine 更新工作完成（逾時時回傳目前狀態）
+async function waitForUpdateJob(job) {
+  const deadline = Date.now() + UPDATE_JOB_WAIT_MS;
+  while ((job.state === 'pending' || job.state === 'running') && Date.now() < deadline) {
+    await new Promise(resolve => setTimeout(resolve, UPDATE_JOB_POLL_MS));
+    job = await apiCall(`/update-redmine/jobs/${job.job_id}`);
+  }
+  return job;
+}
+
+// 依工作狀態顯示結果頁
+function showUpdateJobResult(job) {
+  const successDiv = document.getElementById('successResult');
+  const errorDiv = document.getElementById('errorResult');
+  if (job.state === 'failed') {
+    const result = job.result || {};
+    document.getElementById('errorMessage').textContent = (result.errors || []).join(', ') || job.last_error || '更新失敗';
+    document.getElementById('failedFields').textContent = result.updated_fields?.length
+      ? `已更新：${result.updated_fields.join(', ')}；重試只會重新送出失敗的部分`
+      : '';
+    errorDiv.classList.remove('hidden');
+    successDiv.classList.add('hidden');
+  } else {
+    const queued = job.state !== 'done';
+    document.getElementById('successTitle').textContent = queued ? '已加入更新佇列' : '更新成功！';
+    document.getElementById('successMessage').textContent = queued
+      ? `Redmine 暫時沒有回應，更新會在背景自動重試（工作 ${job.job_id}）`
+      : '進度回報已成功更新到 Redmine';
+    const redmineLink = document.getElementById('redmineLink');
+    // 這裡需要從設定檔取得 Redmine URL
+    redmineLink.href = `#`; // TODO: 從設定檔取得
+    successDiv.classList.remove('hidden');
+    errorDiv.classList.add('hidden');
+  }
+  showPage('result');
+}
+
+// 重試失敗的更新：重新排入原本的工作（已完成的部分不會重複送出）
+async function retryUpdateRedmine() {
+  if (state.updateJob?.state !== 'failed' || !state.updateJob.job_id) {
+    return updateRedmine();
+  }
+  showPage('analyzing');
+  try {
+    const job = await apiCall(`/update-redmine/jobs/${state.updateJob.job_id}/retry`, { method: 'POST' });
+    state.updateJob = await waitForUpdateJob(job);
+    showUpdateJobResult(state.updateJob);
+  } catch (error) {
+    showUpdateJobResult({ state: 'failed', last_error: error.message });
+  }
 }
 
 // 更新 Redmine
@@ -644,33 +826,21 @@ async function updateRedmine() {
   showPage('analyzing');
   
   try {
-    const result = await apiCall('/update-redmine', {
+    const job = await apiCall('/update-redmine', {
       method: 'POST',
       body: JSON.stringify({
         issue_id: state.selectedIssue.id,
         notes: notes,
         percent_done: percentDone,
-        status_id: statusId
+        status_id: statusId,
+        idempotency_key: crypto.randomUUID ? crypto.randomUUID() : `${Date.now()}-${Math.random()}`
       })
     });
-    
-    if (result.success) {
-      const successDiv = document.getElementById('successResult');
-      const redmineLink = document.getElementById('redmineLink');
-      // 這裡需要從設定檔取得 Redmine URL
-      redmineLink.href = `#`; // TODO: 從設定檔取得
-      successDiv.classList.remove('hidden');
-      document.getElementById('errorResult').classList.add('hidden');
-      showPage('result');
-    } else {
-      throw new Error(result.errors?.join(', ') || '更新失敗');
-    }
+    state.updateJob = await waitForUpdateJob(job);
+    showUpdateJobResult(state.updateJob);
   } catch (error) {
-    const errorDiv = document.getElementById('errorResult');
-    document.getElementById('errorMessage').textContent = error.message;
-    errorDiv.classList.remove('hidden');
-    document.getElementById('successResult').classList.add('hidden');
-    showPage('result');
+    state.updateJob = null;
+    showUpdateJobResult({ state: 'failed', last_error: error.message });
   }
 }
 
@@ -963,6 +1133,10 @@ document.addEventListener('DOMContentLoaded', () => {
     loadIssues(statusId, search);
   });
   
+  document.getElementById('loadMoreIssuesBtn').addEventListener('click', () => {
+    loadIssues(null, null, true);
+  });
+  
   // 儲存庫選擇
   document.getElementById('repoSelect').addEventListener('change', (e) => {
     const selectedOption = e.target.options[e.target.selectedIndex];
@@ -1167,5 +1341,5 @@ document.addEventListener('DOMContentLoaded', () => {
   });
   
   // 重試更新
-  document.getElementById('retryUpdateBtn').addEventListener('click', updateRedmine);
+  document.getElementById('retryUpdateBtn').addEventListener('click', retryUpdateRedmine);
 });
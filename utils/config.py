@@ -2,19 +2,81 @@
 設定檔管理模組
 處理 config.json 的讀取、寫入和驗證
 """
+import copy
 import json
 import os
 import subprocess
+import threading
 from pathlib import Path
-from typing import Dict, Optional, Any
+from typing import Dict, Optional, Any, Tuple
 
 
 CONFIG_FILE = Path(__file__).parent.parent / "config.json"
 CONFIG_EXAMPLE_FILE = Path(__file__).parent.parent / "config.example.json"
 
+# 本機快取目錄（commit 索引等可重建的資料）
+CACHE_DIR = Path(__file__).parent.parent / ".cache"
+
+# 設定檔快照快取（只有 config.json 的 mtime/size 改變時才重新讀取與解析）
+# key: (st_mtime_ns, st_size)
+# snapshot: 解析後的設定（不含自動偵測的 Git 使用者），只在模組內部持有，對外一律回傳深拷貝
+_CONFIG_CACHE: dict = {
+    "key": None,
+    "snapshot": None,
+}
+
+# Git 使用者偵測快取（只有 git 設定檔的 mtime/size 改變時才重新執行 `git config`）
+# key: 各 git 設定檔的 (path, st_mtime_ns, st_size) tuple
+_GIT_USER_CACHE: dict = {
+    "key": None,
+    "user": None,
+}
+
+_CACHE_LOCK = threading.Lock()
+
+
+def _file_signature(path: Path) -> Optional[Tuple[int, int]]:
+    """取得檔案的 (mtime_ns, size)，檔案不存在時回傳 None"""
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _read_config_snapshot() -> Dict[str, Any]:
+    """
+    取得 config.json 的快照
+    只有在檔案的 mtime/size 改變時才會重新讀取與解析
+    """
+    key = _file_signature(CONFIG_FILE)
+    with _CACHE_LOCK:
+        if key is not None and _CONFIG_CACHE["key"] == key:
+            return _CONFIG_CACHE["snapshot"]
+
+    with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
+        snapshot = json.load(f)
+
+    with _CACHE_LOCK:
+        _CONFIG_CACHE["key"] = key
+        _CONFIG_CACHE["snapshot"] = snapshot
+    return snapshot
+
+
+def invalidate_config_cache() -> None:
+    """清除設定檔與 Git 使用者的快取（下次讀取時會重新載入）"""
+    with _CACHE_LOCK:
+        _CONFIG_CACHE["key"] = None
+        _CONFIG_CACHE["snapshot"] = None
+        _GIT_USER_CACHE["key"] = None
+        _GIT_USER_CACHE["user"] = None
+
 
 def load_config() -> Dict[str, Any]:
-    """載入設定檔"""
+    """
+    載入設定檔
+    回傳值是快照的深拷貝，呼叫端可以自由修改，不會影響快取
+    """
     if not CONFIG_FILE.exists():
         # 如果設定檔不存在，優先從範本建立；否則用內建預設值建立
         if CONFIG_EXAMPLE_FILE.exists():
@@ -32,8 +94,7 @@ def load_config() -> Dict[str, Any]:
         return default_config
     
     try:
-        with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-            config = json.load(f)
+        config = copy.deepcopy(_read_config_snapshot())
         
         # 如果啟用自動偵測，更新 Git 使用者設定
         if config.get('git', {}).get('auto_detect', True):
@@ -60,6 +121,11 @@ def save_config(config: Dict[str, Any]) -> None:
             json.dump(config, f, ensure_ascii=False, indent=2)
     except Exception as e:
         raise ValueError(f"無法儲存設定檔: {e}")
+    finally:
+        # 同一秒內連續寫入時 mtime 可能相同，主動清掉快取確保下次讀到新內容
+        with _CACHE_LOCK:
+            _CONFIG_CACHE["key"] = None
+            _CONFIG_CACHE["snapshot"] = None
 
 
 def get_default_config() -> Dict[str, Any]:
@@ -68,14 +134,21 @@ def get_default_config() -> Dict[str, Any]:
         "redmine": {
             "url": "https://redmine.example.com",
             "api_key": "your_api_key_here",
-            "user_id": None
+            "user_id": None,
+            "max_workers": 4  # 批次更新時同時更新的工單數
         },
         "git": {
             "user": {
                 "name": "",
                 "email": ""
             },
-            "auto_detect": True
+            "aliases": [],  # 其他屬於自己的作者名稱或 Email（例如舊 Email）
+            "auto_detect": True,
+            "commit_index": False,  # 使用本機 commit 索引（.cache/commit_index.sqlite3；第一次建立分支索引較慢）
+            "max_workers": 4,  # 多儲存庫分析時同時讀取的儲存庫／分支數
+            "dedupe_patches": True,  # 以 patch-id 合併 cherry-pick / rebase 產生的重複 commit
+            "backend": "auto",  # "auto"（啟動時測試選出最快的）、"cli"、"gitpython" 或 "pygit2"
+            "commit_graph": True  # 儲存庫沒有 commit-graph 時在背景產生（加快歷史走訪）
         },
         "ai": {
             "provider": "claude",  # "claude"、"gemini" 或 "opencode"
@@ -95,6 +168,13 @@ def get_default_config() -> Dict[str, Any]:
                 "cli_path": "opencode",
                 "timeout": 120,
                 "system_prompt_file": "prompts/redmine_analysis.txt"
+            },
+            # 在 prompt 中附上 commit 的程式碼變更摘錄（檔案路徑、hunk 標頭與部分變更行）
+            "diff_context": {
+                "enabled": False,
+                "max_bytes_per_commit": 4000,  # 每個 commit 的摘錄上限（約 1000 tokens）
+                "max_total_bytes": 60000,      # 所有 commit 的摘錄總上限
+                "exclude": []                  # 額外排除的 glob 路徑（lockfile、產生的檔案已預設排除）
             }
         },
         # 保留舊的 claude 設定以向後相容
@@ -108,6 +188,15 @@ def get_default_config() -> Dict[str, Any]:
         },
         "repositories": [],
         "scan_paths": [],
+        # 監看 scan_paths 即時更新儲存庫列表（Linux 使用 inotify，其他平台輪詢）
+        "repo_watch": {
+            "enabled": False,
+            "poll_interval": 5
+        },
+        "issue_index": {
+            "enabled": False,  # 背景索引所有儲存庫 commit 訊息中的 #123 引用
+            "interval": 600    # 重新索引間隔（秒）
+        },
         "default_time_range": "本週",
         "ui": {
             "theme": "light",
@@ -116,7 +205,46 @@ def get_default_config() -> Dict[str, Any]:
     }
 
 
+def _git_config_files() -> list[Path]:
+    """
+    列出可能影響 `git config user.name/user.email` 結果的設定檔
+    （system、global、XDG 與目前工作目錄所在儲存庫的本地設定）
+    """
+    home = Path.home()
+    xdg_home = os.environ.get('XDG_CONFIG_HOME') or str(home / '.config')
+    files = [
+        Path('/etc/gitconfig'),
+        home / '.gitconfig',
+        Path(xdg_home) / 'git' / 'config',
+        Path.cwd() / '.git' / 'config',
+    ]
+    for env_name in ('GIT_CONFIG_GLOBAL', 'GIT_CONFIG_SYSTEM'):
+        env_path = os.environ.get(env_name)
+        if env_path:
+            files.append(Path(env_path))
+    return files
+
+
 def detect_git_user() -> Optional[Dict[str, str]]:
+    """
+    自動偵測 Git 使用者設定（有快取）
+    只有在 git 設定檔的 mtime/size 改變時才會重新執行 `git config`
+    """
+    key = tuple((str(p), _file_signature(p)) for p in _git_config_files())
+    with _CACHE_LOCK:
+        if _GIT_USER_CACHE["key"] == key:
+            user = _GIT_USER_CACHE["user"]
+            return dict(user) if user else None
+
+    user = _detect_git_user_uncached()
+
+    with _CACHE_LOCK:
+        _GIT_USER_CACHE["key"] = key
+        _GIT_USER_CACHE["user"] = user
+    return dict(user) if user else None
+
+
+def _detect_git_user_uncached() -> Optional[Dict[str, str]]:
     """
     自動偵測 Git 使用者設定
     先嘗試全域設定，如果沒有則嘗試本地設定